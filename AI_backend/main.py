@@ -1,7 +1,10 @@
 # backend/main.py
+import logging
 from fastapi import FastAPI
 from routers import registration, optimizer, crud, assistant, get_timetable, tier1
-from database import engine
+from database import engine, SessionLocal
+from services.gemini_client import aclose_clients
+from services.enrollment_counts import ensure_enrollment_counts
 import models
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -28,6 +31,21 @@ app.include_router(assistant.router)
 app.include_router(get_timetable.router)
 app.include_router(tier1.router)
 
+@app.on_event("startup")
+def prepare_enrollment_counts():
+    # Install the Supabase-writer hook and backfill an empty aggregate
+    db = SessionLocal()
+    try:
+        ensure_enrollment_counts(db)
+    except Exception as e:
+        logging.getLogger(__name__).error("enrollment_counts startup check failed: %s", e)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await aclose_clients()
+
 @app.get("/")
 def root():
     return {"message": "SAT-YUG running"}
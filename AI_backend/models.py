@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -52,6 +52,8 @@ class Classroom(Base):
 
 class Course(Base):
     __tablename__ = "courses"
+    # Catalog filters used by the assistant's native handlers (services/intent_router.py)
+    __table_args__ = (Index("ix_courses_semester_credits", "semester", "credits"),)
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String, nullable=False)
     name = Column(String, nullable=False)
@@ -73,14 +75,25 @@ class Course(Base):
 class Enrollment(Base):
     __tablename__ = "enrollments"
     id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("students.id"))
+    student_id = Column(Integer, ForeignKey("students.id"), index=True)
     course_id = Column(Integer, ForeignKey("courses.id"))
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # Corrected line
+    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc), server_default=func.now())  # Corrected line
 
     student = relationship("Student", back_populates="enrollments")
     course = relationship("Course", back_populates="enrollments")
 
 
+class EnrollmentCount(Base):
+    """Maintained per-course, per-year enrollment aggregate (see services/enrollment_counts.py)."""
+    __tablename__ = "enrollment_counts"
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    semester = Column(Integer)
+    enrollment_count = Column(Integer, nullable=False, default=0)
+    first_enrolled_at = Column(DateTime)
+    last_enrolled_at = Column(DateTime)
+
+
 class DisruptionLog(Base):
     __tablename__ = "disruptions"
     id = Column(Integer, primary_key=True, index=True)
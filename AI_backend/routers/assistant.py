@@ -1,13 +1,23 @@
+import os
+import json
+import logging
+import math
 from fastapi import APIRouter, HTTPException, Depends, Body, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Dict, Optional, Any
-from services.assistant_service import handle_user_query, _schema_slices_from_models
-from database import get_db
+from services.assistant_service import handle_user_query, iter_user_query, _schema_slices_from_models, SPEC_CACHE, SEMANTIC_CACHE, QUERY_EXECUTOR
+from database import get_db, SessionLocal
 from sqlalchemy.orm import Session
-from services.pgvector_retriever import PgVectorRetriever
-from services.retriever import _chunk_text
+from services.vector_store import get_local_store, get_vector_store, is_local_backend
+from services.embeddings import embedding_cache_stats
+from services.llm_gateway import LLMOverloaded, gateway_stats
+from services.tracing import render_metrics
+from services.retriever import CHUNK_OVERLAP, CHUNK_WORDS, _chunk_text
+from services.ingestion import get_job, list_jobs, start_ingest_job, sync_directory, sync_directory_local
 from schemas import IngestBody
 
 router = APIRouter(prefix="/assistant", tags=["Assistant"])
+logger = logging.getLogger(__name__)
 
 
 def get_current_user(x_user_id: Optional[str] = Header(None), x_user_role: Optional[str] = Header(None)) -> Dict[str, Any]:
@@ -21,25 +31,132 @@ def get_current_user(x_user_id: Optional[str] = Header(None), x_user_role: Optio
 
 
 @router.post("/chat")
-def chat(
+async def chat(
     text: str = Body(..., embed=True, example="Find me a 3-credit humanities course on Friday afternoon that doesn't clash with my major."),
+    llm_summary: Optional[bool] = Body(None, embed=True),
+    debug: bool = Body(False, embed=True),
     db: Session = Depends(get_db),
     user: Dict[str, Any] = Depends(get_current_user),
 ):
     """
     Accepts a single `text` string from the user and returns structured result including LLM reply.
-    Uses simple header auth to determine user role.
+    Uses simple header auth to determine user role. With `debug`, the response
+    carries per-stage timing spans under `debug`.
     """
     try:
-        res = handle_user_query(db, user, text)
+        res = await handle_user_query(db, user, text, llm_summary=llm_summary, debug=debug)
         return res
+    except LLMOverloaded as e:
+        raise _overloaded(e)
     except RuntimeError as e:
-        print(e)
+        logger.error(f"Assistant error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Assistant error: " + str(e))
 
 
+def _overloaded(e: LLMOverloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(math.ceil(e.retry_after)))})
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    text: str = Body(..., embed=True),
+    llm_summary: Optional[bool] = Body(None, embed=True),
+    debug: bool = Body(False, embed=True),
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Server-Sent Events variant of /chat. Emits `cache`, `spec` and `rows`
+    (or `docs` for document questions) as soon as each stage finishes, then
+    `summary_delta` chunks as the LLM streams, and finally `done` (same
+    payload as /chat) or `error`.
+    """
+    async def events():
+        # The session must outlive the request dependencies, so the stream owns it
+        db = SessionLocal()
+        try:
+            async for event, data in iter_user_query(db, user, text, llm_summary=llm_summary, debug=debug):
+                yield _sse(event, data)
+        except LLMOverloaded as e:
+            yield _sse("error", {"status": "error", "message": str(e), "overloaded": True, "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"status": "error", "message": "Assistant error: " + str(e)})
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache/stats")
+def cache_stats(user: Dict[str, Any] = Depends(get_current_user)):
+    if (user.get("role") or "").lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {
+        "spec_cache": SPEC_CACHE.stats(),
+        "semantic_cache": SEMANTIC_CACHE.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "query_executor": QUERY_EXECUTOR.stats(),
+    }
+
+
+@router.get("/llm/stats")
+def llm_stats(user: Dict[str, Any] = Depends(get_current_user)):
+    """LLM gateway counters: queue depth, in-flight calls, wait times, shed and coalesced calls."""
+    if (user.get("role") or "").lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    return gateway_stats()
+
+
+def _gateway_metrics() -> List[str]:
+    gauges = {
+        "queue_depth": "Calls waiting in the LLM gateway queue.",
+        "in_flight": "LLM calls in flight.",
+    }
+    counters = {
+        "calls": "Calls admitted or queued by the LLM gateway.",
+        "coalesced": "Calls served by an identical in-flight call.",
+        "shed_queue_full": "Calls shed because the gateway queue was full.",
+        "shed_deadline": "Calls shed because they would miss their deadline.",
+        "upstream_throttled": "Upstream 429 responses.",
+    }
+    stats = gateway_stats()
+    lines: List[str] = []
+    for key, doc in gauges.items():
+        lines += [f"# HELP llm_gateway_{key} {doc}", f"# TYPE llm_gateway_{key} gauge"]
+        lines += [f'llm_gateway_{key}{{gateway="{g}"}} {s[key]}' for g, s in stats.items()]
+    for key, doc in counters.items():
+        lines += [f"# HELP llm_gateway_{key}_total {doc}", f"# TYPE llm_gateway_{key}_total counter"]
+        lines += [f'llm_gateway_{key}_total{{gateway="{g}"}} {s[key]}' for g, s in stats.items()]
+    return lines
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(user: Dict[str, Any] = Depends(get_current_user)):
+    """Prometheus text format: stage and request latency histograms plus LLM gateway gauges/counters."""
+    if (user.get("role") or "").lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    return PlainTextResponse(render_metrics(_gateway_metrics()), media_type="text/plain; version=0.0.4")
+
+
+@router.post("/cache/invalidate")
+def cache_invalidate(user: Dict[str, Any] = Depends(get_current_user)):
+    if (user.get("role") or "").lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    SPEC_CACHE.invalidate()
+    SEMANTIC_CACHE.invalidate()
+    QUERY_EXECUTOR.invalidate()
+    return {"ok": True}
+
+
 @router.post("/knowledge/ensure_schema")
 def ensure_knowledge_schema(
     db: Session = Depends(get_db),
@@ -48,7 +165,7 @@ def ensure_knowledge_schema(
     if (user.get("role") or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
     try:
-        PgVectorRetriever(db).ensure_schema()
+        get_vector_store(db).ensure_schema()
         return {"ok": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -62,7 +179,7 @@ def seed_schema_docs(
     if (user.get("role") or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
     try:
-        PgVectorRetriever(db).ensure_schema()
+        get_vector_store(db).ensure_schema()
         tables = [
             "students",
             "faculty",
@@ -75,12 +192,13 @@ def seed_schema_docs(
         ]
         schema_sections = _schema_slices_from_models(tables)
         schema_text = "\n\n".join(schema_sections)
-        pr = PgVectorRetriever(db)
+        pr = get_vector_store(db)
         doc_id_schema = pr.ingest(
             title="SAT-YUG Schema Overview",
             source="schema:auto",
             chunks=[schema_text],
             role_visibility=None,
+            metadata_list=[{"type": "schema"}],
         )
         sample_queries = (
             "Natural language to data examples:\n"
@@ -96,6 +214,7 @@ def seed_schema_docs(
             source="samples:auto",
             chunks=[sample_queries],
             role_visibility=None,
+            metadata_list=[{"type": "schema"}],
         )
         return {"ok": True, "schema_document_id": doc_id_schema, "samples_document_id": doc_id_samples}
     except Exception as e:
@@ -107,8 +226,8 @@ def ingest_file(
     path: str = Body(..., embed=True),
     title: str = Body(None, embed=True),
     role_visibility: Optional[str] = Body(None, embed=True),
-    chunk_size: int = Body(500, embed=True),
-    overlap: int = Body(100, embed=True),
+    chunk_size: int = Body(CHUNK_WORDS, embed=True),
+    overlap: int = Body(CHUNK_OVERLAP, embed=True),
     db: Session = Depends(get_db),
     user: Dict[str, Any] = Depends(get_current_user),
 ):
@@ -118,7 +237,7 @@ def ingest_file(
         with open(path, "r", encoding="utf-8", errors="ignore") as f:
             text = f.read()
         chunks = _chunk_text(text, chunk_size=chunk_size, overlap=overlap)
-        pr = PgVectorRetriever(db)
+        pr = get_vector_store(db)
         doc_id = pr.ingest(
             title=title or path,
             source=path,
@@ -134,25 +253,55 @@ def ingest_file(
 def ingest_directory(
     directory: str = Body(..., embed=True),
     role_visibility: Optional[str] = Body(None, embed=True),
+    doc_type: Optional[str] = Body(None, embed=True),
+    chunk_size: int = Body(CHUNK_WORDS, embed=True),
+    overlap: int = Body(CHUNK_OVERLAP, embed=True),
+    background: bool = Body(True, embed=True),
+    prune: bool = Body(True, embed=True),
     db: Session = Depends(get_db),
     user: Dict[str, Any] = Depends(get_current_user),
 ):
+    """
+    Sync every .md/.txt file under `directory` through the bulk pipeline:
+    unchanged files are skipped, changed ones re-embed only their changed
+    chunks, and (with `prune`) documents of deleted files are removed.
+    By default this starts a background job; poll /knowledge/jobs/{job_id}.
+    With `background=false` it runs inline and returns the report.
+    """
+    if (user.get("role") or "").lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    if not os.path.isdir(directory):
+        raise HTTPException(status_code=400, detail=f"Not a directory: {directory}")
+    opts = {
+        "role_visibility": role_visibility, "doc_type": doc_type,
+        "chunk_size": chunk_size, "overlap": overlap, "prune": prune,
+    }
+    if background:
+        job_id = start_ingest_job(directory, **opts)
+        return {"ok": True, "job_id": job_id, "status_url": f"/assistant/knowledge/jobs/{job_id}"}
+    try:
+        if is_local_backend():
+            report = sync_directory_local(get_local_store(), directory, **opts)
+        else:
+            report = sync_directory(db, directory, **opts)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"ok": True, **report}
+
+
+@router.get("/knowledge/jobs")
+def ingest_jobs(user: Dict[str, Any] = Depends(get_current_user)):
+    if (user.get("role") or "").lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {"jobs": list_jobs()}
+
+
+@router.get("/knowledge/jobs/{job_id}")
+def ingest_job_status(job_id: str, user: Dict[str, Any] = Depends(get_current_user)):
     if (user.get("role") or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
-    import os
-    ingested = []
-    for root, _, files in os.walk(directory):
-        for fn in files:
-            if not fn.lower().endswith((".md", ".txt")):
-                continue
-            path = os.path.join(root, fn)
-            try:
-                with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
-                chunks = _chunk_text(text)
-                pr = PgVectorRetriever(db)
-                doc_id = pr.ingest(title=fn, source=path, chunks=chunks, role_visibility=role_visibility)
-                ingested.append({"path": path, "document_id": doc_id, "chunks": len(chunks)})
-            except Exception as e:
-                ingested.append({"path": path, "error": str(e)})
-    return {"ok": True, "ingested": ingested}
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 
 from database import get_db
 import models, schemas
+from services.enrollment_counts import record_enrollment_added, record_enrollment_removed
+from services.query_executor import bump_table_versions
 
 router = APIRouter(prefix="/api", tags=["CRUD"])
 
@@ -21,6 +23,7 @@ def create_student(student_in: schemas.StudentCreate, db: Session = Depends(get_
     student = models.Student(**student_in.model_dump())
     db.add(student)
     db.commit()
+    bump_table_versions("students")
     db.refresh(student)
     return student
 
@@ -44,6 +47,7 @@ def update_student(student_id: int, student_in: schemas.StudentCreate, db: Sessi
         setattr(student, k, v)
     db.add(student)
     db.commit()
+    bump_table_versions("students")
     db.refresh(student)
     return student
 
@@ -54,6 +58,7 @@ def delete_student(student_id: int, db: Session = Depends(get_db)):
     _get_or_404(student, "Student")
     db.delete(student)
     db.commit()
+    bump_table_versions("students")
     return {"deleted": True}
 
 
@@ -63,6 +68,7 @@ def create_faculty(fac_in: schemas.FacultyCreate, db: Session = Depends(get_db))
     fac = models.Faculty(**fac_in.model_dump())
     db.add(fac)
     db.commit()
+    bump_table_versions("faculty")
     db.refresh(fac)
     return fac
 
@@ -86,6 +92,7 @@ def update_faculty(faculty_id: int, fac_in: schemas.FacultyCreate, db: Session =
         setattr(fac, k, v)
     db.add(fac)
     db.commit()
+    bump_table_versions("faculty")
     db.refresh(fac)
     return fac
 
@@ -96,6 +103,7 @@ def delete_faculty(faculty_id: int, db: Session = Depends(get_db)):
     _get_or_404(fac, "Faculty")
     db.delete(fac)
     db.commit()
+    bump_table_versions("faculty")
     return {"deleted": True}
 
 
@@ -105,6 +113,7 @@ def create_timeslot(ts_in: schemas.TimeSlotCreate, db: Session = Depends(get_db)
     ts = models.TimeSlot(**ts_in.model_dump())
     db.add(ts)
     db.commit()
+    bump_table_versions("timeslots")
     db.refresh(ts)
     return ts
 
@@ -128,6 +137,7 @@ def update_timeslot(ts_id: int, ts_in: schemas.TimeSlotCreate, db: Session = Dep
         setattr(ts, k, v)
     db.add(ts)
     db.commit()
+    bump_table_versions("timeslots")
     db.refresh(ts)
     return ts
 
@@ -138,6 +148,7 @@ def delete_timeslot(ts_id: int, db: Session = Depends(get_db)):
     _get_or_404(ts, "TimeSlot")
     db.delete(ts)
     db.commit()
+    bump_table_versions("timeslots")
     return {"deleted": True}
 
 
@@ -147,6 +158,7 @@ def create_classroom(c_in: schemas.ClassroomCreate, db: Session = Depends(get_db
     c = models.Classroom(**c_in.model_dump())
     db.add(c)
     db.commit()
+    bump_table_versions("classrooms")
     db.refresh(c)
     return c
 
@@ -170,6 +182,7 @@ def update_classroom(c_id: int, c_in: schemas.ClassroomCreate, db: Session = Dep
         setattr(c, k, v)
     db.add(c)
     db.commit()
+    bump_table_versions("classrooms")
     db.refresh(c)
     return c
 
@@ -180,6 +193,7 @@ def delete_classroom(c_id: int, db: Session = Depends(get_db)):
     _get_or_404(c, "Classroom")
     db.delete(c)
     db.commit()
+    bump_table_versions("classrooms")
     return {"deleted": True}
 
 
@@ -189,6 +203,7 @@ def create_course(course_in: schemas.CourseCreate, db: Session = Depends(get_db)
     course = models.Course(**course_in.model_dump())
     db.add(course)
     db.commit()
+    bump_table_versions("courses")
     db.refresh(course)
     return course
 
@@ -212,6 +227,7 @@ def update_course(course_id: int, course_in: schemas.CourseCreate, db: Session =
         setattr(course, k, v)
     db.add(course)
     db.commit()
+    bump_table_versions("courses")
     db.refresh(course)
     return course
 
@@ -222,6 +238,7 @@ def delete_course(course_id: int, db: Session = Depends(get_db)):
     _get_or_404(course, "Course")
     db.delete(course)
     db.commit()
+    bump_table_versions("courses", "enrollment_counts")
     return {"deleted": True}
 
 
@@ -230,7 +247,10 @@ def delete_course(course_id: int, db: Session = Depends(get_db)):
 def create_enrollment(en_in: schemas.EnrollmentCreate, db: Session = Depends(get_db)):
     enrollment = models.Enrollment(**en_in.model_dump())
     db.add(enrollment)
+    db.flush()
+    record_enrollment_added(db, enrollment)
     db.commit()
+    bump_table_versions("enrollments", "enrollment_counts")
     db.refresh(enrollment)
     return enrollment
 
@@ -250,8 +270,12 @@ def get_enrollment(en_id: int, db: Session = Depends(get_db)):
 def delete_enrollment(en_id: int, db: Session = Depends(get_db)):
     en = db.query(models.Enrollment).filter(models.Enrollment.id == en_id).first()
     _get_or_404(en, "Enrollment")
+    course_id, timestamp = en.course_id, en.timestamp
     db.delete(en)
+    db.flush()
+    record_enrollment_removed(db, course_id, timestamp)
     db.commit()
+    bump_table_versions("enrollments", "enrollment_counts")
     return {"deleted": True}
 
 
@@ -261,6 +285,7 @@ def create_disruption(d_in: schemas.DisruptionCreate, db: Session = Depends(get_
     d = models.DisruptionLog(**d_in.model_dump())
     db.add(d)
     db.commit()
+    bump_table_versions("disruptions")
     db.refresh(d)
     return d
 
@@ -284,6 +309,7 @@ def update_disruption(d_id: int, d_in: schemas.DisruptionCreate, db: Session = D
         setattr(d, k, v)
     db.add(d)
     db.commit()
+    bump_table_versions("disruptions")
     db.refresh(d)
     return d
 
@@ -294,6 +320,7 @@ def delete_disruption(d_id: int, db: Session = Depends(get_db)):
     _get_or_404(d, "Disruption")
     db.delete(d)
     db.commit()
+    bump_table_versions("disruptions")
     return {"deleted": True}
 
 
@@ -303,6 +330,7 @@ def create_optimization_result(r_in: schemas.OptimizationResultCreate, db: Sessi
     r = models.OptimizationResult(**r_in.model_dump())
     db.add(r)
     db.commit()
+    bump_table_versions("optimization_results")
     db.refresh(r)
     return r
 
@@ -326,6 +354,7 @@ def update_optimization_result(r_id: int, r_in: schemas.OptimizationResultCreate
         setattr(r, k, v)
     db.add(r)
     db.commit()
+    bump_table_versions("optimization_results")
     db.refresh(r)
     return r
 
@@ -336,4 +365,5 @@ def delete_optimization_result(r_id: int, db: Session = Depends(get_db)):
     _get_or_404(r, "OptimizationResult")
     db.delete(r)
     db.commit()
+    bump_table_versions("optimization_results")
     return {"deleted": True}
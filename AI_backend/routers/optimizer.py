@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from database import get_supabase
 from services.optimizer import optimize_faculty_assignment, record_disruption_and_solutions, apply_reassignment
 from typing import Dict, Any
+from services.query_executor import bump_table_versions
 
 router = APIRouter(prefix="/optimizer", tags=["Tier3"])
 
@@ -18,6 +19,7 @@ def api_reassign(course_id: int, faculty_unavailable: int , reason: str = "", db
         sols = optimize_faculty_assignment(db, course_id, faculty_unavailable)
         # record disruption & solutions in DB
         record_info = record_disruption_and_solutions(db, course_id, faculty_unavailable, reason or "unspecified")
+        bump_table_versions("disruptions", "optimization_results")
         return {"candidates": sols, "disruption_recorded": record_info}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -33,6 +35,7 @@ def api_approve_reassignment(course_id: int = Body(...), new_faculty_id: int = B
         res = apply_reassignment(db, course_id, new_faculty_id, resolved_by=admin_name)
         if not res.get("success"):
             raise HTTPException(status_code=400, detail=res.get("message", "failed"))
+        bump_table_versions("courses", "disruptions")
         # TODO: notify students via notifications module
         return {"message": "Reassignment applied", "result": res}
     except Exception as e:
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from database import get_supabase  # Ensure this is the correct import for your DB session
 from services.solver import validate_schedule, enroll_student
+from services.query_executor import bump_table_versions
 from models import Enrollment
 from schemas import EnrollmentCreate, EnrollmentOut
 
@@ -34,6 +35,7 @@ def api_enroll(enroll_in: EnrollmentCreate, db = Depends(get_supabase)):
     result = enroll_student(db, enroll_in.student_id, enroll_in.course_id)
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("message", "Could not enroll"))
+    bump_table_versions("enrollments", "enrollment_counts")
 
     # fetch enrollment to return
     # enrollment = db.table("enrollments").select("*").eq("id", result["enrollment"]).limit(1).execute()
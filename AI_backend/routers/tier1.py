@@ -1,19 +1,33 @@
 # routes/tier1.py
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
 from models import ForecastResult
 from services.tier1_prediction_service import run_tier1_forecast
+from services.snapshot import SNAPSHOT_DIR, export_snapshot
 
 router = APIRouter(prefix="/tier1", tags=["Tier 1 – Strategic Planner"])
 
 @router.get("/forecast/run")
-def run_forecast(db: Session = Depends(get_db)):
+def run_forecast(exact: bool = False, use_snapshot: bool = False, db: Session = Depends(get_db)):
     """
     Run Tier 1 forecasting process and store results in DB.
+    Pass `exact=true` to plan sections with the CP-SAT solver (needs ortools).
+    Pass `use_snapshot=true` to read history from the Parquet snapshot
+    (TIER1_SNAPSHOT_DIR) instead of the live enrollments table.
     """
-    return run_tier1_forecast(db)
+    return run_tier1_forecast(db, exact_sections=exact, snapshot_dir=SNAPSHOT_DIR if use_snapshot else None)
+
+@router.post("/snapshot/export")
+def export_enrollment_snapshot(db: Session = Depends(get_db)):
+    """
+    Export enrollment history and catalog tables to TIER1_SNAPSHOT_DIR.
+    """
+    try:
+        return export_snapshot(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/forecast/results")
 def get_forecast_results(db: Session = Depends(get_db)):
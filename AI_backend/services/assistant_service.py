@@ -7,22 +7,34 @@ Convert natural-language user queries into safe, schema-grounded
 SQL queries executed against the SAT-YUG PostgreSQL database.
 """
 
+import os
 import re
+import asyncio
 import json
 import time
 import logging
-from difflib import get_close_matches
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from database import get_db
 from services.pgvector_retriever import PgVectorRetriever
-from services.gemini_client import generate_chat_reply 
+from services.gemini_client import agenerate_chat_reply, astream_chat_reply
+from services.llm_gateway import LLMOverloaded, set_request_deadline
+from services.tracing import annotate, finish_trace, record_span, span, start_trace
 from services.keyword_retriever import KeywordRetriever
+from services.retriever import SimpleRetriever
+from services.vector_store import get_local_store, is_local_backend
+from services.spec_cache import QuerySpecCache, schema_fingerprint
+from services.semantic_cache import SemanticCache, rows_digest
+from services.result_summarizer import budgeted_text, summary_prompt, template_summary
+from services.query_executor import QueryExecutor
+from services.fuzzy_index import FuzzyIndex
+from services.intent_classifier import classify_intent
+from services.intent_router import match_intent, run_intent
+from services.schema_context import StaticSchemaContext
 import models
-  # <-- NEW simple BM25 or LIKE retriever
 
 # ------------------------------------------------------------
 # Logging setup
@@ -68,6 +80,49 @@ ALIASES = {
     "end": "timeslots.end_time",
 }
 
+# ------------------------------------------------------------
+# Query-spec cache (canonical question -> validated spec)
+# ------------------------------------------------------------
+SPEC_CACHE = QuerySpecCache(
+    max_size=int(os.getenv("ASSISTANT_SPEC_CACHE_SIZE", "512")),
+    ttl_s=float(os.getenv("ASSISTANT_SPEC_CACHE_TTL", "3600")),
+)
+
+# Paraphrase-level cache, scoped per (role, user id). Off by default: every
+# spec-cache miss pays an embedding round trip, so enable it only where
+# /assistant/cache/stats shows a hit rate that covers that cost
+SEMANTIC_CACHE_ENABLED = os.getenv("ASSISTANT_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE = SemanticCache(
+    threshold=float(os.getenv("ASSISTANT_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    max_size=int(os.getenv("ASSISTANT_SEMANTIC_CACHE_SIZE", "2000")),
+)
+
+# Offline fallback: BM25 over the repo's knowledge/ docs when pgvector and FTS return nothing
+LOCAL_RETRIEVER = SimpleRetriever(
+    knowledge_root=os.getenv(
+        "LOCAL_KNOWLEDGE_ROOT",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "knowledge"),
+    ),
+    index_path=os.getenv("LOCAL_RETRIEVER_INDEX", "cache/bm25_index.json") or None,
+)
+
+# "template" (default): deterministic summaries, LLM only when no template fits
+# "llm": always ask the LLM (per request via `llm_summary`)
+SUMMARY_MODE = os.getenv("ASSISTANT_SUMMARY_MODE", "template").lower()
+
+# "static" (default): data questions use precomputed schema context (no retrieval),
+#   questions the local intent classifier marks as "doc" are answered from retrieved knowledge
+# "retrieval": retrieve schema snippets for every question
+SCHEMA_CONTEXT_MODE = os.getenv("ASSISTANT_SCHEMA_CONTEXT", "static").lower()
+STATIC_SCHEMA = StaticSchemaContext(SCHEMA, ALIASES)
+DOC_TOP_K = int(os.getenv("ASSISTANT_DOC_TOP_K", "6"))
+# Time budget for all LLM / embedding calls of one request; queued calls past it are shed (503)
+REQUEST_DEADLINE_S = float(os.getenv("ASSISTANT_DEADLINE", "25"))
+# Always attach the span breakdown to responses (otherwise only when a request asks for `debug`)
+DEBUG_TRACES = os.getenv("ASSISTANT_DEBUG", "0") == "1"
+# Rule-matched common questions are answered by native handlers (services/intent_router.py)
+INTENT_ROUTER_ENABLED = os.getenv("ASSISTANT_INTENT_ROUTER", "1") != "0"
+
 # ------------------------------------------------------------
 # Alias map + fuzzy mapping
 # ------------------------------------------------------------
@@ -85,12 +140,18 @@ def fuzzy_map_field(term: str, alias_map: Dict[str, List[str]]) -> Optional[str]
     tkey = term.lower().strip()
     if tkey in alias_map:
         return alias_map[tkey][0]
-    matches = get_close_matches(tkey, alias_map.keys(), n=1, cutoff=0.75)
-    if matches:
-        return alias_map[matches[0]][0]
+    index = ALIAS_INDEX if alias_map is ALIAS_MAP else FuzzyIndex(alias_map.keys())
+    match = index.closest(tkey, cutoff=0.75)
+    if match:
+        return alias_map[match][0]
     return None
 
+# Fuzzy indexes are built once at import: table names, each table's columns, alias keys
 ALIAS_MAP = build_alias_map()
+ALIAS_INDEX = FuzzyIndex(ALIAS_MAP.keys())
+TABLE_INDEX = FuzzyIndex(SCHEMA.keys())
+COLUMN_INDEX = {t: FuzzyIndex(cols) for t, cols in SCHEMA.items()}
+_FUNC_RE = re.compile(r"^([A-Za-z]+)\s*\((.*)\)$")
 
 # ------------------------------------------------------------
 # LLM Prompt Template
@@ -120,13 +181,13 @@ Rules:
 # ------------------------------------------------------------
 # LLM Query-Spec Generator
 # ------------------------------------------------------------
-def ask_llm_for_query_spec(user_text: str, schema_snippets: List[str]) -> Dict[str, Any]:
+async def ask_llm_for_query_spec(user_text: str, schema_snippets: List[str]) -> Dict[str, Any]:
     schema_context = "\nSCHEMA_SNIPPETS:\n" + "\n".join(schema_snippets)
     messages = [
         {"role": "system", "content": QUERY_SPEC_PROMPT + schema_context},
         {"role": "user", "content": user_text},
     ]
-    resp = generate_chat_reply(messages, max_output_tokens=2048)
+    resp = await agenerate_chat_reply(messages, max_output_tokens=2048)
     try:
         return json.loads(resp)
     except Exception:
@@ -146,10 +207,10 @@ def normalize_and_validate_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
     # Validate model
     model = normalized.get("model")
     if model not in SCHEMA:
-        matches = get_close_matches(model, list(SCHEMA.keys()), n=1, cutoff=0.7)
-        if matches:
-            normalized["model"] = matches[0]
-            audit["mapped"][model] = matches[0]
+        match = TABLE_INDEX.closest(model, cutoff=0.7) if isinstance(model, str) else None
+        if match:
+            normalized["model"] = match
+            audit["mapped"][model] = match
         else:
             raise ValueError(f"Unknown table: {model}")
 
@@ -174,13 +235,8 @@ def normalize_and_validate_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
             if alias and alias.startswith(f"{t}."):
                 return alias
             # fuzzy within table
-            match = get_close_matches(c.lower(), [colname.lower() for colname in SCHEMA[t]], n=1, cutoff=0.8)
-            if match:
-                # recover original case by lookup
-                for real in SCHEMA[t]:
-                    if real.lower() == match[0]:
-                        return f"{t}.{real}"
-            return None
+            match = COLUMN_INDEX[t].closest(c, cutoff=0.8)
+            return f"{t}.{match}" if match else None
         # No table provided → assume base model
         c = col.strip()
         if c in SCHEMA[base_model]:
@@ -188,18 +244,14 @@ def normalize_and_validate_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
         alias = ALIASES.get(f"{base_model}.{c}".lower())
         if alias and alias.startswith(f"{base_model}."):
             return alias
-        match = get_close_matches(c.lower(), [colname.lower() for colname in SCHEMA[base_model]], n=1, cutoff=0.85)
-        if match:
-            for real in SCHEMA[base_model]:
-                if real.lower() == match[0]:
-                    return f"{base_model}.{real}"
-        return None
+        match = COLUMN_INDEX[base_model].closest(c, cutoff=0.85)
+        return f"{base_model}.{match}" if match else None
 
     def _is_func(expr: str) -> bool:
-        return bool(re.match(r"^[A-Za-z]+\s*\(.*\)$", expr))
+        return bool(_FUNC_RE.match(expr))
 
     def _normalize_func(expr: str) -> Optional[str]:
-        m = re.match(r"^([A-Za-z]+)\s*\((.*)\)$", expr)
+        m = _FUNC_RE.match(expr)
         if not m:
             return None
         func = m.group(1).lower()
@@ -313,127 +365,481 @@ def normalize_and_validate_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
 # ------------------------------------------------------------
 # Safe SQL Execution
 # ------------------------------------------------------------
-def execute_spec(db: Session, spec: Dict[str, Any]) -> Dict[str, Any]:
-    base_table = spec["model"]
-    fields_list = list(spec["fields"])
-    # Auto GROUP BY when aggregates are mixed with plain columns
-    def _is_agg(expr: str) -> bool:
-        return bool(re.match(r"^[A-Za-z]+\s*\(.*\)$", expr.strip()))
-    has_agg = any(_is_agg(f) for f in fields_list)
-    non_agg_cols = [f for f in fields_list if not _is_agg(f) and "." in f]
-    if has_agg and non_agg_cols and not spec.get("group_by"):
-        spec["group_by"] = non_agg_cols
-    fields = ", ".join(fields_list)
-    sql = f"SELECT {fields} FROM {base_table}"
-
-    # Joins
-    for j in spec.get("joins", []):
-        jt = j["model"]
-        on = " AND ".join([f"{lk} = {rk}" for lk, rk in j["on"].items()])
-        sql += f" JOIN {jt} ON {on}"
-
-    # Filters
-    params = {}
-    where_clauses = []
-    for i, (k, v) in enumerate(spec["filters"].items()):
-        pname = f"p{i}"
-        where_clauses.append(f"{k} = :{pname}")
-        params[pname] = v
-    if where_clauses:
-        sql += " WHERE " + " AND ".join(where_clauses)
-
-    # GROUP BY
-    if spec.get("group_by"):
-        sql += " GROUP BY " + ", ".join(spec["group_by"])
-
-    # ORDER BY
-    if spec.get("order_by"):
-        sql += " ORDER BY " + ", ".join(spec["order_by"])
-
-    sql += f" LIMIT {spec.get('limit', 50)}"
-    result = db.execute(text(sql), params).fetchall()
-    rows = [dict(r._mapping) for r in result]
-    return {"sql": sql, "rows": rows, "count": len(rows)}
+QUERY_EXECUTOR = QueryExecutor()
+
+
+def execute_spec(db: Session, spec: Dict[str, Any], role: Optional[str] = None) -> Dict[str, Any]:
+    """Run a validated spec through the guarded executor (row cap, per-role timeout, result cache)."""
+    return QUERY_EXECUTOR.execute(db, spec, role=role)
 
 # ------------------------------------------------------------
 # Hybrid Retrieval (Dense + Keyword)
 # ------------------------------------------------------------
-def hybrid_schema_retrieval(db: Session, user_text: str, top_k: int = 8) -> List[str]:
+RRF_K = 60  # standard reciprocal-rank-fusion damping constant
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Fuse ranked hit lists by chunk id: score = sum(1 / (k + rank))."""
+    scores: Dict[Any, float] = {}
+    hits: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = hit.get("id", hit.get("chunk_text"))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            hits.setdefault(key, hit)
+    return [hits[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _timed(fn, *args, **kwargs) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, round((time.perf_counter() - t0) * 1000, 1)
+
+
+def _dense_search(
+    db: Session, user_text: str, top_k: int, doc_type: Optional[str] = "schema", role: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    with span("retrieval.dense"):
+        if is_local_backend():
+            return get_local_store().search(user_text, filter={"type": doc_type}, k=top_k, role_visibility=role)
+        # Own session: runs concurrently with the keyword search on `db`
+        with Session(bind=db.get_bind()) as dense_db:
+            return PgVectorRetriever(dense_db).search(user_text, filter={"type": doc_type}, k=top_k, role_visibility=role)
+
+
+def _local_bm25_search(user_text: str, top_k: int, role: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Local BM25 hits. The index has no visibility data, so a role-scoped query
+    keeps only files the local store has ingested as public or for that role
+    (none when the store is not the backend).
     """
-    Combine dense (vector) retrieval and keyword retrieval
-    to collect schema snippets for grounding the LLM.
+    hits = LOCAL_RETRIEVER.search(user_text, top_k)
+    if role is not None:
+        allowed = get_local_store().visible_sources(role) if is_local_backend() else set()
+        hits = [h for h in hits if h[0] in allowed]
+    return [{"source": p, "chunk_text": c, "score": s} for p, c, s in hits]
+
+
+def _keyword_search(
+    db: Session, user_text: str, top_k: int, doc_type: Optional[str] = "schema", role: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    with span("retrieval.keyword"):
+        if is_local_backend():
+            # No Postgres FTS offline: the local BM25 index is the keyword leg
+            return _local_bm25_search(user_text, top_k, role)
+        return KeywordRetriever(db).search(user_text, {"type": doc_type}, top_k, role_visibility=role)
+
+
+async def hybrid_retrieval(
+    db: Session,
+    user_text: str,
+    top_k: int = 8,
+    doc_type: Optional[str] = "schema",
+    role: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
-    vector_retriever = PgVectorRetriever(db)
-    keyword_retriever = KeywordRetriever(db)
+    Combine dense (vector) retrieval and keyword retrieval over knowledge
+    chunks of `doc_type` (None = any type). Both run concurrently and are
+    merged with reciprocal rank fusion over chunk ids. Returns the fused
+    hits and per-retriever timings; a failing retriever is skipped.
+    With VECTOR_BACKEND=local both legs are in-process (local vector
+    store + BM25), so retrieval needs no database or API.
+    """
+    with span("retrieval", doc_type=doc_type):
+        return await _hybrid_retrieval(db, user_text, top_k, doc_type, role)
+
+
+async def _hybrid_retrieval(
+    db: Session, user_text: str, top_k: int, doc_type: Optional[str], role: Optional[str]
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    t0 = time.perf_counter()
+    dense, keyword = await asyncio.gather(
+        asyncio.to_thread(_timed, _dense_search, db, user_text, top_k, doc_type, role),
+        asyncio.to_thread(_timed, _keyword_search, db, user_text, top_k, doc_type, role),
+        return_exceptions=True,
+    )
+    timings: Dict[str, Any] = {}
+    rankings: List[List[Dict[str, Any]]] = []
+    for name, res in (("dense", dense), ("keyword", keyword)):
+        if isinstance(res, BaseException):
+            logger.warning(f"{name} retrieval failed: {res}")
+            timings[f"{name}_error"] = str(res)
+            continue
+        hits, ms = res
+        if is_local_backend():
+            # The local store and BM25 index have separate id spaces but share the
+            # chunker (services.retriever.CHUNK_WORDS), so fuse on chunk text
+            hits = [{k: v for k, v in h.items() if k != "id"} for h in hits]
+        timings[f"{name}_ms"] = ms
+        timings[f"{name}_hits"] = len(hits)
+        rankings.append(hits)
+    with span("retrieval.fusion"):
+        fused = reciprocal_rank_fusion(rankings)
+    if not fused:
+        # pgvector / embedding API / FTS unavailable or empty: use the local BM25 index
+        with span("retrieval.local"):
+            local, ms = await asyncio.to_thread(_timed, _local_bm25_search, user_text, top_k, role)
+        timings["local_ms"] = ms
+        timings["local_hits"] = len(local)
+        fused = local
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return fused[:top_k], timings
+
+
+async def hybrid_schema_retrieval(db: Session, user_text: str, top_k: int = 8) -> Tuple[List[str], Dict[str, Any]]:
+    """Schema snippets for grounding the spec LLM, with retrieval timings."""
+    hits, timings = await hybrid_retrieval(db, user_text, top_k)
+    return [h.get("chunk_text") or "" for h in hits], timings
 
-    dense_hits = vector_retriever.search(user_text, filter={"type": "schema"}, k=top_k)
-    keyword_hits = keyword_retriever.search(user_text, filter={"type": "schema"}, k=top_k)
+# ------------------------------------------------------------
+# Document questions
+# ------------------------------------------------------------
+DOC_ANSWER_PROMPT = """
+You answer questions about SAT-YUG policies, rules and processes using only
+the DOCUMENTS below. Answer in a few concise sentences. If the documents do
+not contain the answer, say so instead of guessing.
+"""
 
-    # Deduplicate by table name or chunk_id
-    def extract_text(hit):
-        if isinstance(hit, dict):
-            return hit.get("chunk_text") or hit.get("text", "")
-        return str(hit)
 
-    dense_texts = [extract_text(h) for h in dense_hits]
-    keyword_texts = [extract_text(h) for h in keyword_hits]
+async def _iter_doc_answer(
+    db: Session,
+    user: Dict[str, Any],
+    text: str,
+    intent: Dict[str, Any],
+    stream_summary: bool,
+    t0: float,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    def _ms() -> float:
+        return round((time.perf_counter() - t0) * 1000, 1)
+
+    timings: Dict[str, Any] = {}
+    hits, timings["retrieval"] = await hybrid_retrieval(
+        db, text, top_k=DOC_TOP_K, doc_type=None, role=(user.get("role") or "").lower() or None
+    )
+    sources = [{"source": h.get("source"), "score": h.get("score")} for h in hits]
+    yield "docs", {"sources": sources, "timings": timings, "elapsed_ms": _ms()}
+
+    if not hits:
+        answer = "I couldn't find anything about that in the knowledge base."
+        if stream_summary:
+            yield "summary_delta", {"text": answer}
+    else:
+        documents = "\n\n".join(budgeted_text(h.get("chunk_text") or "", len(hits)) for h in hits)
+        messages = [
+            {"role": "system", "content": DOC_ANSWER_PROMPT + "\nDOCUMENTS:\n" + documents},
+            {"role": "user", "content": text},
+        ]
+        s0 = time.perf_counter()
+        try:
+            if stream_summary:
+                parts: List[str] = []
+                async for chunk in astream_chat_reply(messages, max_output_tokens=1024):
+                    parts.append(chunk)
+                    yield "summary_delta", {"text": chunk}
+                answer = "".join(parts)
+            else:
+                answer = await agenerate_chat_reply(messages, max_output_tokens=1024)
+            record_span("summary", s0, time.perf_counter(), mode="llm")
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            logger.error(f"Doc answer error: {e}")
+            yield "error", {"status": "error", "message": f"Failed to answer from documents: {e}"}
+            return
+    yield "done", {
+        "status": "success",
+        "intent": intent,
+        "final_answer": answer,
+        "sources": sources,
+        "timings": timings,
+        "elapsed_ms": _ms(),
+    }
 
-    # Merge with preference to dense but include unique keyword ones
-    combined = dense_texts[:]
-    for t in keyword_texts:
-        if not any(t[:50] in x for x in combined):
-            combined.append(t)
-    return combined[:top_k]
+# ------------------------------------------------------------
+# Native intent handlers
+# ------------------------------------------------------------
+async def _iter_native_answer(
+    text: str,
+    route: Dict[str, Any],
+    spec: Dict[str, Any],
+    results: Dict[str, Any],
+    intent: Optional[Dict[str, Any]],
+    stream_summary: bool,
+    llm_summary: bool,
+    t0: float,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    def _ms() -> float:
+        return round((time.perf_counter() - t0) * 1000, 1)
+
+    cache_info = {"route": route["intent"], "result": "hit" if results["cached"] else "miss"}
+    annotate(spec=spec, sql=results["sql"])
+    yield "spec", {"spec": spec, "route": route, "elapsed_ms": _ms()}
+    yield "rows", {
+        "sql": results["sql"], "rows": results["rows"], "count": results["count"],
+        "capped": results["capped"], "elapsed_ms": _ms(),
+    }
+    s0 = time.perf_counter()
+    answer = None if llm_summary else template_summary(spec, results["rows"], results["truncated"])
+    if answer is not None:
+        cache_info["summary"] = "template"
+        if stream_summary:
+            yield "summary_delta", {"text": answer}
+    else:
+        cache_info["summary"] = "llm"
+        messages = [{"role": "system", "content": summary_prompt(text, results["rows"])}]
+        if stream_summary:
+            parts: List[str] = []
+            async for chunk in astream_chat_reply(messages, max_output_tokens=1024):
+                parts.append(chunk)
+                yield "summary_delta", {"text": chunk}
+            answer = "".join(parts)
+        else:
+            answer = await agenerate_chat_reply(messages, max_output_tokens=1024)
+    record_span("summary", s0, time.perf_counter(), mode=cache_info["summary"])
+    yield "done", {
+        "status": "success",
+        "intent": intent,
+        "route": route,
+        "final_answer": answer,
+        "sql": results["sql"],
+        "rows": results["rows"],
+        "cache": cache_info,
+        "timings": {},
+        "elapsed_ms": _ms(),
+    }
 
 # ------------------------------------------------------------
 # Main Endpoint Function
 # ------------------------------------------------------------
-def handle_user_query(db: Session, user: Dict[str, Any], text: str) -> Dict[str, Any]:
+async def iter_user_query(
+    db: Session,
+    user: Dict[str, Any],
+    text: str,
+    stream_summary: bool = True,
+    llm_summary: Optional[bool] = None,
+    debug: bool = False,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
     """
-    Conversational AI endpoint core handler.
+    Run the assistant pipeline, yielding (event, data) as each stage completes:
+    "cache", "spec", "rows", then "summary_delta" chunks (when `stream_summary`)
+    and a final "done" carrying the full response. Failures yield "error" and stop.
+    In static-context mode, questions classified as document questions take
+    the knowledge path instead: "docs" (sources), "summary_delta", "done".
+    Questions the intent router recognizes skip caches and the spec LLM:
+    a native handler's "spec" (with "route"), "rows", summary and "done".
+    Summaries come from templates unless `llm_summary` (default
+    ASSISTANT_SUMMARY_MODE) asks for the LLM or no template fits.
+    LLM calls are awaited on the shared async client; blocking DB and
+    embedding stages run in worker threads so the event loop stays free.
+    When the LLM gateway sheds a call, LLMOverloaded propagates to the caller.
+    Every stage is traced (services/tracing.py); with `debug` (or
+    ASSISTANT_DEBUG=1) "done" carries the span breakdown under "debug".
     """
-
-    # 1️⃣ Retrieve schema context via hybrid retrieval
-    schema_snippets = hybrid_schema_retrieval(db, text)
-    if not schema_snippets:
-        schema_snippets = [f"{t}: {', '.join(cols)}" for t, cols in SCHEMA.items()]
-
-    # 2️⃣ Ask LLM for structured query spec
-    try:
-        spec = ask_llm_for_query_spec(text, schema_snippets)
-    except Exception as e:
-        logger.error(f"LLM query spec error: {e}")
-        return {"status": "error", "message": f"Failed to parse LLM output: {e}"}
-
-    # 3️⃣ Normalize + Validate
+    trace = start_trace(question=text, role=(user.get("role") or "").lower())
     try:
-        normalized_spec = normalize_and_validate_spec(spec)
-    except Exception as e:
-        logger.error(f"Spec validation error: {e}")
-        return {"status": "error", "message": f"Invalid spec: {e}", "raw_spec": spec}
+        async for event, data in _iter_pipeline(db, user, text, stream_summary, llm_summary):
+            if event in ("done", "error"):
+                path = "error" if event == "error" else (
+                    "native" if data.get("route") else "doc" if "sources" in data else "llm"
+                )
+                finish_trace(trace, path)
+                if event == "done" and (debug or DEBUG_TRACES):
+                    data = {**data, "debug": trace.to_dict()}
+            yield event, data
+    finally:
+        finish_trace(trace, "error")
+
+
+async def _iter_pipeline(
+    db: Session,
+    user: Dict[str, Any],
+    text: str,
+    stream_summary: bool,
+    llm_summary: Optional[bool],
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    t0 = time.perf_counter()
+    set_request_deadline(REQUEST_DEADLINE_S)
+
+    def _ms() -> float:
+        return round((time.perf_counter() - t0) * 1000, 1)
+
+    # Local classification: only document questions need knowledge retrieval
+    with span("classify"):
+        intent = classify_intent(text) if SCHEMA_CONTEXT_MODE == "static" else None
+    if intent and intent["intent"] == "doc":
+        async for event in _iter_doc_answer(db, user, text, intent, stream_summary, t0):
+            yield event
+        return
+
+    if llm_summary is None:
+        llm_summary = SUMMARY_MODE == "llm"
+
+    # Recognized common questions: native handler, no spec LLM call
+    with span("route"):
+        route = match_intent(text, user) if INTENT_ROUTER_ENABLED else None
+    if route:
+        try:
+            with span("native", intent=route["intent"]):
+                spec, results = await asyncio.to_thread(run_intent, QUERY_EXECUTOR, db, user, route)
+        except Exception as e:
+            # Fall back to the LLM path
+            logger.warning(f"Native handler {route['intent']} failed: {e}")
+        else:
+            async for event in _iter_native_answer(
+                text, route, spec, results, intent, stream_summary, llm_summary, t0
+            ):
+                yield event
+            return
+
+    fingerprint = schema_fingerprint(SCHEMA, ALIASES, QUERY_SPEC_PROMPT, SCHEMA_CONTEXT_MODE)
+    cache_info: Dict[str, Any] = {"spec": "miss", "semantic": "off"}
+    timings: Dict[str, Any] = {}
+
+    # 0️⃣ Spec cache: a repeated question reuses its validated spec
+    with span("spec_cache"):
+        normalized_spec = SPEC_CACHE.get(text, fingerprint)
+    if normalized_spec is not None:
+        cache_info["spec"] = "hit"
+
+    # 0️⃣b Semantic cache: a paraphrase (same role + user) reuses spec and maybe answer
+    semantic_scope = (fingerprint, (user.get("role") or "").lower(), user.get("id"))
+    semantic_vec = None
+    semantic_entry = None
+    if normalized_spec is None and SEMANTIC_CACHE_ENABLED:
+        with span("semantic_cache"):
+            semantic_vec = await asyncio.to_thread(SEMANTIC_CACHE.embed, text)
+            semantic_entry, similarity = SEMANTIC_CACHE.lookup(semantic_scope, semantic_vec, text)
+        cache_info["semantic"] = "hit" if semantic_entry else "miss"
+        cache_info["similarity"] = round(similarity, 4)
+        if semantic_entry:
+            normalized_spec = semantic_entry["spec"]
+            cache_info["matched_question"] = semantic_entry["question"]
+    yield "cache", {**cache_info, "elapsed_ms": _ms()}
+
+    if normalized_spec is None:
+        # 1️⃣ Schema context: precomputed per role, or via hybrid retrieval
+        if SCHEMA_CONTEXT_MODE == "static":
+            schema_snippets = STATIC_SCHEMA.for_role(user.get("role"))
+            timings["context"] = "static"
+        else:
+            schema_snippets, timings["retrieval"] = await hybrid_schema_retrieval(db, text)
+        if not schema_snippets:
+            schema_snippets = [f"{t}: {', '.join(cols)}" for t, cols in SCHEMA.items()]
+
+        # 2️⃣ Ask LLM for structured query spec
+        try:
+            with span("llm.spec"):
+                spec = await ask_llm_for_query_spec(text, schema_snippets)
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            logger.error(f"LLM query spec error: {e}")
+            yield "error", {"status": "error", "message": f"Failed to parse LLM output: {e}"}
+            return
+
+        # 3️⃣ Normalize + Validate
+        annotate(raw_spec=spec)
+        try:
+            with span("normalize"):
+                normalized_spec = normalize_and_validate_spec(spec)
+        except Exception as e:
+            logger.error(f"Spec validation error: {e}")
+            yield "error", {"status": "error", "message": f"Invalid spec: {e}", "raw_spec": spec}
+            return
+    annotate(spec=normalized_spec)
+    yield "spec", {"spec": normalized_spec, "timings": timings, "elapsed_ms": _ms()}
 
     # 4️⃣ Execute SQL safely
     try:
-        results = execute_spec(db, normalized_spec)
+        with span("sql") as attrs:
+            results = await asyncio.to_thread(execute_spec, db, normalized_spec, user.get("role"))
+            attrs.update(rows=results["count"], cached=results["cached"])
     except Exception as e:
         logger.error(f"SQL execution error: {e}")
-        return {"status": "error", "message": f"Execution failed: {e}", "sql": normalized_spec}
-
-    # 5️⃣ Natural-language summary
-    summary_prompt = f"""
-    You are a summarizer. Describe the following SQL result in two or three concise sentences:
-    {results['rows']}
-    """
-    nl_summary = generate_chat_reply([{"role": "system", "content": summary_prompt}], max_output_tokens=1024)
+        yield "error", {"status": "error", "message": f"Execution failed: {e}", "sql": normalized_spec}
+        return
+    cache_info["result"] = "hit" if results["cached"] else "miss"
+    annotate(sql=results["sql"])
+    yield "rows", {
+        "sql": results["sql"],
+        "rows": results["rows"],
+        "count": results["count"],
+        "capped": results["capped"],
+        "audit": normalized_spec.get("audit", {}),
+        "elapsed_ms": _ms(),
+    }
 
-    return {
+    # Only specs that executed cleanly are worth reusing
+    if cache_info["spec"] == "miss":
+        SPEC_CACHE.put(text, fingerprint, normalized_spec)
+
+    # 5️⃣ Natural-language summary (reused when a cached answer saw the same rows)
+    s0 = time.perf_counter()
+    digest = rows_digest(results["rows"])
+    nl_summary = None if llm_summary else template_summary(normalized_spec, results["rows"], results["truncated"])
+    if semantic_entry and not llm_summary and semantic_entry.get("answer") and semantic_entry.get("rows_digest") == digest:
+        nl_summary = semantic_entry["answer"]
+        cache_info["answer"] = "reused"
+        if stream_summary:
+            yield "summary_delta", {"text": nl_summary}
+    elif nl_summary is not None:
+        # Templated: no LLM round trip
+        cache_info["summary"] = "template"
+        if stream_summary:
+            yield "summary_delta", {"text": nl_summary}
+        if semantic_entry:
+            SEMANTIC_CACHE.update_answer(semantic_entry["id"], nl_summary, digest)
+        elif semantic_vec is not None:
+            SEMANTIC_CACHE.store(semantic_scope, semantic_vec, text, normalized_spec, nl_summary, digest)
+    else:
+        cache_info["summary"] = "llm"
+        # Large results are profiled + sampled to the token budget, not dumped whole
+        summary_messages = [{"role": "system", "content": summary_prompt(text, results["rows"])}]
+        if stream_summary:
+            parts: List[str] = []
+            async for chunk in astream_chat_reply(summary_messages, max_output_tokens=1024):
+                parts.append(chunk)
+                yield "summary_delta", {"text": chunk}
+            nl_summary = "".join(parts)
+        else:
+            nl_summary = await agenerate_chat_reply(summary_messages, max_output_tokens=1024)
+        if semantic_entry:
+            SEMANTIC_CACHE.update_answer(semantic_entry["id"], nl_summary, digest)
+        elif semantic_vec is not None:
+            SEMANTIC_CACHE.store(semantic_scope, semantic_vec, text, normalized_spec, nl_summary, digest)
+    record_span("summary", s0, time.perf_counter(), mode=cache_info.get("summary") or cache_info.get("answer"))
+
+    yield "done", {
         "status": "success",
+        "intent": intent,
         "final_answer": nl_summary,
         "sql": results["sql"],
         "rows": results["rows"],
         "audit": normalized_spec.get("audit", {}),
+        "cache": cache_info,
+        "timings": timings,
+        "elapsed_ms": _ms(),
     }
 
+
+async def handle_user_query(
+    db: Session,
+    user: Dict[str, Any],
+    text: str,
+    llm_summary: Optional[bool] = None,
+    debug: bool = False,
+) -> Dict[str, Any]:
+    """
+    Conversational AI endpoint core handler: runs `iter_user_query` to
+    completion and returns the final response (or the error payload).
+    """
+    async for event, data in iter_user_query(
+        db, user, text, stream_summary=False, llm_summary=llm_summary, debug=debug
+    ):
+        if event in ("done", "error"):
+            return data
+    return {"status": "error", "message": "Assistant pipeline ended without a result"}
+
 def _schema_slices_from_models(tables: List[str]) -> List[str]:
     """Produce small textual summaries of selected tables/columns from SQLAlchemy models for RAG context."""
     registry: Dict[str, Any] = {
@@ -0,0 +1,134 @@
+"""
+embedding_cache.py
+SAT-YUG Assistant : Content-hash embedding cache
+------------------------------------------------
+Embeddings are a pure function of (model, text), so they are cached under
+(model, sha256(text)) and never go stale. Two tiers:
+- memory: LRU-bounded dict of float32 vectors, per process
+- disk: a SQLite file shared by all workers on the host, so re-ingesting
+  a corpus or restarting the server does not re-embed known text
+Changing EMBED_MODEL (or GEN_AI_BASE_URL) changes the key, so old vectors
+are simply not hit.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def text_key(model: str, text: str) -> str:
+    return model + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[str] = None, max_memory: int = 10000) -> None:
+        self.path = path
+        self.max_memory = max_memory
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vec BLOB)")
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error:
+                # Fall back to memory only rather than failing every embed call
+                self.disk_errors += 1
+                self._conn = None
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        # Caller holds the lock
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for whichever `keys` are known (memory first, then disk)."""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for k in keys:
+                vec = self._mem.get(k)
+                if vec is None:
+                    missing.append(k)
+                else:
+                    self._mem.move_to_end(k)
+                    found[k] = vec
+                    self.memory_hits += 1
+
+            if missing and self._conn is not None:
+                try:
+                    # Stay well under SQLite's bound-parameter limit
+                    for i in range(0, len(missing), 500):
+                        part = missing[i:i + 500]
+                        rows = self._conn.execute(
+                            f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                        ).fetchall()
+                        for k, blob in rows:
+                            vec = np.frombuffer(blob, dtype=np.float32)
+                            found[k] = vec
+                            self._remember(k, vec)
+                            self.disk_hits += 1
+                except sqlite3.Error:
+                    self.disk_errors += 1
+            self.misses += sum(1 for k in missing if k not in found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for k, vec in items.items():
+                self._remember(k, vec)
+            if self._conn is not None:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, dim, vec) VALUES (?, ?, ?)",
+                        [(k, int(v.shape[0]), v.tobytes()) for k, v in items.items()],
+                    )
+                    self._conn.commit()
+                except sqlite3.Error:
+                    self.disk_errors += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk_size = None
+            if self._conn is not None:
+                try:
+                    disk_size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_size": len(self._mem),
+                "max_memory": self.max_memory,
+                "disk_path": self.path if self._conn is not None else None,
+                "disk_size": disk_size,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_errors": self.disk_errors,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / total, 4) if total else 0.0,
+            }
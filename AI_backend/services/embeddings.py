@@ -1,34 +1,176 @@
 import os
-from typing import List, Dict, Any
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 import httpx
+import numpy as np
+
+from services.embedding_cache import EmbeddingCache, text_key
+from services.llm_gateway import EMBED_GATEWAY
+from services.tracing import span
 
 
 API_KEY = os.getenv("GOOGLE_API_KEY")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-004")
+# Override to point at a local stand-in (utils/mock_genai_server.py)
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com"
+API_BASE = os.getenv("GEN_AI_BASE_URL", DEFAULT_API_BASE).rstrip("/")
+# batchEmbedContents accepts at most 100 requests per call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "30"))
+
+# Content-hash cache: in-memory LRU in front of a SQLite file (EMBED_CACHE=0 disables)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") != "0"
+EMBED_CACHE = EmbeddingCache(
+    path=os.getenv("EMBED_CACHE_PATH", "cache/embeddings.sqlite") or None,
+    max_memory=int(os.getenv("EMBED_CACHE_MEMORY_SIZE", "10000")),
+) if EMBED_CACHE_ENABLED else None
+
+# Cache namespace: vectors from a non-default endpoint (e.g. the mock) never
+# share keys with, and so are never served in place of, the real API's
+EMBED_CACHE_NAMESPACE = EMBED_MODEL if API_BASE == DEFAULT_API_BASE else f"{API_BASE}|{EMBED_MODEL}"
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.Client] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    """Shared keep-alive client so batches reuse pooled connections."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(
+                    timeout=EMBED_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=max(EMBED_CONCURRENCY * 2, 4),
+                        max_keepalive_connections=max(EMBED_CONCURRENCY, 2),
+                    ),
+                )
+    return _client
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def _get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool, so concurrent callers share one concurrency bound."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(EMBED_CONCURRENCY, 1), thread_name_prefix="embed")
+    return _executor
+
+
+def _retry_delay(attempt: int, resp: Optional[httpx.Response]) -> float:
+    if resp is not None:
+        retry_after = resp.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), 60.0)
+            except ValueError:
+                pass
+    # Exponential backoff with full jitter: 0.5s, 1s, 2s, ... capped at 20s
+    return random.uniform(0, min(20.0, 0.5 * (2 ** attempt)))
+
+
+def _post_with_retry(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    client = _get_client()
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        resp = None
+        try:
+            resp = client.post(url, json=payload)
+            if resp.status_code not in RETRYABLE_STATUS:
+                resp.raise_for_status()
+                return resp.json()
+        except httpx.TransportError:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+        if attempt == EMBED_MAX_RETRIES:
+            resp.raise_for_status()
+        delay = _retry_delay(attempt, resp)
+        if resp is not None and resp.status_code == 429:
+            # Other callers back off too instead of spending their own 429s
+            EMBED_GATEWAY.throttle(delay)
+        time.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+def _parse_vector(embedding: Dict[str, Any]) -> List[float]:
+    vec = (embedding or {}).get("values") or (embedding or {}).get("value") or []
+    if not isinstance(vec, list):
+        raise RuntimeError("Unexpected embedding response format")
+    return vec
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    url = f"{API_BASE}/v1/models/{EMBED_MODEL}:batchEmbedContents?key={API_KEY}"
+    payload: Dict[str, Any] = {
+        "requests": [
+            {"model": f"models/{EMBED_MODEL}", "content": {"parts": [{"text": t}]}}
+            for t in texts
+        ]
+    }
+    # Admission-controlled; concurrent identical batches (e.g. the same question) share one call
+    with span("embed.batch", texts=len(texts)):
+        data = EMBED_GATEWAY.call((EMBED_MODEL, tuple(texts)), lambda: _post_with_retry(url, payload))
+    embeddings = data.get("embeddings") or []
+    if len(embeddings) != len(texts):
+        raise RuntimeError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+    return [_parse_vector(e) for e in embeddings]
+
+
+def _embed_uncached(texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
     if not API_KEY:
         raise RuntimeError("GOOGLE_API_KEY is not set for embeddings")
-    url = f"https://generativelanguage.googleapis.com/v1/models/{EMBED_MODEL}:embedContent?key={API_KEY}"
+    size = max(1, min(batch_size or EMBED_BATCH_SIZE, 100))
+    batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+
+    if len(batches) == 1 or EMBED_CONCURRENCY <= 1:
+        results = [_embed_batch(b) for b in batches]
+    else:
+        # Executor.map yields in submission order, so batch order is preserved
+        results = list(_get_executor().map(_embed_batch, batches))
+
     outputs: List[List[float]] = []
-    with httpx.Client(timeout=30.0) as client:
-        for t in texts:
-            payload: Dict[str, Any] = {
-                "model": EMBED_MODEL,
-                "content": {"parts": [{"text": t}]},
-            }
-            resp = client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            vec = (
-                data.get("embedding", {}).get("values")
-                or data.get("embedding", {}).get("value")
-                or []
-            )
-            if not isinstance(vec, list):
-                raise RuntimeError("Unexpected embedding response format")
-            outputs.append(vec)
+    for r in results:
+        outputs.extend(r)
     return outputs
 
 
+def embed_texts(texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+    """
+    Embed `texts` with batchEmbedContents, running up to EMBED_CONCURRENCY
+    batches at once over a shared keep-alive client. 429/5xx responses and
+    transport errors are retried with backoff. Output order matches input.
+
+    Only texts missing from the embedding cache (and duplicates within the
+    call only once) are sent to the API.
+    """
+    if not texts:
+        return []
+    if EMBED_CACHE is None:
+        return _embed_uncached(texts, batch_size)
+
+    keys = [text_key(EMBED_CACHE_NAMESPACE, t) for t in texts]
+    found = EMBED_CACHE.get_many(list(dict.fromkeys(keys)))
+    todo: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in todo:
+            todo[k] = t
+    if todo:
+        vecs = _embed_uncached(list(todo.values()), batch_size)
+        fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(todo, vecs)}
+        EMBED_CACHE.put_many(fresh)
+        found.update(fresh)
+    # Cached and fresh vectors both come back as float32 values, so a hit is bit-identical to a miss
+    return [found[k].tolist() for k in keys]
+
+
+def embedding_cache_stats() -> Optional[Dict[str, Any]]:
+    return EMBED_CACHE.stats() if EMBED_CACHE is not None else None
@@ -0,0 +1,322 @@
+"""
+enrollment_counts.py
+SAT-YUG : Maintained enrollment aggregate
+-----------------------------------------
+Keeps `enrollment_counts` (course_id, year) -> count / first / last
+timestamp in step with the `enrollments` table so seat checks,
+forecasts and dashboards never have to count raw rows.
+
+Two maintenance modes (ENROLLMENT_COUNTS_MODE):
+- "app" (default): SQLAlchemy writers update the aggregate in the same
+  transaction as the enrollment insert/delete; Supabase-client inserts
+  call the `enrollment_counts_apply` Postgres function right after.
+- "trigger": Postgres triggers on `enrollments` maintain it; the app
+  hooks become no-ops.
+`ensure_enrollment_counts` runs at startup: it creates the aggregate table
+and the hot-path indexes (databases not built by `create_all`), installs
+the function and backfills an empty aggregate. Until the aggregate has rows the readers
+count `enrollments` directly, so seat checks never read 0 on a fresh
+deploy. `reconcile_enrollment_counts` rebuilds the table from
+`enrollments` and reports any drift.
+
+Every path counts an enrollment by its own timestamp's year. Rows without
+a timestamp are skipped everywhere (apply, triggers, reconcile); writers
+always stamp one and the column defaults to now() in the database.
+Years are per course, and a course belongs to exactly one semester, so
+(course_id, year) is already the per-semester key; `semester` is carried
+as a column for readers that group by it.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+COUNTS_MODE = os.getenv("ENROLLMENT_COUNTS_MODE", "app").lower()
+
+logger = logging.getLogger(__name__)
+
+# Set once the aggregate has rows; until then readers count `enrollments`
+_aggregate_ready = False
+
+UPSERT_SQL = text("""
+    INSERT INTO enrollment_counts (course_id, year, semester, enrollment_count, first_enrolled_at, last_enrolled_at)
+    VALUES (:course_id, :year, :semester, 1, :ts, :ts)
+    ON CONFLICT (course_id, year) DO UPDATE SET
+        enrollment_count = enrollment_counts.enrollment_count + 1,
+        semester = EXCLUDED.semester,
+        first_enrolled_at = LEAST(enrollment_counts.first_enrolled_at, EXCLUDED.first_enrolled_at),
+        last_enrolled_at = GREATEST(enrollment_counts.last_enrolled_at, EXCLUDED.last_enrolled_at)
+""")
+
+# Run after the enrollment row is flushed away, so MIN/MAX see the remaining rows
+DECREMENT_SQL = text("""
+    UPDATE enrollment_counts SET
+        enrollment_count = GREATEST(enrollment_count - 1, 0),
+        first_enrolled_at = (
+            SELECT MIN(e.timestamp) FROM enrollments e
+            WHERE e.course_id = :course_id AND e.timestamp >= :start AND e.timestamp < :end
+        ),
+        last_enrolled_at = (
+            SELECT MAX(e.timestamp) FROM enrollments e
+            WHERE e.course_id = :course_id AND e.timestamp >= :start AND e.timestamp < :end
+        )
+    WHERE course_id = :course_id AND year = :year
+""")
+
+ACTUAL_COUNTS_SQL = """
+    SELECT e.course_id,
+           CAST(EXTRACT(YEAR FROM e.timestamp) AS integer) AS year,
+           MAX(c.semester) AS semester,
+           COUNT(*) AS enrollment_count,
+           MIN(e.timestamp) AS first_enrolled_at,
+           MAX(e.timestamp) AS last_enrolled_at
+    FROM enrollments e
+    JOIN courses c ON c.id = e.course_id
+    WHERE e.timestamp IS NOT NULL
+    GROUP BY e.course_id, CAST(EXTRACT(YEAR FROM e.timestamp) AS integer)
+"""
+
+APPLY_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION enrollment_counts_apply(p_course_id integer, p_ts timestamp, p_delta integer)
+RETURNS void AS $$
+DECLARE
+  v_year integer := CAST(EXTRACT(YEAR FROM p_ts) AS integer);
+BEGIN
+  IF p_course_id IS NULL OR p_ts IS NULL THEN
+    RETURN;
+  END IF;
+  IF p_delta > 0 THEN
+    INSERT INTO enrollment_counts (course_id, year, semester, enrollment_count, first_enrolled_at, last_enrolled_at)
+    VALUES (p_course_id, v_year, (SELECT semester FROM courses WHERE id = p_course_id), 1, p_ts, p_ts)
+    ON CONFLICT (course_id, year) DO UPDATE SET
+      enrollment_count = enrollment_counts.enrollment_count + 1,
+      first_enrolled_at = LEAST(enrollment_counts.first_enrolled_at, EXCLUDED.first_enrolled_at),
+      last_enrolled_at = GREATEST(enrollment_counts.last_enrolled_at, EXCLUDED.last_enrolled_at);
+  ELSE
+    UPDATE enrollment_counts SET
+      enrollment_count = GREATEST(enrollment_count - 1, 0),
+      first_enrolled_at = (SELECT MIN(timestamp) FROM enrollments
+                           WHERE course_id = p_course_id AND CAST(EXTRACT(YEAR FROM timestamp) AS integer) = v_year),
+      last_enrolled_at = (SELECT MAX(timestamp) FROM enrollments
+                          WHERE course_id = p_course_id AND CAST(EXTRACT(YEAR FROM timestamp) AS integer) = v_year)
+    WHERE course_id = p_course_id AND year = v_year;
+  END IF;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Schema for databases not created through Base.metadata.create_all
+SCHEMA_SQL = [
+    """CREATE TABLE IF NOT EXISTS enrollment_counts (
+        course_id integer NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+        year integer NOT NULL,
+        semester integer,
+        enrollment_count integer NOT NULL DEFAULT 0,
+        first_enrolled_at timestamp,
+        last_enrolled_at timestamp,
+        PRIMARY KEY (course_id, year)
+    )""",
+    "ALTER TABLE enrollments ALTER COLUMN timestamp SET DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_enrollments_student_id ON enrollments (student_id)",
+    "CREATE INDEX IF NOT EXISTS ix_courses_semester_credits ON courses (semester, credits)",
+]
+
+TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION enrollment_counts_trg() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('DELETE', 'UPDATE') THEN
+    PERFORM enrollment_counts_apply(OLD.course_id, OLD.timestamp, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM enrollment_counts_apply(NEW.course_id, NEW.timestamp, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS enrollment_counts_maintain ON enrollments;
+
+CREATE TRIGGER enrollment_counts_maintain
+AFTER INSERT OR DELETE OR UPDATE OF course_id, timestamp ON enrollments
+FOR EACH ROW EXECUTE FUNCTION enrollment_counts_trg();
+"""
+
+
+def _year_bounds(ts: datetime):
+    return datetime(ts.year, 1, 1, tzinfo=ts.tzinfo), datetime(ts.year + 1, 1, 1, tzinfo=ts.tzinfo)
+
+
+# ---------------------------------------------------------------------
+# Transactional maintenance (call before db.commit())
+# ---------------------------------------------------------------------
+def record_enrollment_added(db: Session, enrollment: Any) -> None:
+    """
+    Count a newly added enrollment. The enrollment must be flushed (so its
+    timestamp default is populated); the caller commits both together.
+    """
+    if COUNTS_MODE == "trigger" or enrollment.course_id is None or enrollment.timestamp is None:
+        return
+    semester = db.execute(
+        text("SELECT semester FROM courses WHERE id = :c"), {"c": enrollment.course_id}
+    ).scalar()
+    db.execute(UPSERT_SQL, {
+        "course_id": enrollment.course_id,
+        "year": enrollment.timestamp.year,
+        "semester": semester,
+        "ts": enrollment.timestamp,
+    })
+
+
+def record_enrollment_removed(db: Session, course_id: Optional[int], timestamp: Optional[datetime]) -> None:
+    """
+    Uncount a deleted enrollment. Call after the delete has been flushed;
+    the caller commits both together.
+    """
+    if COUNTS_MODE == "trigger" or course_id is None or timestamp is None:
+        return
+    start, end = _year_bounds(timestamp)
+    db.execute(DECREMENT_SQL, {"course_id": course_id, "year": timestamp.year, "start": start, "end": end})
+
+
+def record_enrollment_added_supabase(client: Any, row: Dict[str, Any]) -> None:
+    """
+    Count an enrollment inserted through the Supabase client (PostgREST
+    cannot share a transaction with the insert, so this runs right after).
+    A failure is logged; `reconcile_enrollment_counts` repairs the drift.
+    """
+    if COUNTS_MODE == "trigger" or not row or row.get("course_id") is None:
+        return
+    ts = row.get("timestamp")
+    if ts is None:
+        # Counted nowhere, same as reconcile (see module docstring)
+        return
+    try:
+        client.rpc(
+            "enrollment_counts_apply", {"p_course_id": row["course_id"], "p_ts": ts, "p_delta": 1}
+        ).execute()
+    except Exception as e:
+        logger.error("enrollment_counts not updated for course %s: %s", row["course_id"], e)
+
+
+def install_enrollment_count_triggers(db: Session) -> None:
+    """Install the Postgres triggers used by ENROLLMENT_COUNTS_MODE=trigger."""
+    db.execute(text(APPLY_FUNCTION_SQL))
+    for stmt in TRIGGER_SQL.strip().split(";\n\n"):
+        s = stmt.strip()
+        if s:
+            db.execute(text(s))
+    db.commit()
+
+
+def ensure_enrollment_counts(db: Session) -> Dict[str, Any]:
+    """
+    Startup hook: create the aggregate table and indexes, install
+    `enrollment_counts_apply` (used by Supabase-client writers) and backfill
+    the aggregate if it is empty but `enrollments` is not. Safe to run on
+    every start.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return {"installed": False, "backfilled": False}
+    for stmt in SCHEMA_SQL:
+        db.execute(text(stmt))
+    db.execute(text(APPLY_FUNCTION_SQL))
+    db.commit()
+    backfilled = False
+    if not db.execute(text("SELECT EXISTS (SELECT 1 FROM enrollment_counts)")).scalar():
+        if db.execute(text("SELECT EXISTS (SELECT 1 FROM enrollments)")).scalar():
+            report = reconcile_enrollment_counts(db)
+            backfilled = report["repaired"]
+            logger.info("enrollment_counts backfilled (%d course-years)", report["drifted"])
+    return {"installed": True, "backfilled": backfilled}
+
+
+# ---------------------------------------------------------------------
+# Readers
+# ---------------------------------------------------------------------
+def counts_source(db: Session) -> str:
+    """
+    FROM-clause source with the `enrollment_counts` columns: the aggregate
+    once it has rows, else the same GROUP BY over `enrollments` (a fresh
+    deploy before the backfill).
+    """
+    global _aggregate_ready
+    if not _aggregate_ready:
+        _aggregate_ready = bool(db.execute(text("SELECT EXISTS (SELECT 1 FROM enrollment_counts)")).scalar())
+    return "enrollment_counts" if _aggregate_ready else f"({ACTUAL_COUNTS_SQL})"
+
+
+def course_enrollment_count(db: Session, course_id: int) -> int:
+    """Total enrollments in a course (all years), read from the aggregate."""
+    return int(db.execute(
+        text(f"SELECT COALESCE(SUM(a.enrollment_count), 0) FROM {counts_source(db)} a WHERE a.course_id = :c"),
+        {"c": course_id},
+    ).scalar() or 0)
+
+
+def course_enrollment_counts(db: Session, course_ids: Iterable[int]) -> Dict[int, int]:
+    """Batch variant of `course_enrollment_count`; missing courses map to 0."""
+    ids = list({int(c) for c in course_ids})
+    counts = {c: 0 for c in ids}
+    if not ids:
+        return counts
+    rows = db.execute(
+        text(
+            f"SELECT a.course_id, SUM(a.enrollment_count) FROM {counts_source(db)} a "
+            "WHERE a.course_id = ANY(:ids) GROUP BY a.course_id"
+        ),
+        {"ids": ids},
+    ).fetchall()
+    for course_id, n in rows:
+        counts[int(course_id)] = int(n or 0)
+    return counts
+
+
+# ---------------------------------------------------------------------
+# Reconcile
+# ---------------------------------------------------------------------
+def reconcile_enrollment_counts(db: Session, dry_run: bool = False, sample: int = 50) -> Dict[str, Any]:
+    """
+    Compare `enrollment_counts` with a fresh GROUP BY over `enrollments`
+    and, unless `dry_run`, rebuild it. Writers are blocked for the short
+    rebuild so no enrollment slips between the recount and the swap.
+    """
+    if not dry_run:
+        db.execute(text("LOCK TABLE enrollments IN SHARE ROW EXCLUSIVE MODE"))
+
+    drift_sql = f"""
+        WITH actual AS ({ACTUAL_COUNTS_SQL})
+        SELECT COALESCE(a.course_id, m.course_id) AS course_id,
+               COALESCE(a.year, m.year) AS year,
+               a.enrollment_count AS actual,
+               m.enrollment_count AS maintained
+        FROM actual a
+        FULL OUTER JOIN enrollment_counts m ON m.course_id = a.course_id AND m.year = a.year
+        WHERE a.enrollment_count IS DISTINCT FROM m.enrollment_count
+           OR a.first_enrolled_at IS DISTINCT FROM m.first_enrolled_at
+           OR a.last_enrolled_at IS DISTINCT FROM m.last_enrolled_at
+           OR a.semester IS DISTINCT FROM m.semester
+        ORDER BY 1, 2
+    """
+    drift: List[Dict[str, Any]] = [dict(r._mapping) for r in db.execute(text(drift_sql)).fetchall()]
+
+    if not dry_run and drift:
+        db.execute(text("DELETE FROM enrollment_counts"))
+        db.execute(text(
+            "INSERT INTO enrollment_counts "
+            "(course_id, year, semester, enrollment_count, first_enrolled_at, last_enrolled_at) "
+            + ACTUAL_COUNTS_SQL
+        ))
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+
+    return {
+        "drifted": len(drift),
+        "repaired": bool(drift) and not dry_run,
+        "sample": drift[:sample],
+    }
@@ -0,0 +1,71 @@
+"""
+fuzzy_index.py
+SAT-YUG Assistant : Precomputed fuzzy name matching
+---------------------------------------------------
+`difflib.get_close_matches` rescans and re-scores every candidate on each
+call. Spec normalization calls it for every field, filter, group_by and
+order_by term against the same few fixed lists (table names, each
+table's columns, alias keys). A FuzzyIndex is built once per list:
+
+- lowercase forms and an exact-match dict are precomputed
+- candidates are bucketed by length; SequenceMatcher's ratio is at most
+  2 * min(len) / (sum of lens), so buckets that cannot reach the cutoff
+  are skipped without scoring
+- the term's SequenceMatcher side (b2j, character counts) is built once
+  per lookup and the quick_ratio bound rejects most remaining
+  candidates before a full ratio
+- lookups are memoized per (term, cutoff)
+
+Scores are the same SequenceMatcher ratios with the same tie-breaking as
+get_close_matches(n=1), so mappings do not change.
+"""
+
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class FuzzyIndex:
+    def __init__(self, candidates: Iterable[str], cache_size: int = 4096) -> None:
+        # lowercase form -> original spelling (first one wins, as in a lowercase list scan)
+        self._original: Dict[str, str] = {}
+        for c in candidates:
+            self._original.setdefault(c.lower(), c)
+        self._by_len: Dict[int, List[str]] = {}
+        for low in self._original:
+            self._by_len.setdefault(len(low), []).append(low)
+        self._lookup = lru_cache(maxsize=cache_size)(self._closest)
+
+    def __contains__(self, term: str) -> bool:
+        return term.lower() in self._original
+
+    def closest(self, term: str, cutoff: float = 0.6) -> Optional[str]:
+        """Best candidate (original spelling) with ratio >= cutoff, like get_close_matches(n=1)."""
+        return self._lookup(term.lower(), cutoff)
+
+    def _closest(self, word: str, cutoff: float) -> Optional[str]:
+        if word in self._original:
+            return self._original[word]
+        lw = len(word)
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        best: Optional[Tuple[float, str]] = None
+        for length, bucket in self._by_len.items():
+            total = lw + length
+            # ratio <= real_quick_ratio = 2 * min(len) / total
+            if total == 0 or 2.0 * min(lw, length) / total < cutoff:
+                continue
+            for low in bucket:
+                s.set_seq1(low)
+                if s.quick_ratio() < cutoff:
+                    continue
+                score = s.ratio()
+                if score >= cutoff and (best is None or (score, low) > best):
+                    best = (score, low)
+        return self._original[best[1]] if best else None
+
+    def cache_clear(self) -> None:
+        self._lookup.cache_clear()
+
+    def cache_info(self):
+        return self._lookup.cache_info()
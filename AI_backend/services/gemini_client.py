@@ -1,10 +1,39 @@
 import os
-from typing import List, Dict, Any, Optional
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator
 import httpx
 
+from services.llm_gateway import CHAT_GATEWAY, LLMOverloaded
+from services.tracing import record_span, span
+
+logger = logging.getLogger(__name__)
+
 API_KEY = os.getenv("GOOGLE_API_KEY")
 # Default to legacy PaLM chat-bison unless overridden
 MODEL = os.getenv("GEN_AI_MODEL", "chat-bison-001")
+# Override to point at a local stand-in (utils/mock_genai_server.py)
+API_BASE = os.getenv("GEN_AI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+LLM_TIMEOUT = float(os.getenv("GEN_AI_TIMEOUT", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("GEN_AI_MAX_CONNECTIONS", "20"))
+# HTTP/2 multiplexes concurrent calls over one connection; needs the `h2` package
+LLM_HTTP2 = os.getenv("GEN_AI_HTTP2", "1") != "0"
+
+_LIMITS = httpx.Limits(
+    max_connections=LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+    keepalive_expiry=60.0,
+)
+_HEADERS = {"Content-Type": "application/json"}
+
+_client: Optional[httpx.Client] = None
+# One async client per event loop: a client's pooled connections belong to its loop
+_async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_lock = threading.Lock()
 
 
 def _is_gemini_model(model: str) -> bool:
@@ -12,16 +41,83 @@ def _is_gemini_model(model: str) -> bool:
     return model.lower().startswith("gemini-")
 
 
-def _make_url(model: str) -> str:
+def _make_url(model: str, stream: bool = False) -> str:
     # Gemini 1.x uses v1 generateContent; PaLM/chat-bison uses v1beta2 generateMessage
     if _is_gemini_model(model):
-        base = "https://generativelanguage.googleapis.com/v1/models"
+        base = f"{API_BASE}/v1/models"
+        if stream:
+            return f"{base}/{model}:streamGenerateContent?alt=sse&key={API_KEY}"
         return f"{base}/{model}:generateContent?key={API_KEY}"
     else:
-        base = "https://generativelanguage.googleapis.com/v1beta2/models"
+        base = f"{API_BASE}/v1beta2/models"
         return f"{base}/{model}:generateMessage?key={API_KEY}"
 
 
+def _http2_available() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _get_client() -> httpx.Client:
+    """Shared sync client: keep-alive connections are reused across calls."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(timeout=LLM_TIMEOUT, limits=_LIMITS, http2=_http2_available())
+    return _client
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Shared async client for the running event loop; clients of closed loops are closed."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _lock:
+            for dead in [owner for owner in _async_clients if owner.is_closed()]:
+                loop.create_task(_close_stale(_async_clients.pop(dead)))
+            client = _async_clients.get(loop)
+            if client is None:
+                client = _async_clients[loop] = httpx.AsyncClient(
+                    timeout=LLM_TIMEOUT, limits=_LIMITS, http2=_http2_available()
+                )
+    return client
+
+
+async def _close_stale(client: httpx.AsyncClient) -> None:
+    # The owning loop is gone, so closing its connections may fail; the
+    # sockets are then released when the client is garbage-collected
+    try:
+        await client.aclose()
+    except Exception as e:
+        logger.debug("closing a stale LLM client failed: %s", e)
+
+
+async def aclose_clients() -> None:
+    """Close the pooled clients (call on application shutdown)."""
+    global _client
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = dict(_async_clients)
+        _async_clients.clear()
+    for owner, client in clients.items():
+        if owner is loop:
+            await client.aclose()
+        elif owner.is_running():
+            # Another live loop (e.g. a worker thread): close it there
+            asyncio.run_coroutine_threadsafe(client.aclose(), owner)
+        else:
+            await _close_stale(client)
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
 def _map_messages_for_palm(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
     # PaLM/chat-bison format: messages=[{author, content:{text}}]
     mapped = []
@@ -49,6 +145,99 @@ def _map_messages_for_gemini(messages: List[Dict[str, str]]) -> List[Dict[str, A
     return contents
 
 
+def _build_payload(messages: List[Dict[str, str]], temperature: float, max_output_tokens: int) -> Dict[str, Any]:
+    if _is_gemini_model(MODEL):
+        # Avoid non-portable fields (tools/responseMimeType/responseSchema) due to API variability
+        return {
+            "contents": _map_messages_for_gemini(messages),
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_output_tokens,
+            },
+        }
+    return {
+        "messages": _map_messages_for_palm(messages),
+        "temperature": temperature,
+        "candidateCount": 1,
+        "maxOutputTokens": max_output_tokens,
+    }
+
+
+def _candidate_texts(first: Dict[str, Any]) -> Optional[str]:
+    content = first.get("content") or first.get("message") or first
+    # PaLM generateMessage: candidates[0].content is the reply string
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        parts = content.get("parts") or content.get("content") or []
+        # Normalize to list
+        if isinstance(parts, list) and parts:
+            # First, check for functionCall result
+            for p in parts:
+                if isinstance(p, dict) and "functionCall" in p:
+                    fn = p.get("functionCall", {})
+                    # Return args as JSON string
+                    args = fn.get("args")
+                    if isinstance(args, (dict, list)):
+                        return json.dumps(args)
+            # Otherwise, fall back to concatenated text
+            texts: List[str] = []
+            for p in parts:
+                if isinstance(p, dict):
+                    t = p.get("text") or p.get("output_text") or p.get("type")
+                    if t:
+                        texts.append(t)
+            if texts:
+                return "\n".join(texts)
+        # Fallback: direct text field
+        t = content.get("text")
+        if t:
+            return t
+    # PaLM sometimes returns text at top level of candidate
+    return first.get("text")
+
+
+def _payload_key(payload: Dict[str, Any]) -> str:
+    """Coalescing key: identical model + payload means an identical request."""
+    blob = json.dumps([MODEL, payload], sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _status_error(status: int, body: str, headers: httpx.Headers) -> RuntimeError:
+    if status == 429:
+        try:
+            retry_after = float(headers.get("retry-after") or 5)
+        except ValueError:
+            retry_after = 5.0
+        return LLMOverloaded(f"LLM rate limited upstream: {body[:200]}", retry_after, "upstream")
+    return RuntimeError(f"LLM request failed: {status} {body}")
+
+
+def _parse_reply(data: Dict[str, Any]) -> str:
+    # Prefer Gemini response parsing
+    candidates = data.get("candidates") or []
+    if candidates:
+        first = candidates[0]
+        # If model stopped due to token limit, surface a clear error
+        finish = first.get("finishReason") or first.get("finish_reason")
+        if finish == "MAX_TOKENS":
+            raise RuntimeError(
+                "LLM stopped early due to max tokens. Increase maxOutputTokens or simplify prompt."
+            )
+        # Gemini: candidates[0].content.parts[].text
+        if isinstance(first, dict):
+            t = _candidate_texts(first)
+            if t:
+                return t
+
+    # Fallbacks sometimes seen in PaLM
+    if "output" in data and isinstance(data["output"], dict) and "text" in data["output"]:
+        return data["output"]["text"]
+
+    # If nothing matched, return the raw JSON for debugging
+    return str(data)
+
+
 def generate_chat_reply(
     messages: List[Dict[str, str]],
     temperature: float = 0.2,
@@ -56,96 +245,98 @@ def generate_chat_reply(
     response_mime_type: Optional[str] = None,
     response_schema: Optional[Dict[str, Any]] = None,
     function_declarations: Optional[List[Dict[str, Any]]] = None,
+    timeout: Optional[float] = None,
 ) -> str:
     """
     Send the messages to Google's Generative Language API and return the assistant reply as text.
 
     Supports both PaLM/chat-bison (v1beta2 generateMessage) and Gemini 1.x (v1 generateContent).
+    Blocking; async callers should use `agenerate_chat_reply`. Calls pass
+    through CHAT_GATEWAY, which raises LLMOverloaded when it sheds them.
     """
     if not API_KEY:
         raise RuntimeError("GOOGLE_API_KEY environment variable is not set")
 
-    is_gemini = _is_gemini_model(MODEL)
-    url = _make_url(MODEL)
+    payload = _build_payload(messages, temperature, max_output_tokens)
 
-    if is_gemini:
-        payload: Dict[str, Any] = {
-            "contents": _map_messages_for_gemini(messages),
-            "generationConfig": {
-                "temperature": temperature,
-                "maxOutputTokens": max_output_tokens,
-            },
-        }
-        # Avoid non-portable fields (tools/responseMimeType/responseSchema) due to API variability
-    else:
-        payload = {
-            "messages": _map_messages_for_palm(messages),
-            "temperature": temperature,
-            "candidateCount": 1,
-            "maxOutputTokens": max_output_tokens,
-        }
+    def _send() -> Dict[str, Any]:
+        resp = _get_client().post(_make_url(MODEL), json=payload, headers=_HEADERS, timeout=timeout or LLM_TIMEOUT)
+        if resp.status_code >= 400:
+            raise _status_error(resp.status_code, resp.text, resp.headers)
+        return resp.json()
 
-    headers = {"Content-Type": "application/json"}
+    with span("llm.chat", model=MODEL):
+        data = CHAT_GATEWAY.call(_payload_key(payload), _send)
+    logger.debug("LLM response: %s", data)
+    return _parse_reply(data)
 
-    try:
-        with httpx.Client(timeout=30.0) as client:
-            resp = client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            print("LLM response:", data)
-
-            # Prefer Gemini response parsing
-            candidates = data.get("candidates") or []
-            if candidates:
-                first = candidates[0]
-                # If model stopped due to token limit, surface a clear error
-                finish = first.get("finishReason") or first.get("finish_reason")
-                if finish == "MAX_TOKENS":
-                    raise RuntimeError(
-                        "LLM stopped early due to max tokens. Increase maxOutputTokens or simplify prompt."
-                    )
-                # Gemini: candidates[0].content.parts[].text
-                if isinstance(first, dict):
-                    content = first.get("content") or first.get("message") or first
-                    if isinstance(content, dict):
-                        parts = content.get("parts") or content.get("content") or []
-                        # Normalize to list
-                        if isinstance(parts, list) and parts:
-                            # First, check for functionCall result
-                            for p in parts:
-                                if isinstance(p, dict) and "functionCall" in p:
-                                    fn = p.get("functionCall", {})
-                                    # Return args as JSON string
-                                    args = fn.get("args")
-                                    if isinstance(args, (dict, list)):
-                                        import json as _json
-                                        return _json.dumps(args)
-                            # Otherwise, fall back to concatenated text
-                            texts: List[str] = []
-                            for p in parts:
-                                if isinstance(p, dict):
-                                    t = p.get("text") or p.get("output_text") or p.get("type")
-                                    if t:
-                                        texts.append(t)
-                            if texts:
-                                return "\n".join(texts)
-                        # Fallback: direct text field
-                        t = content.get("text")
-                        if t:
-                            return t
-                    # PaLM sometimes returns text at top level of candidate
-                    t = first.get("text")
-                    if t:
-                        return t
 
-            # Fallbacks sometimes seen in PaLM
-            if "output" in data and isinstance(data["output"], dict) and "text" in data["output"]:
-                return data["output"]["text"]
+async def agenerate_chat_reply(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    max_output_tokens: int = 512,
+    timeout: Optional[float] = None,
+) -> str:
+    """
+    Async `generate_chat_reply` over the shared pooled (HTTP/2) client.
+    Identical concurrent requests are coalesced into one API call.
+    """
+    if not API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY environment variable is not set")
+
+    payload = _build_payload(messages, temperature, max_output_tokens)
+
+    async def _send() -> Dict[str, Any]:
+        resp = await _get_async_client().post(
+            _make_url(MODEL), json=payload, headers=_HEADERS, timeout=timeout or LLM_TIMEOUT
+        )
+        if resp.status_code >= 400:
+            raise _status_error(resp.status_code, resp.text, resp.headers)
+        return resp.json()
+
+    with span("llm.chat", model=MODEL):
+        data = await CHAT_GATEWAY.acall(_payload_key(payload), _send)
+    logger.debug("LLM response: %s", data)
+    return _parse_reply(data)
+
 
-            # If nothing matched, return the raw JSON for debugging
-            return str(data)
+async def astream_chat_reply(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    max_output_tokens: int = 512,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    Yield reply text as it is generated (Gemini streamGenerateContent, SSE).
+    PaLM models have no streaming endpoint, so the full reply is yielded once.
+    """
+    if not API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY environment variable is not set")
+    if not _is_gemini_model(MODEL):
+        yield await agenerate_chat_reply(messages, temperature, max_output_tokens, timeout)
+        return
 
-    except httpx.HTTPStatusError as e:
-        raise RuntimeError(f"LLM request failed: {e.response.status_code} {e.response.text}")
-    except Exception:
-        raise
+    payload = _build_payload(messages, temperature, max_output_tokens)
+    client = _get_async_client()
+    started = time.perf_counter()
+    # Streams hold a gateway slot for their whole duration and are not coalesced
+    async with CHAT_GATEWAY.aslot():
+        async with client.stream(
+            "POST", _make_url(MODEL, stream=True), json=payload, headers=_HEADERS, timeout=timeout or LLM_TIMEOUT
+        ) as resp:
+            if resp.status_code >= 400:
+                body = (await resp.aread()).decode("utf-8", errors="replace")
+                raise _status_error(resp.status_code, body, resp.headers)
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    data = json.loads(line[5:].strip())
+                except ValueError:
+                    continue
+                for cand in data.get("candidates") or []:
+                    t = _candidate_texts(cand) if isinstance(cand, dict) else None
+                    if t:
+                        yield t
+    # Recorded by hand: a span context would straddle the yields
+    record_span("llm.stream", started, time.perf_counter(), model=MODEL)
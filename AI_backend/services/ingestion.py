@@ -0,0 +1,433 @@
+"""
+ingestion.py
+SAT-YUG Assistant : Knowledge ingestion pipeline
+------------------------------------------------
+Streams a directory (or list of files) into knowledge_documents /
+knowledge_chunks:
+
+  read + chunk (thread pool, bounded read-ahead)
+    -> embed in batches (services.embeddings: batched, concurrent, cached)
+    -> write with one binary COPY per flush (pgvector_retriever.write_chunks)
+
+Re-ingest is incremental. Documents are fingerprinted by source path and
+content hash, and chunks by their own hash. Unchanged files are skipped.
+Changed files keep their document row and unchanged chunks; only new
+chunks are embedded and written, and vanished chunks are deleted.
+`sync_directory` also removes documents whose files were deleted.
+With VECTOR_BACKEND=local the same sync runs against the local vector
+store (`sync_directory_local`) instead.
+
+Each flush commits, so a long run makes steady, durable progress. Runs can
+be started as background jobs whose progress (files, chunks, chunks/s) is
+polled through the job registry.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from services.embeddings import embed_texts
+from services.pgvector_retriever import chunk_hash, write_chunks
+from services.local_vector_store import LocalVectorStore
+from services.retriever import CHUNK_OVERLAP, CHUNK_WORDS, _chunk_text
+from services.vector_store import get_local_store, is_local_backend
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+# Chunks embedded + written per flush
+INGEST_FLUSH_CHUNKS = int(os.getenv("INGEST_FLUSH_CHUNKS", "400"))
+TEXT_EXTENSIONS = (".md", ".txt")
+
+
+def list_knowledge_files(directory: str) -> List[str]:
+    paths: List[str] = []
+    for root, _, files in os.walk(directory):
+        for fn in files:
+            if fn.lower().endswith(TEXT_EXTENSIONS):
+                paths.append(os.path.join(root, fn))
+    return sorted(paths)
+
+
+def _read_and_chunk(path: str, chunk_size: int, overlap: int, doc_type: Optional[str]) -> Tuple[str, List[str], str]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        content = f.read()
+    # Chunking parameters and type are part of the fingerprint: changing them re-processes the file
+    digest = hashlib.sha256(f"{chunk_size}:{overlap}:{doc_type}\n{content}".encode("utf-8")).hexdigest()
+    return path, _chunk_text(content, chunk_size=chunk_size, overlap=overlap), digest
+
+
+def _existing_documents(db: Session, sources: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    rows = db.execute(
+        text(
+            "SELECT id, source, content_hash, role_visibility FROM knowledge_documents "
+            "WHERE source = ANY(:s) ORDER BY id"
+        ),
+        {"s": sources},
+    ).fetchall()
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for r in rows:
+        out.setdefault(r[1], []).append({"id": int(r[0]), "content_hash": r[2], "role_visibility": r[3]})
+    return out
+
+
+def _existing_chunks(db: Session, doc_ids: List[int]) -> Dict[int, Dict[str, List[Tuple[int, Any, Any]]]]:
+    """document id -> chunk hash -> [(chunk id, stored chunk_index, stored type)]"""
+    out: Dict[int, Dict[str, List[Tuple[int, Any, Any]]]] = {d: {} for d in doc_ids}
+    if not doc_ids:
+        return out
+    rows = db.execute(
+        text(
+            "SELECT id, document_id, chunk_hash, metadata->>'chunk_index', metadata->>'type' FROM knowledge_chunks "
+            "WHERE document_id = ANY(:d) ORDER BY id"
+        ),
+        {"d": doc_ids},
+    ).fetchall()
+    for cid, doc_id, digest, idx, ctype in rows:
+        out[int(doc_id)].setdefault(digest or "", []).append((int(cid), idx, ctype))
+    return out
+
+
+def ingest_files(
+    db: Session,
+    paths: Iterable[str],
+    role_visibility: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    chunk_size: int = CHUNK_WORDS,
+    overlap: int = CHUNK_OVERLAP,
+    workers: int = INGEST_WORKERS,
+    flush_chunks: int = INGEST_FLUSH_CHUNKS,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Ingest `paths` incrementally and return a report: per-file action
+    (new / changed / unchanged), chunk counts (added / kept / removed),
+    time spent embedding vs writing, and chunks/s. A file that fails to
+    read is reported and skipped; embedding or DB errors abort the run
+    (already flushed files stay committed).
+    """
+    paths = list(paths)
+    report: Dict[str, Any] = {
+        "files_total": len(paths), "files_done": 0,
+        "files_new": 0, "files_changed": 0, "files_unchanged": 0,
+        "chunks": 0, "chunks_added": 0, "chunks_kept": 0, "chunks_removed": 0,
+        "embed_s": 0.0, "write_s": 0.0, "ingested": [], "errors": [],
+    }
+    t0 = time.perf_counter()
+    pending: List[Tuple[str, List[str], str]] = []
+    pending_chunks = 0
+
+    def _meta(path: str, i: int) -> Dict[str, Any]:
+        meta: Dict[str, Any] = {"source": path, "chunk_index": i}
+        if doc_type:
+            meta["type"] = doc_type
+        return meta
+
+    def _flush() -> None:
+        nonlocal pending, pending_chunks
+        if not pending:
+            return
+        tw = time.perf_counter()
+        existing = _existing_documents(db, [p for p, _, _ in pending])
+
+        # Plan each file: skip, update in place, or create
+        plans = []
+        stale_docs: List[int] = []
+        for path, chunks, digest in pending:
+            docs = existing.get(path, [])
+            # Older duplicates of the same source (from pre-fingerprint ingests) are dropped
+            stale_docs.extend(d["id"] for d in docs[:-1])
+            doc = docs[-1] if docs else None
+            if doc and doc["content_hash"] == digest and doc["role_visibility"] == role_visibility:
+                plans.append((path, chunks, digest, doc["id"], "unchanged"))
+            else:
+                plans.append((path, chunks, digest, doc["id"] if doc else None, "changed" if doc else "new"))
+        if stale_docs:
+            db.execute(text("DELETE FROM knowledge_documents WHERE id = ANY(:ids)"), {"ids": stale_docs})
+        old_chunks = _existing_chunks(db, [d for _, _, _, d, action in plans if action == "changed"])
+        report["write_s"] += time.perf_counter() - tw
+
+        to_embed: List[str] = []
+        to_insert: List[Tuple[int, int, str, str]] = []  # (plan idx, chunk idx, text, hash)
+        doc_ids: Dict[int, int] = {}
+        reindexed: List[Dict[str, Any]] = []
+        removed: List[int] = []
+        tw = time.perf_counter()
+        for n, (path, chunks, digest, doc_id, action) in enumerate(plans):
+            entry = {"path": path, "action": action, "chunks": len(chunks)}
+            report["ingested"].append(entry)
+            report[f"files_{action}"] += 1
+            if action == "unchanged":
+                entry["document_id"] = doc_id
+                report["chunks_kept"] += len(chunks)
+                continue
+            if action == "new":
+                doc_id = db.execute(
+                    text(
+                        "INSERT INTO knowledge_documents(title, source, role_visibility, content_hash, updated_at) "
+                        "VALUES (:t, :s, :r, :h, now()) RETURNING id"
+                    ),
+                    {"t": os.path.basename(path), "s": path, "r": role_visibility, "h": digest},
+                ).scalar_one()
+            else:
+                db.execute(
+                    text(
+                        "UPDATE knowledge_documents SET content_hash = :h, role_visibility = :r, updated_at = now() "
+                        "WHERE id = :d"
+                    ),
+                    {"h": digest, "r": role_visibility, "d": doc_id},
+                )
+                db.execute(
+                    text("UPDATE knowledge_chunks SET role_visibility = :r WHERE document_id = :d "
+                         "AND role_visibility IS DISTINCT FROM :r"),
+                    {"r": role_visibility, "d": doc_id},
+                )
+            doc_id = int(doc_id)
+            doc_ids[n] = doc_id
+            entry["document_id"] = doc_id
+
+            available = old_chunks.get(doc_id, {})
+            added = kept = 0
+            for i, chunk in enumerate(chunks):
+                h = chunk_hash(chunk)
+                reuse = available.get(h)
+                if reuse:
+                    cid, old_idx, old_type = reuse.pop(0)
+                    kept += 1
+                    if str(old_idx) != str(i) or old_type != doc_type:
+                        reindexed.append({"id": cid, "m": json.dumps(_meta(path, i))})
+                else:
+                    to_embed.append(chunk)
+                    to_insert.append((n, i, chunk, h))
+                    added += 1
+            gone = [cid for ids in available.values() for cid, _, _ in ids]
+            removed.extend(gone)
+            entry.update(added=added, kept=kept, removed=len(gone))
+            report["chunks_added"] += added
+            report["chunks_kept"] += kept
+            report["chunks_removed"] += len(gone)
+
+        if removed:
+            db.execute(text("DELETE FROM knowledge_chunks WHERE id = ANY(:ids)"), {"ids": removed})
+        if reindexed:
+            db.execute(text("UPDATE knowledge_chunks SET metadata = CAST(:m AS jsonb) WHERE id = :id"), reindexed)
+        report["write_s"] += time.perf_counter() - tw
+
+        te = time.perf_counter()
+        vecs = embed_texts(to_embed) if to_embed else []
+        report["embed_s"] += time.perf_counter() - te
+
+        tw = time.perf_counter()
+        rows = [
+            (doc_ids[n], chunk, _meta(plans[n][0], i), vec, role_visibility, h)
+            for (n, i, chunk, h), vec in zip(to_insert, vecs)
+        ]
+        write_chunks(db, rows)
+        db.commit()
+        report["write_s"] += time.perf_counter() - tw
+
+        report["files_done"] += len(pending)
+        report["chunks"] += sum(len(c) for _, c, _ in pending)
+        pending, pending_chunks = [], 0
+        if progress:
+            progress(_snapshot(report, t0))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest") as pool:
+        # Bounded read-ahead: at most 2 * workers files in memory beyond the pending batch
+        queue: deque = deque()
+        it = iter(paths)
+        for path in it:
+            queue.append((path, pool.submit(_read_and_chunk, path, chunk_size, overlap, doc_type)))
+            if len(queue) >= 2 * max(1, workers):
+                break
+        while queue:
+            path, fut = queue.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                queue.append((nxt, pool.submit(_read_and_chunk, nxt, chunk_size, overlap, doc_type)))
+            try:
+                _, chunks, digest = fut.result()
+            except Exception as e:
+                report["errors"].append({"path": path, "error": str(e)})
+                report["files_done"] += 1
+                continue
+            pending.append((path, chunks, digest))
+            pending_chunks += len(chunks)
+            if pending_chunks >= flush_chunks:
+                _flush()
+        _flush()
+
+    return _snapshot(report, t0)
+
+
+def prune_missing_documents(db: Session, directory: str, present: Iterable[str]) -> int:
+    """Delete documents (and, by cascade, chunks) sourced under `directory` whose file is gone."""
+    prefix = os.path.join(directory, "")
+    like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    rows = db.execute(
+        text("SELECT id, source FROM knowledge_documents WHERE source LIKE :p"), {"p": like}
+    ).fetchall()
+    keep = set(present)
+    gone = [int(r[0]) for r in rows if r[1] not in keep]
+    if gone:
+        db.execute(text("DELETE FROM knowledge_documents WHERE id = ANY(:ids)"), {"ids": gone})
+    db.commit()
+    return len(gone)
+
+
+def sync_directory(db: Session, directory: str, prune: bool = True, **kwargs: Any) -> Dict[str, Any]:
+    """Incrementally ingest every knowledge file under `directory`; optionally drop deleted files' documents."""
+    paths = list_knowledge_files(directory)
+    report = ingest_files(db, paths, **kwargs)
+    report["files_deleted"] = prune_missing_documents(db, directory, paths) if prune else 0
+    return report
+
+
+def sync_directory_local(
+    store: LocalVectorStore,
+    directory: str,
+    prune: bool = True,
+    role_visibility: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    chunk_size: int = CHUNK_WORDS,
+    overlap: int = CHUNK_OVERLAP,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    **_: Any,
+) -> Dict[str, Any]:
+    """
+    `sync_directory` for the local vector store (VECTOR_BACKEND=local).
+    Local embeddings are cheap, so a changed file is simply re-ingested
+    whole instead of being diffed chunk by chunk.
+    """
+    paths = list_knowledge_files(directory)
+    report: Dict[str, Any] = {
+        "files_total": len(paths), "files_done": 0,
+        "files_new": 0, "files_changed": 0, "files_unchanged": 0, "files_deleted": 0,
+        "chunks": 0, "chunks_added": 0, "chunks_kept": 0, "chunks_removed": 0,
+        "embed_s": 0.0, "write_s": 0.0, "ingested": [], "errors": [],
+    }
+    t0 = time.perf_counter()
+    known = store.document_hashes()
+    with store.batch():
+        for path in paths:
+            try:
+                _, chunks, digest = _read_and_chunk(path, chunk_size, overlap, doc_type)
+            except Exception as e:
+                report["errors"].append({"path": path, "error": str(e)})
+                report["files_done"] += 1
+                continue
+            action = "new" if path not in known else ("unchanged" if known[path] == digest else "changed")
+            if action == "unchanged":
+                report["chunks_kept"] += len(chunks)
+            else:
+                tw = time.perf_counter()
+                if action == "changed":
+                    report["chunks_removed"] += store.delete_source(path)
+                metas = [{"source": path, "chunk_index": i, **({"type": doc_type} if doc_type else {})}
+                         for i in range(len(chunks))]
+                store.ingest(os.path.basename(path), path, chunks, role_visibility, metas, content_hash=digest)
+                report["write_s"] += time.perf_counter() - tw
+                report["chunks_added"] += len(chunks)
+            report[f"files_{action}"] += 1
+            report["ingested"].append({"path": path, "action": action, "chunks": len(chunks)})
+            report["files_done"] += 1
+            report["chunks"] += len(chunks)
+            if progress:
+                progress(_snapshot(report, t0))
+    if prune:
+        prefix = os.path.join(directory, "")
+        present = set(paths)
+        for source in known:
+            if source.startswith(prefix) and source not in present:
+                store.delete_source(source)
+                report["files_deleted"] += 1
+    return _snapshot(report, t0)
+
+
+def _snapshot(report: Dict[str, Any], t0: float) -> Dict[str, Any]:
+    elapsed = time.perf_counter() - t0
+    out = dict(report)
+    out["elapsed_s"] = round(elapsed, 3)
+    out["embed_s"] = round(report["embed_s"], 3)
+    out["write_s"] = round(report["write_s"], 3)
+    out["chunks_per_s"] = round(report["chunks"] / elapsed, 1) if elapsed > 0 else 0.0
+    return out
+
+
+# ---------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------
+_JOBS: Dict[str, Dict[str, Any]] = {}
+_JOBS_LOCK = threading.Lock()
+MAX_JOBS_KEPT = 50
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    with _JOBS_LOCK:
+        _JOBS[job_id].update(fields)
+
+
+def start_ingest_job(directory: str, **kwargs: Any) -> str:
+    """Ingest `directory` on a background thread with its own DB session; returns the job id."""
+    job_id = uuid.uuid4().hex[:12]
+    with _JOBS_LOCK:
+        _JOBS[job_id] = {"id": job_id, "directory": directory, "state": "queued", "created_at": time.time()}
+        # Forget the oldest finished jobs
+        finished = [j for j in _JOBS.values() if j["state"] in ("done", "failed")]
+        for j in sorted(finished, key=lambda j: j["created_at"])[: max(0, len(_JOBS) - MAX_JOBS_KEPT)]:
+            _JOBS.pop(j["id"], None)
+
+    def _run() -> None:
+        if is_local_backend():
+            _update_job(job_id, state="running", started_at=time.time())
+            try:
+                result = sync_directory_local(
+                    get_local_store(), directory, progress=lambda p: _update_job(job_id, progress=_brief(p)), **kwargs
+                )
+                _update_job(job_id, state="done", finished_at=time.time(), result=result, progress=_brief(result))
+            except Exception as e:
+                _update_job(job_id, state="failed", finished_at=time.time(), error=str(e))
+            return
+
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            _update_job(job_id, state="running", started_at=time.time())
+            result = sync_directory(
+                db, directory, progress=lambda p: _update_job(job_id, progress=_brief(p)), **kwargs
+            )
+            _update_job(job_id, state="done", finished_at=time.time(), result=result, progress=_brief(result))
+        except Exception as e:
+            db.rollback()
+            _update_job(job_id, state="failed", finished_at=time.time(), error=str(e))
+        finally:
+            db.close()
+
+    threading.Thread(target=_run, name=f"ingest-{job_id}", daemon=True).start()
+    return job_id
+
+
+def _brief(report: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in report.items() if k not in ("ingested",)}
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    with _JOBS_LOCK:
+        return [
+            {k: v for k, v in j.items() if k != "result"}
+            for j in sorted(_JOBS.values(), key=lambda j: j["created_at"], reverse=True)
+        ]
@@ -0,0 +1,46 @@
+"""
+intent_classifier.py
+SAT-YUG Assistant : Local intent classification
+-----------------------------------------------
+A lightweight, rule-weighted classifier run before any network call:
+"data" questions (lists, counts, timetables, lookups) go to the SQL path
+with static schema context; "doc" questions (policies, rules, how/why
+explanations) go to knowledge retrieval. Each cue adds its weight to one
+side; ties go to "data", the path that existed before.
+"""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+DOC_CUES: List[Tuple[str, float]] = [
+    (r"\bpolic(y|ies)\b", 2.0),
+    (r"\bexplain\b", 2.0),
+    (r"\b(rules?|guidelines?|procedures?|regulations?)\b", 1.5),
+    (r"\bprerequisites?\b", 1.5),
+    (r"\bhow (do|does|can|should|is|are)\b", 1.5),
+    (r"\bwhy\b", 1.5),
+    (r"\b(constraints?|criteria|eligib\w*|allowed|process)\b", 1.0),
+    (r"\b(what is|what are|what does)\b", 0.5),
+]
+
+DATA_CUES: List[Tuple[str, float]] = [
+    (r"\b(list|show|find|display|give me|fetch)\b", 1.5),
+    (r"\b(how many|count|number of|total|average|sum|maximum|minimum)\b", 1.5),
+    (r"\b(which|who)\b", 1.0),
+    (r"\d", 1.0),
+    (r"(>=|<=|>|<|\bmore than\b|\bless than\b|\bat least\b|\bover\b|\bunder\b)", 1.0),
+    (r"\b(my|me)\b", 0.5),
+    (r"\b(courses?|classrooms?|rooms?|timetable|schedule|enrollments?|students?|faculty|credits?|semester|capacity)\b", 0.5),
+    (r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b", 1.0),
+]
+
+_DOC = [(re.compile(p, re.I), w) for p, w in DOC_CUES]
+_DATA = [(re.compile(p, re.I), w) for p, w in DATA_CUES]
+
+
+def classify_intent(text: str) -> Dict[str, Any]:
+    """{"intent": "data" | "doc", "doc_score", "data_score", "margin"}"""
+    doc = sum(w for rx, w in _DOC if rx.search(text or ""))
+    data = sum(w for rx, w in _DATA if rx.search(text or ""))
+    intent = "doc" if doc > data else "data"
+    return {"intent": intent, "doc_score": doc, "data_score": data, "margin": abs(doc - data)}
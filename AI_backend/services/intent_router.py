@@ -0,0 +1,323 @@
+"""
+intent_router.py
+SAT-YUG Assistant : Native intent handlers
+------------------------------------------
+Most assistant traffic is a handful of question shapes. These are matched
+with rules and answered by fixed, parameterized queries run through the
+guarded QueryExecutor (row cap, per-role timeout, result cache), so they
+need no spec LLM call and no ad-hoc SQL:
+
+- my_timetable       "show my timetable", "my classes on monday"
+- student_timetable  "timetable for student id=1" (not for other students)
+- free_rooms         "free rooms on friday at 2pm", "... for 60 students"
+- course_catalog     "courses with 3 credits in semester 5", "mandatory courses"
+- entity_count       "how many courses are in semester 5"
+
+`match_intent` returns None when no rule applies, a required value is
+missing or the question carries a qualifier the handler cannot express
+(comparatives, negations, "or"/"and" lists, several days, leftover
+numbers or words), and the caller falls back to the LLM path. A native
+answer that silently drops a condition is worse than a slower LLM one.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from services.query_executor import QueryExecutor
+
+DAYS = {
+    "mon": "Mon", "monday": "Mon", "tue": "Tue", "tues": "Tue", "tuesday": "Tue",
+    "wed": "Wed", "wednesday": "Wed", "thu": "Thu", "thur": "Thu", "thurs": "Thu", "thursday": "Thu",
+    "fri": "Fri", "friday": "Fri", "sat": "Sat", "saturday": "Sat", "sun": "Sun", "sunday": "Sun",
+}
+
+_DAY_RE = re.compile(r"\b(" + "|".join(sorted(DAYS, key=len, reverse=True)) + r")\b", re.I)
+_TIME_RE = re.compile(r"\b(?:at|from|around)?\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?(?=\W|$)", re.I)
+_TIMETABLE_RE = re.compile(r"\b(timetable|time table|schedule|classes|lectures)\b", re.I)
+_MY_RE = re.compile(r"\b(my|me|i have|do i)\b", re.I)
+_STUDENT_ID_RE = re.compile(r"\bstudent\s*(?:id)?\s*[=#:]?\s*(\d+)\b", re.I)
+_FREE_RE = re.compile(r"\b(free|available|empty|vacant|unoccupied|unused)\b", re.I)
+_ROOM_RE = re.compile(r"\b(rooms?|classrooms?|halls?)\b", re.I)
+_CAPACITY_RE = re.compile(
+    r"(?:capacity\s*(?:of|>=|>|at least|over)?\s*|for\s+|at least\s+|seats?\s*(?:>=|>)?\s*)(\d{2,4})\s*(?:students|people|seats)?",
+    re.I,
+)
+_COURSE_RE = re.compile(r"\bcourses?\b", re.I)
+_CREDITS_RE = re.compile(r"\b(\d)\s*-?\s*credits?\b|\bcredits?\s*(?:=|of|is)?\s*(\d)\b", re.I)
+_SEMESTER_RE = re.compile(r"\b(?:semester|sem)\s*(\d)\b|\b(\d)(?:st|nd|rd|th)\s+(?:semester|sem)\b", re.I)
+_MANDATORY_RE = re.compile(r"\b(mandatory|compulsory|core|required)\b", re.I)
+_ELECTIVE_RE = re.compile(r"\b(electives?|optional)\b", re.I)
+_TOP_N_RE = re.compile(r"\b(?:list|show|top|first|give me)\s+(\d{1,3})\b", re.I)
+_COUNTING_RE = re.compile(r"\b(how many|number of|count|total)\b", re.I)
+_HOW_MANY_RE = re.compile(r"\b(how many|number of|count(?: of)?)\s+(students|courses|faculty|faculties|teachers|professors|classrooms|rooms)\b", re.I)
+# Catalog questions mentioning these need joins or conditions the native filter does not cover
+_NOT_CATALOG_RE = re.compile(
+    r"\b(faculty|teacher|professor|prof|dr|taught|by|enrol\w*|student|room|classroom|timetable|schedule|day|after|before|per|each|group)\b"
+    r"|" + _DAY_RE.pattern,
+    re.I,
+)
+
+# Qualifiers no native handler expresses; their presence sends the question to the LLM
+_COMPARATIVE_RE = re.compile(
+    r"\b(more|less|fewer|greater|over|under|above|below|at least|at most|exceed\w*|between|up to|upto|"
+    r"minimum|maximum|min|max)\b|[<>≤≥]",
+    re.I,
+)
+_NEGATION_RE = re.compile(r"\b(not|no|without|except|excluding|exclude|other than|non|nor|neither)\b|n't\b", re.I)
+_LIST_RE = re.compile(r"\b(or|and|either|both|plus)\b|[,&/]", re.I)
+_WORD_RE = re.compile(r"[a-z]+|\d+", re.I)
+
+# Words that carry no condition in count / catalog questions
+_COUNT_FILLER = {
+    "what", "is", "the", "tell", "me", "give", "total", "are", "there", "in", "do", "does", "we", "you", "have",
+    "has", "our", "all", "currently", "overall", "please", "a", "s",
+}
+_CATALOG_FILLER = {
+    "show", "list", "all", "the", "me", "give", "what", "which", "are", "is", "there", "with", "in", "of", "for",
+    "a", "an", "any", "available", "offered", "do", "we", "you", "have", "has", "that", "carry", "carrying",
+    "worth", "ones", "find", "get", "display", "tell", "about", "please", "offer", "s",
+}
+
+COUNT_TABLES = {
+    "students": "students", "courses": "courses", "faculty": "faculty", "faculties": "faculty",
+    "teachers": "faculty", "professors": "faculty", "classrooms": "classrooms", "rooms": "classrooms",
+}
+
+
+def parse_day(text: str) -> Optional[str]:
+    m = _DAY_RE.search(text)
+    return DAYS[m.group(1).lower()] if m else None
+
+
+def parse_days(text: str) -> List[str]:
+    """Distinct days mentioned in `text`, in order."""
+    days: List[str] = []
+    for m in _DAY_RE.finditer(text):
+        day = DAYS[m.group(1).lower()]
+        if day not in days:
+            days.append(day)
+    return days
+
+
+def parse_time(text: str) -> Optional[str]:
+    """First clock time in `text` as "HH:MM" (24h). Bare numbers need am/pm or a colon."""
+    for m in _TIME_RE.finditer(text):
+        hour, minute, ampm = int(m.group(1)), int(m.group(2) or 0), (m.group(3) or "").lower().replace(".", "")
+        if not ampm and m.group(2) is None:
+            continue
+        if ampm == "pm" and hour < 12:
+            hour += 12
+        elif ampm == "am" and hour == 12:
+            hour = 0
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return f"{hour:02d}:{minute:02d}"
+    return None
+
+
+def _clock_times(text: str) -> List[re.Match]:
+    """Matches of `_TIME_RE` that parse_time accepts (am/pm or a colon)."""
+    return [m for m in _TIME_RE.finditer(text) if m.group(2) is not None or m.group(3)]
+
+
+def _first_int(m: Optional[re.Match]) -> Optional[int]:
+    if not m:
+        return None
+    return int(next(g for g in m.groups() if g))
+
+
+def _all_ints(pattern: re.Pattern, text: str) -> List[int]:
+    return [int(next(g for g in m.groups() if g)) for m in pattern.finditer(text)]
+
+
+def _strip(text: str, *patterns: re.Pattern) -> str:
+    for pattern in patterns:
+        text = pattern.sub(" ", text)
+    return text
+
+
+def _qualified(text: str) -> bool:
+    """True if `text` has a comparative, negation or list the handlers cannot express."""
+    return bool(_COMPARATIVE_RE.search(text) or _NEGATION_RE.search(text) or _LIST_RE.search(text))
+
+
+def _leftover(text: str, filler: set) -> List[str]:
+    """Words of `text` (already stripped of consumed qualifiers) that are not filler."""
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in filler]
+
+
+# ---------------------------------------------------------------------
+# Matching
+# ---------------------------------------------------------------------
+def match_intent(text: str, user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """{"intent": name, "params": {...}} for a recognized question, else None."""
+    role = (user.get("role") or "").lower()
+    days = parse_days(text)
+    if len(days) > 1:
+        return None
+    day = days[0] if days else None
+
+    if _TIMETABLE_RE.search(text):
+        # Times, ranges and exclusions are not timetable filters
+        rest = _strip(text, _STUDENT_ID_RE, _DAY_RE)
+        if _qualified(rest) or re.search(r"\d|\b(after|before|until|since)\b", rest, re.I):
+            return None
+        sid = _STUDENT_ID_RE.search(text)
+        if sid:
+            student_id = int(sid.group(1))
+            if role == "student" and student_id != user.get("id"):
+                return None
+            return {"intent": "student_timetable", "params": {"student_id": student_id, "day": day}}
+        if _MY_RE.search(text) and role in ("student", "faculty") and user.get("id") is not None:
+            return {"intent": "my_timetable", "params": {"role": role, "id": user["id"], "day": day}}
+        return None
+
+    if _FREE_RE.search(text) and _ROOM_RE.search(text):
+        if not day:
+            return None
+        caps = list(_CAPACITY_RE.finditer(text))
+        times = _clock_times(_strip(text, _CAPACITY_RE))
+        if len(caps) > 1 or len(times) > 1:
+            return None
+        rest = _strip(text, _CAPACITY_RE, _DAY_RE)
+        for m in times:
+            rest = rest.replace(m.group(0), " ")
+        if _qualified(rest) or re.search(r"\d|\b(after|before|until|since)\b", rest, re.I):
+            return None
+        return {
+            "intent": "free_rooms",
+            "params": {"day": day, "time": parse_time(text), "min_capacity": int(caps[0].group(1)) if caps else None},
+        }
+
+    count = _HOW_MANY_RE.search(text)
+    if count:
+        table = COUNT_TABLES[count.group(2).lower()]
+        semesters = _all_ints(_SEMESTER_RE, text)
+        if len(semesters) > 1 or (semesters and table != "courses"):
+            return None
+        # Anything besides the table and an optional semester is a condition COUNT(*) would drop
+        rest = _strip(text[:count.start()] + " " + text[count.end():], _SEMESTER_RE)
+        if _qualified(rest) or _leftover(rest, _COUNT_FILLER):
+            return None
+        return {"intent": "entity_count", "params": {"table": table, "semester": semesters[0] if semesters else None}}
+
+    if _COURSE_RE.search(text) and not _NOT_CATALOG_RE.search(text) and not _MY_RE.search(text):
+        if _COUNTING_RE.search(text):  # "how many mandatory courses" is a count, not a listing
+            return None
+        credits = _all_ints(_CREDITS_RE, text)
+        semesters = _all_ints(_SEMESTER_RE, text)
+        tops = _TOP_N_RE.findall(text)
+        if len(credits) > 1 or len(semesters) > 1 or len(tops) > 1:
+            return None
+        if _MANDATORY_RE.search(text) and _ELECTIVE_RE.search(text):
+            return None
+        rest = _strip(text, _COURSE_RE, _CREDITS_RE, _SEMESTER_RE, _MANDATORY_RE, _ELECTIVE_RE, _TOP_N_RE)
+        if _qualified(rest) or _leftover(rest, _CATALOG_FILLER):
+            return None
+        filters: Dict[str, Any] = {}
+        if credits:
+            filters["courses.credits"] = credits[0]
+        if semesters:
+            filters["courses.semester"] = semesters[0]
+        if _MANDATORY_RE.search(text):
+            filters["courses.mandatory"] = True
+        elif _ELECTIVE_RE.search(text):
+            filters["courses.mandatory"] = False
+        if not filters:
+            return None
+        return {"intent": "course_catalog", "params": {"filters": filters, "limit": int(tops[0]) if tops else 50}}
+    return None
+
+
+# ---------------------------------------------------------------------
+# Handlers: (spec-like description for summaries, executor result)
+# ---------------------------------------------------------------------
+_STUDENT_TIMETABLE_SQL = (
+    "SELECT t.day, t.start_time, t.end_time, c.code, c.name, r.room_number, r.building "
+    "FROM enrollments e JOIN courses c ON c.id = e.course_id JOIN timeslots t ON t.id = c.timeslot_id "
+    "LEFT JOIN classrooms r ON r.id = c.classroom_id WHERE e.student_id = :id"
+)
+_FACULTY_TIMETABLE_SQL = (
+    "SELECT t.day, t.start_time, t.end_time, c.code, c.name, r.room_number, r.building "
+    "FROM courses c JOIN timeslots t ON t.id = c.timeslot_id "
+    "LEFT JOIN classrooms r ON r.id = c.classroom_id WHERE c.faculty_id = :id"
+)
+_TIMETABLE_TABLES = ["enrollments", "courses", "timeslots", "classrooms"]
+
+
+def _timetable(executor: QueryExecutor, db: Session, role: str, who: str, person_id: int, day: Optional[str]):
+    sql = _STUDENT_TIMETABLE_SQL if who == "student" else _FACULTY_TIMETABLE_SQL
+    params: Dict[str, Any] = {"id": person_id}
+    if day:
+        sql += " AND t.day = :day"
+        params["day"] = day
+    sql += " ORDER BY t.day, t.start_time"
+    spec = {"model": "timeslots", "filters": {"day": day} if day else {}, "limit": executor.row_cap}
+    return spec, executor.execute_sql(db, sql, params, _TIMETABLE_TABLES, role=role)
+
+
+def _free_rooms(executor: QueryExecutor, db: Session, role: str, day: str, time: Optional[str], min_capacity: Optional[int]):
+    # A room is busy if any course meets in it on `day` (at `time`, when given)
+    busy = "co.classroom_id = r.id AND t.day = :day"
+    params: Dict[str, Any] = {"day": day}
+    if time:
+        busy += " AND t.start_time <= :time AND t.end_time > :time"
+        params["time"] = time
+    sql = (
+        "SELECT r.room_number, r.building, r.capacity FROM classrooms r "
+        f"WHERE NOT EXISTS (SELECT 1 FROM courses co JOIN timeslots t ON t.id = co.timeslot_id WHERE {busy})"
+    )
+    if min_capacity:
+        sql += " AND r.capacity >= :cap"
+        params["cap"] = min_capacity
+    sql += " ORDER BY r.capacity, r.room_number"
+    filters = {"day": day, **({"time": time} if time else {}), **({"min capacity": min_capacity} if min_capacity else {})}
+    spec = {"model": "free_classrooms", "filters": filters, "limit": executor.row_cap}
+    return spec, executor.execute_sql(db, sql, params, ["classrooms", "courses", "timeslots"], role=role)
+
+
+def _course_catalog(executor: QueryExecutor, db: Session, role: str, filters: Dict[str, Any], limit: int):
+    spec = {
+        "model": "courses",
+        "fields": ["courses.code", "courses.name", "courses.credits", "courses.semester"],
+        "filters": filters,
+        "joins": [],
+        "order_by": ["courses.code"],
+        "limit": limit,
+    }
+    return spec, executor.execute(db, spec, role=role)
+
+
+def _entity_count(executor: QueryExecutor, db: Session, role: str, table: str, semester: Optional[int]):
+    spec = {
+        "model": table,
+        "fields": [f"COUNT({table}.id)"],
+        "filters": {f"{table}.semester": semester} if semester is not None else {},
+        "joins": [],
+        "limit": 1,
+    }
+    return spec, executor.execute(db, spec, role=role)
+
+
+def run_intent(
+    executor: QueryExecutor, db: Session, user: Dict[str, Any], route: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Execute a matched intent; returns (spec for summaries, executor result)."""
+    role = (user.get("role") or "").lower()
+    p = route["params"]
+    name = route["intent"]
+    if name == "my_timetable":
+        return _timetable(executor, db, role, p["role"], p["id"], p["day"])
+    if name == "student_timetable":
+        return _timetable(executor, db, role, "student", p["student_id"], p["day"])
+    if name == "free_rooms":
+        return _free_rooms(executor, db, role, p["day"], p["time"], p["min_capacity"])
+    if name == "course_catalog":
+        return _course_catalog(executor, db, role, p["filters"], p["limit"])
+    if name == "entity_count":
+        return _entity_count(executor, db, role, p["table"], p["semester"])
+    raise ValueError(f"Unknown intent: {name}")
+
+
+INTENTS: List[str] = ["my_timetable", "student_timetable", "free_rooms", "course_catalog", "entity_count"]
@@ -1,23 +1,44 @@
 # app/keyword_retriever.py
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+# Any-term match: plainto_tsquery stems and drops stopwords, then its ANDs become ORs
+# so a multi-word question matches chunks containing some of its terms.
+_TSQUERY = "NULLIF(replace(plainto_tsquery('english', :q)::text, ' & ', ' | '), '')::tsquery"
+
+
 class KeywordRetriever:
     def __init__(self, db: Session):
         self.db = db
 
-    def search(self, query: str, filter: Dict[str, any], k: int = 8) -> List[Dict]:
+    def search(
+        self,
+        query: str,
+        filter: Optional[Dict[str, Any]] = None,
+        k: int = 8,
+        role_visibility: Optional[str] = None,
+    ) -> List[Dict]:
         """
-        Simple LIKE-based fallback retrieval.
+        Full-text retrieval over knowledge_chunks.chunk_tsv (GIN-indexed, see
+        PgVectorRetriever.ensure_schema), ranked by ts_rank_cd. Chunks matching
+        more of the query terms, closer together, rank higher. With a role,
+        only public chunks and chunks visible to that role are returned, as in
+        the dense search.
         """
-        q = f"%{query.lower()}%"
-        sql = text("""
-            SELECT chunk_text
-            FROM knowledge_chunks
-            WHERE LOWER(chunk_text) LIKE :q
-              AND (metadata->>'type') = :type
+        ftype = (filter or {}).get("type", "schema")
+        type_clause = "AND (c.metadata->>'type') = :type" if ftype is not None else ""
+        role_clause = "AND (c.role_visibility IS NULL OR c.role_visibility = :role)" if role_visibility is not None else ""
+        sql = text(f"""
+            WITH q AS (SELECT {_TSQUERY} AS tsq)
+            SELECT c.id, c.chunk_text, ts_rank_cd(c.chunk_tsv, q.tsq) AS score, d.source
+            FROM knowledge_chunks c
+            JOIN knowledge_documents d ON d.id = c.document_id, q
+            WHERE c.chunk_tsv @@ q.tsq
+              {type_clause}
+              {role_clause}
+            ORDER BY score DESC
             LIMIT :k
         """)
-        rows = self.db.execute(sql, {"q": q, "type": filter.get("type", "schema"), "k": k}).fetchall()
-        return [{"chunk_text": r[0]} for r in rows]
+        rows = self.db.execute(sql, {"q": query, "type": ftype, "role": role_visibility, "k": k}).fetchall()
+        return [{"id": int(r[0]), "chunk_text": r[1], "score": float(r[2]), "source": r[3]} for r in rows]
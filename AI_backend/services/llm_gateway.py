@@ -0,0 +1,397 @@
+"""
+llm_gateway.py
+SAT-YUG Assistant : LLM admission control
+-----------------------------------------
+Every Gemini call (chat and embeddings) passes through a gateway that
+decides when, and whether, it is sent:
+
+- a token bucket caps the request rate (steady `rate` per second, up to
+  `burst` at once), so bursts are smoothed before they become upstream
+  429s; an upstream 429 drains the bucket for its Retry-After
+- a concurrency limit bounds in-flight calls; callers beyond it wait in
+  one FIFO queue shared by async (event loop) and sync (thread) callers
+- the queue is bounded and deadline-aware: a call is shed up front when
+  the queue is full or its predicted wait (queue position x recent
+  service time) would overrun its deadline, and dropped from the queue
+  when the deadline passes while waiting. Shed calls raise LLMOverloaded,
+  which the assistant routes return as 503 with Retry-After
+- identical in-flight requests (same payload key) are coalesced: one is
+  sent and every caller gets its result
+
+The deadline is the earliest of an explicit `deadline`, the request
+deadline set with `set_request_deadline` (a contextvar, so it follows
+the request into worker threads started with asyncio.to_thread) and the
+gateway's `max_wait`.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from services.tracing import record_span
+
+_request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_request_deadline", default=None)
+
+
+class LLMOverloaded(RuntimeError):
+    """The call was shed (or the upstream API throttled it); retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0, reason: str = "overloaded") -> None:
+        super().__init__(message)
+        self.retry_after = max(1.0, retry_after)
+        self.reason = reason
+
+
+def set_request_deadline(seconds: float) -> None:
+    """Give LLM calls made from the current request context at most `seconds` from now."""
+    _request_deadline.set(time.monotonic() + seconds)
+
+
+class _Waiter:
+    __slots__ = ("deadline", "event", "loop", "future", "granted", "cancelled")
+
+    def __init__(self, deadline: float, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.deadline = deadline
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        name: str,
+        rate: float = 10.0,
+        burst: int = 20,
+        max_concurrency: int = 8,
+        max_queue: int = 64,
+        max_wait: float = 10.0,
+        enabled: bool = True,
+    ) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._service_s = 0.0  # EWMA of slot hold time, for the wait prediction
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._async_inflight: Dict[Hashable, asyncio.Future] = {}
+        self._sync_inflight: Dict[Hashable, concurrent.futures.Future] = {}
+        self._stats = {
+            "calls": 0, "coalesced": 0, "rate_delayed": 0, "queued": 0,
+            "shed_queue_full": 0, "shed_deadline": 0, "upstream_throttled": 0,
+            "errors": 0, "max_queue_depth": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+    def _deadline(self, deadline: Optional[float]) -> float:
+        limits = [time.monotonic() + self.max_wait]
+        if deadline is not None:
+            limits.append(deadline)
+        ctx = _request_deadline.get()
+        if ctx is not None:
+            limits.append(ctx)
+        return min(limits)
+
+    def _shed(self, reason: str, retry_after: float) -> LLMOverloaded:
+        self._stats[f"shed_{reason}"] += 1
+        return LLMOverloaded(f"LLM gateway '{self.name}' is overloaded ({reason})", retry_after, reason)
+
+    def _enqueue(self, deadline: float, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or join the queue (returns the waiter)."""
+        with self._lock:
+            self._stats["calls"] += 1
+            if self._in_flight < self.max_concurrency and not self._waiters:
+                self._in_flight += 1
+                self._waits.append(0.0)
+                return None
+            predicted = (len(self._waiters) + 1) / self.max_concurrency * self._service_s
+            if len(self._waiters) >= self.max_queue:
+                raise self._shed("queue_full", predicted)
+            if time.monotonic() + predicted > deadline:
+                raise self._shed("deadline", predicted)
+            waiter = _Waiter(deadline, loop)
+            self._waiters.append(waiter)
+            self._stats["queued"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._waiters))
+            return waiter
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout/cancel; False if the slot was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            return True
+
+    def _release(self, held_s: float) -> None:
+        with self._lock:
+            self._service_s = 0.8 * self._service_s + 0.2 * held_s if self._service_s else held_s
+            now = time.monotonic()
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.cancelled:
+                    continue
+                if waiter.deadline <= now:
+                    # Expired while queued: shed it rather than hand it a slot
+                    waiter.cancelled = True
+                    waiter.wake()
+                    continue
+                # The slot passes straight to the next waiter; in-flight count is unchanged
+                waiter.granted = True
+                waiter.wake()
+                return
+            self._in_flight -= 1
+
+    def _reserve_token(self, deadline: float) -> float:
+        """Seconds to wait for a rate token; sheds if that would overrun `deadline`."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            delay = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if now + delay > deadline:
+                raise self._shed("deadline", delay)
+            self._tokens -= 1
+            if delay:
+                self._stats["rate_delayed"] += 1
+            return delay
+
+    def throttle(self, retry_after: float) -> None:
+        """Upstream said 429: hold new calls back for `retry_after` seconds."""
+        with self._lock:
+            self._stats["upstream_throttled"] += 1
+            if self.rate > 0:
+                self._tokens = min(self._tokens, -self.rate * retry_after)
+
+    def _record_wait(self, started: float) -> None:
+        with self._lock:
+            self._waits.append(time.monotonic() - started)
+
+    # ------------------------------------------------------------------
+    # Async callers
+    # ------------------------------------------------------------------
+    @asynccontextmanager
+    async def aslot(self, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one admitted slot (for streaming calls, which are not coalesced)."""
+        if not self.enabled:
+            yield
+            return
+        deadline = self._deadline(deadline)
+        started = time.monotonic()
+        traced = time.perf_counter()
+        waiter = self._enqueue(deadline, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                if self._give_up(waiter):
+                    with self._lock:
+                        raise self._shed("deadline", self._service_s)
+            except asyncio.CancelledError:
+                if not self._give_up(waiter):
+                    self._release(0.0)
+                raise
+            if not waiter.granted:
+                with self._lock:
+                    raise self._shed("deadline", self._service_s)
+            self._record_wait(started)
+        held = time.monotonic()
+        try:
+            delay = self._reserve_token(deadline)
+            if delay:
+                await asyncio.sleep(delay)
+            record_span("llm.gateway_wait", traced, time.perf_counter(), gateway=self.name)
+            yield
+        except LLMOverloaded as e:
+            if e.reason == "upstream":
+                self.throttle(e.retry_after)
+            raise
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            self._release(time.monotonic() - held)
+
+    async def acall(
+        self, key: Optional[Hashable], fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None
+    ) -> Any:
+        """Await `fn()` under admission control; concurrent calls with the same `key` share one result."""
+        if key is None or not self.enabled:
+            async with self.aslot(deadline):
+                return await fn()
+        loop_key = (id(asyncio.get_running_loop()), key)
+        task = self._async_inflight.get(loop_key)
+        if task is not None:
+            with self._lock:
+                self._stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        async def _leader() -> Any:
+            try:
+                async with self.aslot(deadline):
+                    return await fn()
+            finally:
+                self._async_inflight.pop(loop_key, None)
+
+        # Shielded: followers still get the result if the first caller disconnects
+        task = asyncio.ensure_future(_leader())
+        self._async_inflight[loop_key] = task
+        return await asyncio.shield(task)
+
+    # ------------------------------------------------------------------
+    # Sync callers (worker threads)
+    # ------------------------------------------------------------------
+    def _acquire_sync(self, deadline: float) -> None:
+        started = time.monotonic()
+        waiter = self._enqueue(deadline, None)
+        if waiter is None:
+            return
+        waiter.event.wait(max(0.0, deadline - time.monotonic()))
+        if not waiter.granted and self._give_up(waiter):
+            with self._lock:
+                raise self._shed("deadline", self._service_s)
+        self._record_wait(started)
+
+    def _call_sync(self, fn: Callable[[], Any], deadline: Optional[float]) -> Any:
+        if not self.enabled:
+            return fn()
+        deadline = self._deadline(deadline)
+        traced = time.perf_counter()
+        self._acquire_sync(deadline)
+        held = time.monotonic()
+        try:
+            delay = self._reserve_token(deadline)
+            if delay:
+                time.sleep(delay)
+            record_span("llm.gateway_wait", traced, time.perf_counter(), gateway=self.name)
+            return fn()
+        except LLMOverloaded as e:
+            if e.reason == "upstream":
+                self.throttle(e.retry_after)
+            raise
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            self._release(time.monotonic() - held)
+
+    def call(self, key: Optional[Hashable], fn: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """Blocking `acall`: run `fn()` under admission control, coalescing on `key`."""
+        if key is None or not self.enabled:
+            return self._call_sync(fn, deadline)
+        with self._lock:
+            shared = self._sync_inflight.get(key)
+            if shared is None:
+                mine: concurrent.futures.Future = concurrent.futures.Future()
+                self._sync_inflight[key] = mine
+            else:
+                self._stats["coalesced"] += 1
+        if shared is not None:
+            return shared.result()
+        try:
+            result = self._call_sync(fn, deadline)
+            mine.set_result(result)
+            return result
+        except BaseException as e:
+            mine.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._sync_inflight.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits: List[float] = sorted(self._waits)
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(
+                enabled=self.enabled,
+                in_flight=self._in_flight,
+                queue_depth=len(self._waiters),
+                tokens=round(max(self._tokens, 0.0), 2),
+                service_ms=round(self._service_s * 1000, 1),
+                rate=self.rate,
+                burst=self.burst,
+                max_concurrency=self.max_concurrency,
+                max_queue=self.max_queue,
+            )
+
+        def pct(q: float) -> float:
+            return round(waits[min(len(waits) - 1, math.ceil(q * len(waits)) - 1)] * 1000, 1) if waits else 0.0
+
+        out["wait_ms"] = {
+            "mean": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "p50": pct(0.5),
+            "p95": pct(0.95),
+            "max": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+        return out
+
+
+def _gateway_from_env(name: str, prefix: str, **defaults: Any) -> LLMGateway:
+    def env(key: str) -> str:
+        return os.getenv(f"{prefix}_{key.upper()}", str(defaults[key]))
+
+    return LLMGateway(
+        name,
+        rate=float(env("rate")),
+        burst=int(env("burst")),
+        max_concurrency=int(env("concurrency")),
+        max_queue=int(env("max_queue")),
+        max_wait=float(env("max_wait")),
+        enabled=os.getenv(prefix, "1") != "0",
+    )
+
+
+# generateContent / streamGenerateContent / generateMessage
+CHAT_GATEWAY = _gateway_from_env(
+    "chat", "LLM_GATEWAY", rate=10, burst=20, concurrency=8, max_queue=64, max_wait=10
+)
+# batchEmbedContents; ingestion can afford to wait longer than a chat request
+EMBED_GATEWAY = _gateway_from_env(
+    "embed", "EMBED_GATEWAY", rate=20, burst=40, concurrency=8, max_queue=256, max_wait=60
+)
+
+
+def gateway_stats() -> Dict[str, Any]:
+    return {"chat": CHAT_GATEWAY.stats(), "embed": EMBED_GATEWAY.stats()}
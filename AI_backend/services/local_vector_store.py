@@ -0,0 +1,386 @@
+"""
+local_vector_store.py
+SAT-YUG Assistant : Offline vector store
+----------------------------------------
+A drop-in for PgVectorRetriever (`ingest` / `search` / `ensure_schema`)
+that needs neither Postgres nor the embedding API, for load tests, local
+development and air-gapped deployments:
+
+- vectors: float32 rows in a memory-mapped NumPy file (`vectors.f32`)
+  that grows by doubling; chunk text and metadata live in `meta.json`
+- embeddings: a deterministic hashing-trick embedding of word unigrams and
+  bigrams (LOCAL_EMBEDDER=hash, default), or the real API (=api)
+- search: exact cosine over the matrix (default), or an IVF index
+  (k-means coarse lists, `probes` nearest lists scanned) with
+  LOCAL_VECTOR_SEARCH=ivf
+
+Re-ingesting a source replaces its previous chunks, so seeding is
+idempotent. Deleted rows are tombstoned and compacted away once they make
+up half of the file. `meta.json` is rewritten after each change, or once
+at the end of a `with store.batch():` block (directory syncs).
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+LOCAL_EMBED_DIM = int(os.getenv("LOCAL_EMBED_DIM", "768"))
+LOCAL_EMBEDDER = os.getenv("LOCAL_EMBEDDER", "hash").lower()  # hash | api
+LOCAL_VECTOR_SEARCH = os.getenv("LOCAL_VECTOR_SEARCH", "exact").lower()  # exact | ivf
+LOCAL_IVF_LISTS = int(os.getenv("LOCAL_IVF_LISTS", "0"))  # 0 = sqrt(rows)
+LOCAL_IVF_PROBES = int(os.getenv("LOCAL_IVF_PROBES", "8"))
+# Below this many live rows an IVF index is not worth building
+IVF_MIN_ROWS = 2000
+
+_TOKEN_RE = re.compile(r"\w+")
+META_VERSION = 1
+
+
+# ---------------------------------------------------------------------
+# Hashing-trick embedding
+# ---------------------------------------------------------------------
+@lru_cache(maxsize=200_000)
+def _feature_slot(feature: str, dim: int) -> tuple:
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, (1.0 if (h >> 63) & 1 else -1.0)
+
+
+def hash_embed(texts: List[str], dim: int = LOCAL_EMBED_DIM) -> List[List[float]]:
+    """
+    Deterministic, API-free embeddings: signed feature hashing of lowercase
+    word unigrams and bigrams with sublinear (1 + log tf) weights, L2
+    normalized. Texts sharing vocabulary get high cosine similarity.
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, t in enumerate(texts):
+        tokens = _TOKEN_RE.findall((t or "").lower())
+        tf: Dict[str, int] = {}
+        for feat in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+            tf[feat] = tf.get(feat, 0) + 1
+        for feat, n in tf.items():
+            slot, sign = _feature_slot(feat, dim)
+            out[i, slot] += sign * (1.0 + math.log(n))
+        norm = np.linalg.norm(out[i])
+        if norm > 0:
+            out[i] /= norm
+    return out.tolist()
+
+
+def _default_embedder() -> Callable[[List[str]], List[List[float]]]:
+    if LOCAL_EMBEDDER == "api":
+        from services.embeddings import embed_texts
+        return embed_texts
+    return hash_embed
+
+
+# ---------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------
+class LocalVectorStore:
+    def __init__(
+        self,
+        root: str,
+        dim: int = LOCAL_EMBED_DIM,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        search_mode: str = LOCAL_VECTOR_SEARCH,
+        ivf_lists: int = LOCAL_IVF_LISTS,
+        ivf_probes: int = LOCAL_IVF_PROBES,
+    ) -> None:
+        self.root = root
+        self.dim = dim
+        self.embed_fn = embed_fn or _default_embedder()
+        self.search_mode = search_mode
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self._lock = threading.RLock()
+        self._vec_path = os.path.join(root, "vectors.f32")
+        self._meta_path = os.path.join(root, "meta.json")
+        self._rows: List[Optional[Dict[str, Any]]] = []  # row -> chunk record, None when deleted
+        self._documents: Dict[int, Dict[str, Any]] = {}
+        self._next_doc_id = 1
+        self._next_chunk_id = 1
+        self._capacity = 0
+        self._vecs: Optional[np.memmap] = None
+        self._masks: Optional[Dict[str, np.ndarray]] = None
+        self._ivf: Optional[Dict[str, Any]] = None
+        self._batch_depth = 0
+        self._unsaved = False
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if not meta or meta.get("version") != META_VERSION or meta.get("dim") != self.dim:
+            # Missing, old or different-dimension store: start empty
+            self._remap(0)
+            return
+        self._rows = meta["rows"]
+        self._documents = {int(k): v for k, v in meta["documents"].items()}
+        self._next_doc_id = meta["next_doc_id"]
+        self._next_chunk_id = meta["next_chunk_id"]
+        self._remap(max(meta.get("capacity", 0), len(self._rows)))
+
+    def _save(self) -> None:
+        # Caller holds the lock. Vectors are flushed first so meta never points past them.
+        if self._vecs is not None:
+            self._vecs.flush()
+        meta = {
+            "version": META_VERSION,
+            "dim": self.dim,
+            "capacity": self._capacity,
+            "next_doc_id": self._next_doc_id,
+            "next_chunk_id": self._next_chunk_id,
+            "documents": self._documents,
+            "rows": self._rows,
+        }
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path)
+
+    def _remap(self, capacity: int) -> None:
+        """(Re)open the vector file with room for `capacity` rows, growing it if needed."""
+        self._vecs = None
+        need = capacity * self.dim * 4
+        with open(self._vec_path, "ab") as f:
+            if f.tell() < need:
+                f.truncate(need)
+        self._capacity = capacity
+        if capacity:
+            self._vecs = np.memmap(self._vec_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _append_vectors(self, vecs: np.ndarray) -> int:
+        start = len(self._rows)
+        if start + len(vecs) > self._capacity:
+            self._remap(max(start + len(vecs), self._capacity * 2, 1024))
+        self._vecs[start:start + len(vecs)] = vecs
+        return start
+
+    def _compact(self) -> None:
+        live = [i for i, r in enumerate(self._rows) if r is not None]
+        if len(live) == len(self._rows):
+            return
+        kept = np.array(self._vecs[live]) if live else np.zeros((0, self.dim), dtype=np.float32)
+        self._rows = [self._rows[i] for i in live]
+        self._vecs[: len(kept)] = kept
+
+    def _changed(self) -> None:
+        self._masks = None
+        self._ivf = None
+        deleted = sum(1 for r in self._rows if r is None)
+        compacted = bool(deleted and deleted * 2 >= len(self._rows))
+        if compacted:
+            self._compact()
+        # Compaction moves vectors under the saved rows, so it is persisted at once
+        if self._batch_depth and not compacted:
+            self._unsaved = True
+        else:
+            self._save()
+            self._unsaved = False
+
+    @contextmanager
+    def batch(self) -> Iterator["LocalVectorStore"]:
+        """Defer the meta.json rewrite to the end of the block (one write instead of one per file)."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._unsaved:
+                    self._save()
+                    self._unsaved = False
+
+    # ------------------------------------------------------------------
+    # PgVectorRetriever interface
+    # ------------------------------------------------------------------
+    def ensure_schema(self) -> None:
+        return None
+
+    def ensure_vector_indexes(self) -> Dict[str, List[str]]:
+        return {"created": [], "dropped": [], "kept": []}
+
+    def ingest(
+        self,
+        title: str,
+        source: str,
+        chunks: List[str],
+        role_visibility: Optional[str] = None,
+        metadata_list: Optional[List[dict]] = None,
+        content_hash: Optional[str] = None,
+    ) -> int:
+        if metadata_list is None:
+            metadata_list = [{} for _ in chunks]
+        vecs = np.asarray(self.embed_fn(chunks), dtype=np.float32).reshape(len(chunks), self.dim)
+        with self._lock:
+            self._delete_source(source)
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            self._documents[doc_id] = {
+                "title": title, "source": source, "role_visibility": role_visibility, "content_hash": content_hash,
+            }
+            self._append_vectors(vecs)
+            for chunk, meta in zip(chunks, metadata_list):
+                self._rows.append({
+                    "id": self._next_chunk_id, "document_id": doc_id, "source": source, "chunk_text": chunk,
+                    "metadata": meta or {}, "role_visibility": role_visibility,
+                })
+                self._next_chunk_id += 1
+            self._changed()
+            return doc_id
+
+    def search(
+        self,
+        query: str,
+        k: int = 6,
+        role_visibility: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Nearest chunks to `query` as dicts: id, source, chunk_text, score (cosine similarity)."""
+        qvec = np.asarray(self.embed_fn([query])[0], dtype=np.float32)
+        norm = np.linalg.norm(qvec)
+        if norm > 0:
+            qvec = qvec / norm
+        ftype = filter.get("type") if isinstance(filter, dict) else None
+        with self._lock:
+            n = len(self._rows)
+            if n == 0:
+                return []
+            mask = self._mask(role_visibility, ftype)
+            candidates = self._ivf_candidates(qvec) if self._use_ivf() else None
+            if candidates is None:
+                scores = np.asarray(self._vecs[:n] @ qvec)
+                scores[~mask] = -np.inf
+                rows = np.arange(n)
+            else:
+                rows = candidates[mask[candidates]]
+                scores = np.asarray(self._vecs[rows] @ qvec)
+            k = min(k, int(np.isfinite(scores).sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            out = []
+            for i in top:
+                r = self._rows[int(rows[i])]
+                out.append({"id": r["id"], "source": r["source"], "chunk_text": r["chunk_text"], "score": float(scores[i])})
+            return out
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+    def _delete_source(self, source: str) -> Optional[int]:
+        # None when the source is unknown, else the number of chunks tombstoned
+        doc_ids = {d for d, doc in self._documents.items() if doc["source"] == source}
+        if not doc_ids:
+            return None
+        for d in doc_ids:
+            del self._documents[d]
+        removed = 0
+        for i, r in enumerate(self._rows):
+            if r is not None and r["document_id"] in doc_ids:
+                self._rows[i] = None
+                removed += 1
+        return removed
+
+    def delete_source(self, source: str) -> int:
+        """Remove a source's document and chunks; returns the number of chunks removed."""
+        with self._lock:
+            removed = self._delete_source(source)
+            if removed is None:
+                return 0
+            self._changed()
+            return removed
+
+    def document_hashes(self) -> Dict[str, Optional[str]]:
+        """source -> content hash of its current document."""
+        with self._lock:
+            return {doc["source"]: doc.get("content_hash") for doc in self._documents.values()}
+
+    def visible_sources(self, role: str) -> set:
+        """Sources whose document is public or visible to `role`."""
+        with self._lock:
+            return {
+                doc["source"] for doc in self._documents.values()
+                if doc.get("role_visibility") in (None, role)
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows = []
+            self._documents = {}
+            self._changed()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = sum(1 for r in self._rows if r is not None)
+            return {
+                "backend": "local",
+                "documents": len(self._documents),
+                "chunks": live,
+                "tombstones": len(self._rows) - live,
+                "capacity": self._capacity,
+                "dim": self.dim,
+                "search": "ivf" if self._use_ivf() else "exact",
+                "embedder": getattr(self.embed_fn, "__name__", str(self.embed_fn)),
+            }
+
+    # ------------------------------------------------------------------
+    # Filtering and IVF
+    # ------------------------------------------------------------------
+    def _mask(self, role: Optional[str], ftype: Optional[str]) -> np.ndarray:
+        # Caller holds the lock. Same semantics as the SQL search: public or this role, optional type.
+        if self._masks is None:
+            self._masks = {
+                "live": np.array([r is not None for r in self._rows], dtype=bool),
+                "roles": np.array([(r or {}).get("role_visibility") or "" for r in self._rows], dtype=object),
+                "types": np.array([((r or {}).get("metadata") or {}).get("type") or "" for r in self._rows], dtype=object),
+            }
+        m = self._masks["live"].copy()
+        if role is not None:
+            m &= (self._masks["roles"] == "") | (self._masks["roles"] == role)
+        if ftype is not None:
+            m &= self._masks["types"] == ftype
+        return m
+
+    def _use_ivf(self) -> bool:
+        return self.search_mode == "ivf" and len(self._rows) >= IVF_MIN_ROWS
+
+    def _build_ivf(self, iterations: int = 10, seed: int = 0) -> None:
+        # Caller holds the lock. Spherical k-means over the live rows.
+        live = np.flatnonzero(np.array([r is not None for r in self._rows], dtype=bool))
+        data = np.asarray(self._vecs[live])
+        nlist = self.ivf_lists or max(1, int(math.sqrt(len(live))))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), size=min(nlist, len(data)), replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = data[assign == c]
+                if len(members):
+                    v = members.sum(axis=0)
+                    centroids[c] = v / (np.linalg.norm(v) or 1.0)
+        assign = np.argmax(data @ centroids.T, axis=1)
+        self._ivf = {"centroids": centroids, "lists": [live[assign == c] for c in range(len(centroids))]}
+
+    def _ivf_candidates(self, qvec: np.ndarray) -> np.ndarray:
+        if self._ivf is None:
+            self._build_ivf()
+        near = np.argsort(-(self._ivf["centroids"] @ qvec))[: self.ivf_probes]
+        return np.concatenate([self._ivf["lists"][c] for c in near])
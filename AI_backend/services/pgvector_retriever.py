@@ -1,8 +1,14 @@
 from typing import List, Tuple, Optional, Dict, Any
+import io
+import os
+import hashlib
+import re
 import json
+import struct
 from sqlalchemy.orm import Session
-from sqlalchemy import text, bindparam
+from sqlalchemy import text
 from services.embeddings import embed_texts
+from services.tracing import span
 
 
 SCHEMA_SQL = """
@@ -21,8 +27,225 @@ CREATE TABLE IF NOT EXISTS knowledge_chunks (
   metadata jsonb,
   embedding vector(768)
 );
+
+-- Lexical search (services/keyword_retriever.py): stemmed tsvector kept in sync by Postgres
+ALTER TABLE knowledge_chunks ADD COLUMN IF NOT EXISTS chunk_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('english', coalesce(chunk_text, ''))) STORED;
+
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- btree_gin lets the metadata type filter live in the same GIN index as the tsvector
+CREATE INDEX IF NOT EXISTS knowledge_chunks_type_tsv_gin
+  ON knowledge_chunks USING gin ((metadata->>'type'), chunk_tsv);
+
+-- Denormalized from knowledge_documents so role filters can use partial ANN indexes
+ALTER TABLE knowledge_chunks ADD COLUMN IF NOT EXISTS role_visibility text;
+
+UPDATE knowledge_chunks c SET role_visibility = d.role_visibility
+  FROM knowledge_documents d
+  WHERE d.id = c.document_id AND c.role_visibility IS DISTINCT FROM d.role_visibility;
+
+-- Fingerprints for incremental re-ingest (services/ingestion.py)
+ALTER TABLE knowledge_documents ADD COLUMN IF NOT EXISTS content_hash text;
+
+ALTER TABLE knowledge_documents ADD COLUMN IF NOT EXISTS updated_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS knowledge_documents_source_idx ON knowledge_documents (source);
+
+ALTER TABLE knowledge_chunks ADD COLUMN IF NOT EXISTS chunk_hash text;
+
+CREATE INDEX IF NOT EXISTS knowledge_chunks_document_hash_idx ON knowledge_chunks (document_id, chunk_hash)
 """
 
+# ---------------------------------------------------------------------
+# ANN index settings (see ensure_vector_indexes)
+# ---------------------------------------------------------------------
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "hnsw").lower()  # hnsw | ivfflat | none
+HNSW_M = int(os.getenv("VECTOR_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "40"))
+IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "100"))
+IVF_PROBES = int(os.getenv("VECTOR_IVF_PROBES", "10"))
+# Opt-in partial indexes, each another full HNSW build: one per listed metadata
+# type (schema retrieval filters by type, e.g. "schema") and per listed role
+# (document answers filter by role). (type, role) pairs, which no route
+# queries, only with VECTOR_PARTIAL_PAIRS=1.
+PARTIAL_TYPES = [t for t in os.getenv("VECTOR_PARTIAL_TYPES", "").split(",") if t.strip()]
+PARTIAL_ROLES = [r for r in os.getenv("VECTOR_PARTIAL_ROLES", "").split(",") if r.strip()]
+PARTIAL_PAIRS = os.getenv("VECTOR_PARTIAL_PAIRS", "0") == "1"
+
+INDEX_PREFIX = "kc_emb_"
+
+
+def _ident(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", value.strip().lower()).strip("_")
+
+
+def _literal(value: str) -> str:
+    return "'" + value.strip().replace("'", "''") + "'"
+
+
+def _role_predicate(role: str, col: str = "role_visibility") -> str:
+    return f"({col} IS NULL OR {col} = {_literal(role)})"
+
+
+def _type_predicate(ftype: str, col: str = "metadata") -> str:
+    return f"({col}->>'type') = {_literal(ftype)}"
+
+
+def desired_vector_indexes(
+    kind: str = VECTOR_INDEX_KIND,
+    types: Optional[List[str]] = None,
+    roles: Optional[List[str]] = None,
+    table: str = "knowledge_chunks",
+    pairs: Optional[bool] = None,
+) -> Dict[str, str]:
+    """
+    Index name -> CREATE INDEX statement. Build parameters are part of the
+    name, so changing them yields new names and the old indexes get dropped.
+    Predicates come from the same builders as `search_filters`, so a
+    search for an indexed role/type carries the index predicate verbatim
+    and the planner can prove it.
+    """
+    if kind == "none":
+        return {}
+    if kind == "hnsw":
+        tag = f"hnsw_m{HNSW_M}_ef{HNSW_EF_CONSTRUCTION}"
+        using = f"hnsw (embedding vector_cosine_ops) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+    elif kind == "ivfflat":
+        tag = f"ivf_l{IVF_LISTS}"
+        using = f"ivfflat (embedding vector_cosine_ops) WITH (lists = {IVF_LISTS})"
+    else:
+        raise ValueError(f"Unknown VECTOR_INDEX_KIND: {kind}")
+
+    types = PARTIAL_TYPES if types is None else types
+    roles = PARTIAL_ROLES if roles is None else roles
+    pairs = PARTIAL_PAIRS if pairs is None else pairs
+    variants: List[Tuple[str, List[str]]] = [("all", [])]
+    type_preds = [(f"t_{_ident(t)}", _type_predicate(t)) for t in types]
+    role_preds = [(f"r_{_ident(r)}", _role_predicate(r)) for r in roles]
+    variants += [(n, [p]) for n, p in type_preds + role_preds]
+    if pairs:
+        variants += [(f"{tn}_{rn}", [tp, rp]) for tn, tp in type_preds for rn, rp in role_preds]
+
+    out: Dict[str, str] = {}
+    for suffix, preds in variants:
+        # Postgres truncates identifiers at 63 bytes
+        name = f"{INDEX_PREFIX}{tag}_{suffix}"[:63]
+        where = f" WHERE {' AND '.join(preds)}" if preds else ""
+        out[name] = f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING {using}{where}"
+    return out
+
+
+def search_filters(role: Optional[str], ftype: Optional[str]) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    WHERE predicates (on alias `c`) and bind params for a vector search.
+    No catch-all `(:x IS NULL OR ...)` forms: an absent filter adds nothing,
+    and a role/type with a partial index is inlined as the literal the
+    index predicate uses (other values are bound).
+    """
+    preds: List[str] = []
+    params: Dict[str, Any] = {}
+    if role is not None:
+        if role.strip() in [r.strip() for r in PARTIAL_ROLES]:
+            preds.append(_role_predicate(role, "c.role_visibility"))
+        else:
+            preds.append("(c.role_visibility IS NULL OR c.role_visibility = :role)")
+            params["role"] = role
+    if ftype is not None:
+        if ftype.strip() in [t.strip() for t in PARTIAL_TYPES]:
+            preds.append(_type_predicate(ftype, "c.metadata"))
+        else:
+            preds.append("(c.metadata->>'type') = :ftype")
+            params["ftype"] = ftype
+    return preds, params
+
+
+def set_search_params(db: Session, kind: str = VECTOR_INDEX_KIND) -> None:
+    """Per-transaction ANN recall/speed knob for the following vector query."""
+    if kind == "hnsw":
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(HNSW_EF_SEARCH)}"))
+    elif kind == "ivfflat":
+        db.execute(text(f"SET LOCAL ivfflat.probes = {int(IVF_PROBES)}"))
+
+
+# ---------------------------------------------------------------------
+# Bulk chunk writer: binary COPY (psycopg2) with a multi-row INSERT fallback
+# ---------------------------------------------------------------------
+CHUNK_COLUMNS = ("document_id", "chunk_text", "metadata", "embedding", "role_visibility", "chunk_hash")
+ChunkRow = Tuple[int, str, Dict[str, Any], List[float], Optional[str], Optional[str]]
+
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+
+
+def _field(buf: io.BytesIO, payload: Optional[bytes]) -> None:
+    if payload is None:
+        buf.write(struct.pack("!i", -1))
+    else:
+        buf.write(struct.pack("!i", len(payload)))
+        buf.write(payload)
+
+
+def encode_vector_binary(vec: List[float]) -> bytes:
+    """pgvector's binary wire format: int16 dim, int16 unused, float4[dim] (big-endian)."""
+    return struct.pack(f"!hh{len(vec)}f", len(vec), 0, *vec)
+
+
+def _copy_binary_payload(rows: List[ChunkRow]) -> bytes:
+    buf = io.BytesIO()
+    buf.write(_PGCOPY_HEADER)
+    for doc_id, chunk, meta, vec, role, digest in rows:
+        buf.write(struct.pack("!h", len(CHUNK_COLUMNS)))
+        _field(buf, struct.pack("!q", int(doc_id)))
+        _field(buf, chunk.encode("utf-8"))
+        _field(buf, b"\x01" + json.dumps(meta or {}).encode("utf-8"))  # jsonb binary = version 1 + text
+        _field(buf, encode_vector_binary(vec))
+        _field(buf, role.encode("utf-8") if role is not None else None)
+        _field(buf, digest.encode("utf-8") if digest is not None else None)
+    buf.write(struct.pack("!h", -1))
+    return buf.getvalue()
+
+
+def write_chunks(db: Session, rows: List[ChunkRow]) -> int:
+    """
+    Insert (document_id, chunk_text, metadata, embedding, role_visibility,
+    chunk_hash) rows in the session's transaction. Uses one binary COPY on psycopg2
+    (vectors sent as float4, not decimal text); other drivers fall back to
+    multi-row INSERTs. The caller commits.
+    """
+    if not rows:
+        return 0
+    dbapi_conn = db.connection().connection.dbapi_connection
+    cursor = dbapi_conn.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(
+                f"COPY knowledge_chunks ({', '.join(CHUNK_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+                io.BytesIO(_copy_binary_payload(rows)),
+            )
+            return len(rows)
+    finally:
+        cursor.close()
+
+    for i in range(0, len(rows), 200):
+        part = rows[i:i + 200]
+        values, params = [], {}
+        for j, (doc_id, chunk, meta, vec, role, digest) in enumerate(part):
+            values.append(f"(:d{j}, :c{j}, CAST(:m{j} AS jsonb), CAST(:e{j} AS vector), :r{j}, :h{j})")
+            params.update({
+                f"d{j}": doc_id, f"c{j}": chunk, f"m{j}": json.dumps(meta or {}),
+                f"e{j}": "[" + ",".join(repr(float(x)) for x in vec) + "]", f"r{j}": role, f"h{j}": digest,
+            })
+        db.execute(text(
+            f"INSERT INTO knowledge_chunks ({', '.join(CHUNK_COLUMNS)}) VALUES " + ", ".join(values)
+        ), params)
+    return len(rows)
+
 
 class PgVectorRetriever:
     def __init__(self, db: Session) -> None:
@@ -36,6 +259,25 @@ class PgVectorRetriever:
             if s:
                 self.db.execute(text(s))
         self.db.commit()
+        self.ensure_vector_indexes()
+
+    def ensure_vector_indexes(self) -> Dict[str, List[str]]:
+        """Create the configured ANN indexes and drop managed ones whose settings changed."""
+        desired = desired_vector_indexes()
+        existing = {
+            r[0] for r in self.db.execute(
+                text("SELECT indexname FROM pg_indexes WHERE tablename = 'knowledge_chunks' AND indexname LIKE :p"),
+                {"p": INDEX_PREFIX + "%"},
+            ).fetchall()
+        }
+        dropped = sorted(existing - set(desired))
+        for name in dropped:
+            self.db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        created = sorted(set(desired) - existing)
+        for name in created:
+            self.db.execute(text(desired[name]))
+        self.db.commit()
+        return {"created": created, "dropped": dropped, "kept": sorted(existing & set(desired))}
 
     def ingest(self, title: str, source: str, chunks: List[str], role_visibility: Optional[str] = None, metadata_list: Optional[List[dict]] = None) -> int:
         if metadata_list is None:
@@ -45,45 +287,49 @@ class PgVectorRetriever:
             text("INSERT INTO knowledge_documents(title, source, role_visibility) VALUES (:t,:s,:r) RETURNING id"),
             {"t": title, "s": source, "r": role_visibility},
         ).scalar_one()
-
-        for chunk, meta, vec in zip(chunks, metadata_list, vecs):
-            m_json = json.dumps(meta or {})
-            e_str = "[" + ",".join(str(x) for x in vec) + "]"
-            stmt = text(
-                "INSERT INTO knowledge_chunks(document_id, chunk_text, metadata, embedding) "
-                "VALUES (:d, :c, CAST(:m AS jsonb), CAST(:e AS vector))"
-            ).bindparams(
-                bindparam("d"),
-                bindparam("c"),
-                bindparam("m"),
-                bindparam("e"),
-            )
-            self.db.execute(stmt, {"d": doc_id, "c": chunk, "m": m_json, "e": e_str})
+        write_chunks(self.db, [
+            (doc_id, chunk, meta, vec, role_visibility, chunk_hash(chunk))
+            for chunk, meta, vec in zip(chunks, metadata_list, vecs)
+        ])
         self.db.commit()
         return int(doc_id)
 
-    def search(self, query: str, k: int = 6, role_visibility: Optional[str] = None, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str, float]]:
-        qvec = embed_texts([query])[0]
+    def search(self, query: str, k: int = 6, role_visibility: Optional[str] = None, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Nearest chunks to `query` as dicts: id, source, chunk_text, score (cosine similarity)."""
+        with span("vector.embed_query"):
+            qvec = embed_texts([query])[0]
         q_str = "[" + ",".join(str(x) for x in qvec) + "]"
-        params = {"q": q_str, "k": k}
-        ftype = None
-        if isinstance(filter, dict):
-            ftype = filter.get("type")
-        sql = """
-        SELECT d.source, c.chunk_text, 1 - (c.embedding <=> CAST(:q AS vector)) AS score
+        ftype = filter.get("type") if isinstance(filter, dict) else None
+        sql, params = self._search_sql(role_visibility, ftype)
+        params.update(q=q_str, k=k)
+        with span("vector.search", k=k):
+            set_search_params(self.db)
+            rows = self.db.execute(text(sql), params).fetchall()
+        return [{"id": int(r[0]), "source": r[1], "chunk_text": r[2], "score": float(r[3])} for r in rows]
+
+    @staticmethod
+    def _search_sql(role: Optional[str], ftype: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        preds, params = search_filters(role, ftype)
+        where = f"WHERE {' AND '.join(preds)}" if preds else ""
+        sql = f"""
+        SELECT c.id, d.source, c.chunk_text, 1 - (c.embedding <=> CAST(:q AS vector)) AS score
         FROM knowledge_chunks c
         JOIN knowledge_documents d ON d.id = c.document_id
-        WHERE (:role IS NULL OR d.role_visibility IS NULL OR d.role_visibility = :role)
-          AND (:ftype IS NULL OR c.metadata->>'type' = :ftype)
+        {where}
         ORDER BY c.embedding <=> CAST(:q AS vector)
         LIMIT :k
         """
-        if role_visibility is None:
-            params["role"] = None
-        else:
-            params["role"] = role_visibility
-        params["ftype"] = ftype
-        rows = self.db.execute(text(sql), params).fetchall()
-        return [(r[0], r[1], float(r[2])) for r in rows]
-
+        return sql, params
 
+    def explain_search(self, role: Optional[str] = None, ftype: Optional[str] = None, k: int = 6) -> Dict[str, Any]:
+        """EXPLAIN the search for (role, type); returns the ANN index the plan uses (None = no index) and the plan."""
+        dim = self.db.execute(text(
+            "SELECT atttypmod FROM pg_attribute WHERE attrelid = 'knowledge_chunks'::regclass AND attname = 'embedding'"
+        )).scalar() or 768
+        sql, params = self._search_sql(role, ftype)
+        params.update(q="[" + ",".join(["1"] + ["0"] * (int(dim) - 1)) + "]", k=k)
+        set_search_params(self.db)
+        plan = "\n".join(r[0] for r in self.db.execute(text("EXPLAIN " + sql), params).fetchall())
+        self.db.rollback()
+        index = next(iter(re.findall(r"Index Scan using (" + INDEX_PREFIX + r"\w+)", plan)), None)
+        return {"role": role, "type": ftype, "index": index, "plan": plan}
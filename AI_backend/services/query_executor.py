@@ -0,0 +1,303 @@
+"""
+query_executor.py
+SAT-YUG Assistant : Guarded SQL execution
+-----------------------------------------
+Executes validated query specs with bounds the LLM cannot override:
+
+- compiled statements are cached by spec *shape* (tables, columns, joins,
+  filter keys, grouping, ordering, limit), so repeated shapes skip SQL
+  assembly and reuse one TextClause; filter values stay bind parameters
+- every query runs under a per-role `statement_timeout` (SET LOCAL, so
+  it ends with the transaction) and a hard row cap on the LIMIT
+- rows are fetched in streamed batches (server-side cursor) and the
+  fetch stops at the cap
+- results are cached by SQL + params. Each entry remembers the write
+  version of every table it read, and the CRUD routers bump a table's
+  version after committing a write, so a hit is never older than the
+  last write seen by this process. A TTL bounds staleness from writers
+  this process does not see (other workers, jobs, direct SQL).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+
+def _role_ms(spec: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for part in spec.split(","):
+        if ":" in part:
+            role, ms = part.split(":", 1)
+            out[role.strip().lower()] = int(ms)
+    return out
+
+
+# role:milliseconds; roles not listed get the "default" entry
+ROLE_TIMEOUTS_MS = _role_ms(os.getenv("ASSISTANT_SQL_TIMEOUTS", "student:2000,faculty:3000,admin:10000,default:2000"))
+ROW_CAP = int(os.getenv("ASSISTANT_SQL_ROW_CAP", "200"))
+DEFAULT_LIMIT = 50
+FETCH_BATCH = int(os.getenv("ASSISTANT_SQL_FETCH_BATCH", "100"))
+STATEMENT_CACHE_SIZE = int(os.getenv("ASSISTANT_SQL_STATEMENT_CACHE_SIZE", "256"))
+RESULT_CACHE_SIZE = int(os.getenv("ASSISTANT_RESULT_CACHE_SIZE", "512"))
+RESULT_CACHE_TTL_S = float(os.getenv("ASSISTANT_RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_ENABLED = os.getenv("ASSISTANT_RESULT_CACHE", "1") != "0"
+
+_AGG_RE = re.compile(r"^[A-Za-z]+\s*\(.*\)$")
+
+
+def statement_timeout_ms(role: Optional[str]) -> int:
+    return ROLE_TIMEOUTS_MS.get((role or "").lower(), ROLE_TIMEOUTS_MS.get("default", 2000))
+
+
+# ---------------------------------------------------------------------
+# Table write versions
+# ---------------------------------------------------------------------
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def bump_table_versions(*tables: str) -> None:
+    """Mark `tables` as written; call after the write commits."""
+    with _versions_lock:
+        for t in tables:
+            _versions[t] = _versions.get(t, 0) + 1
+
+
+def table_versions(tables: Iterable[str]) -> Dict[str, int]:
+    with _versions_lock:
+        return {t: _versions.get(t, 0) for t in tables}
+
+
+# ---------------------------------------------------------------------
+# Statement compilation
+# ---------------------------------------------------------------------
+def spec_tables(spec: Dict[str, Any]) -> List[str]:
+    return sorted({spec["model"], *(j["model"] for j in spec.get("joins", []))})
+
+
+def _shape(spec: Dict[str, Any], limit: int) -> str:
+    return json.dumps([
+        spec["model"],
+        list(spec["fields"]),
+        [[j["model"], sorted(j["on"].items())] for j in spec.get("joins", [])],
+        list(spec.get("filters", {}).keys()),
+        list(spec.get("group_by") or []),
+        list(spec.get("order_by") or []),
+        limit,
+    ])
+
+
+def build_sql(spec: Dict[str, Any], limit: int) -> str:
+    fields_list = list(spec["fields"])
+    group_by = list(spec.get("group_by") or [])
+    # Auto GROUP BY when aggregates are mixed with plain columns
+    if not group_by and any(_AGG_RE.match(f.strip()) for f in fields_list):
+        group_by = [f for f in fields_list if not _AGG_RE.match(f.strip()) and "." in f]
+    sql = f"SELECT {', '.join(fields_list)} FROM {spec['model']}"
+    for j in spec.get("joins", []):
+        on = " AND ".join(f"{lk} = {rk}" for lk, rk in j["on"].items())
+        sql += f" JOIN {j['model']} ON {on}"
+    where = [f"{k} = :p{i}" for i, k in enumerate(spec.get("filters", {}))]
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if group_by:
+        sql += " GROUP BY " + ", ".join(group_by)
+    if spec.get("order_by"):
+        sql += " ORDER BY " + ", ".join(spec["order_by"])
+    return sql + f" LIMIT {int(limit)}"
+
+
+class QueryExecutor:
+    def __init__(
+        self,
+        row_cap: int = ROW_CAP,
+        fetch_batch: int = FETCH_BATCH,
+        statement_cache_size: int = STATEMENT_CACHE_SIZE,
+        result_cache_size: int = RESULT_CACHE_SIZE,
+        result_ttl_s: float = RESULT_CACHE_TTL_S,
+        result_cache: bool = RESULT_CACHE_ENABLED,
+    ) -> None:
+        self.row_cap = row_cap
+        self.fetch_batch = fetch_batch
+        self.statement_cache_size = statement_cache_size
+        self.result_cache_size = result_cache_size
+        self.result_ttl_s = result_ttl_s
+        self.result_cache = result_cache
+        self._lock = threading.Lock()
+        self._statements: "OrderedDict[str, Tuple[str, TextClause]]" = OrderedDict()
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stats = {
+            "statement_hits": 0, "statement_misses": 0,
+            "result_hits": 0, "result_misses": 0, "result_stale": 0,
+            "capped": 0, "timeouts": 0,
+        }
+
+    def _statement(self, spec: Dict[str, Any], limit: int) -> Tuple[str, TextClause]:
+        key = _shape(spec, limit)
+        with self._lock:
+            hit = self._statements.get(key)
+            if hit is not None:
+                self._statements.move_to_end(key)
+                self._stats["statement_hits"] += 1
+                return hit
+            self._stats["statement_misses"] += 1
+        sql = build_sql(spec, limit)
+        compiled = (sql, text(sql))
+        with self._lock:
+            self._statements[key] = compiled
+            while len(self._statements) > self.statement_cache_size:
+                self._statements.popitem(last=False)
+        return compiled
+
+    # ------------------------------------------------------------------
+    # Result cache
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _result_key(sql: str, params: Dict[str, Any]) -> str:
+        blob = json.dumps([sql, sorted(params.items())], default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str, tables: List[str]) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                self._stats["result_misses"] += 1
+                return None
+            if time.monotonic() - entry["at"] > self.result_ttl_s or entry["versions"] != table_versions(tables):
+                del self._results[key]
+                self._stats["result_stale"] += 1
+                return None
+            self._results.move_to_end(key)
+            self._stats["result_hits"] += 1
+            return entry["rows"]
+
+    def _store(self, key: str, versions: Dict[str, int], rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._results[key] = {"rows": rows, "versions": versions, "at": time.monotonic()}
+            while len(self._results) > self.result_cache_size:
+                self._results.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+    def execute(self, db: Session, spec: Dict[str, Any], role: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run `spec` and return {"sql", "rows", "count", "capped", "truncated",
+        "cached"}. The LIMIT is the spec's limit clamped to the row cap;
+        "capped" says whether the cap reduced it, "truncated" whether the
+        rows filled the LIMIT (so more may exist).
+        """
+        requested = int(spec.get("limit") or DEFAULT_LIMIT)
+        limit = max(1, min(requested, self.row_cap))
+        capped = requested > limit
+        sql, stmt = self._statement(spec, limit)
+        params = {f"p{i}": v for i, v in enumerate(spec.get("filters", {}).values())}
+        return self._run(db, sql, stmt, params, spec_tables(spec), limit, capped, role)
+
+    def execute_sql(
+        self,
+        db: Session,
+        sql: str,
+        params: Dict[str, Any],
+        tables: List[str],
+        role: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run a fixed, parameterized SELECT (native assistant handlers) with the
+        same timeout, row cap and result cache as specs. `sql` must not have a
+        LIMIT; the capped one is appended. `tables` are the tables it reads.
+        """
+        limit = self.row_cap
+        key = "sql:" + sql
+        with self._lock:
+            hit = self._statements.get(key)
+            if hit is not None:
+                self._statements.move_to_end(key)
+        if hit is None:
+            full = f"{sql} LIMIT {int(limit)}"
+            hit = (full, text(full))
+            with self._lock:
+                self._statements[key] = hit
+                while len(self._statements) > self.statement_cache_size:
+                    self._statements.popitem(last=False)
+        return self._run(db, hit[0], hit[1], params, sorted(tables), limit, False, role)
+
+    def _run(
+        self,
+        db: Session,
+        sql: str,
+        stmt: TextClause,
+        params: Dict[str, Any],
+        tables: List[str],
+        limit: int,
+        capped: bool,
+        role: Optional[str],
+    ) -> Dict[str, Any]:
+        key = self._result_key(sql, params) if self.result_cache else None
+        if key is not None:
+            rows = self._cached(key, tables)
+            if rows is not None:
+                return {
+                    "sql": sql, "rows": rows, "count": len(rows), "capped": capped,
+                    "truncated": len(rows) >= limit, "cached": True,
+                }
+        # Versions are read before the query: a write landing mid-query makes the entry stale, not wrong
+        versions = table_versions(tables)
+
+        if capped:
+            with self._lock:
+                self._stats["capped"] += 1
+        timeout = statement_timeout_ms(role)
+        rows: List[Dict[str, Any]] = []
+        try:
+            db.execute(text(f"SET LOCAL statement_timeout = {int(timeout)}"))
+            result = db.execute(
+                stmt, params, execution_options={"stream_results": True, "max_row_buffer": self.fetch_batch}
+            )
+            for batch in result.partitions(self.fetch_batch):
+                rows.extend(dict(r._mapping) for r in batch)
+                if len(rows) >= limit:
+                    break
+            result.close()
+            db.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+        except Exception as e:
+            db.rollback()
+            if "statement timeout" in str(e).lower() or "canceling statement" in str(e).lower():
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise TimeoutError(f"Query exceeded the {timeout} ms limit for role '{role or 'default'}'") from e
+            raise
+        rows = rows[:limit]
+
+        if key is not None:
+            self._store(key, versions, rows)
+        return {
+            "sql": sql, "rows": rows, "count": len(rows), "capped": capped,
+            "truncated": len(rows) >= limit, "cached": False,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(
+                statements=len(self._statements),
+                results=len(self._results),
+                row_cap=self.row_cap,
+                timeouts_ms=dict(ROLE_TIMEOUTS_MS),
+            )
+        with _versions_lock:
+            out["table_versions"] = dict(_versions)
+        return out
@@ -0,0 +1,201 @@
+"""
+result_summarizer.py
+SAT-YUG Assistant : Result summaries
+------------------------------------
+Deterministic, template-based summaries for the common result shapes the
+SQL agent produces (empty result, single aggregate, timetables, short
+lists), so most answers need no second LLM round trip. When the LLM is
+used (opt-in, or no template fits), large results are profiled and
+sampled to a token budget instead of being dumped into the prompt.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+SMALL_LIST = int(os.getenv("ASSISTANT_SUMMARY_LIST_SIZE", "10"))
+TOKEN_BUDGET = int(os.getenv("ASSISTANT_SUMMARY_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4  # rough estimate for English/JSON text
+
+AGG_WORDS = {"sum": "total", "avg": "average", "min": "minimum", "max": "maximum"}
+DISPLAY_COLUMNS = ("name", "code", "room_number", "title", "roll_number", "email")
+DAY_ORDER = {d: i for i, d in enumerate(
+    ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+)}
+DAY_ORDER.update({d[:3]: i for d, i in list(DAY_ORDER.items())})  # timeslots store "Mon", "Tue", ...
+
+
+def _fmt(v: Any) -> str:
+    if v is None:
+        return "n/a"
+    if isinstance(v, bool):
+        return "yes" if v else "no"
+    if isinstance(v, (float, Decimal)):
+        f = float(v)
+        return str(int(f)) if f.is_integer() else f"{f:,.2f}"
+    if isinstance(v, dtime):
+        return v.strftime("%H:%M")
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M")
+    if isinstance(v, date):
+        return v.isoformat()
+    return str(v)
+
+
+def _table_word(spec: Dict[str, Any]) -> str:
+    return (spec.get("model") or "record").replace("_", " ")
+
+
+def _filters_text(spec: Dict[str, Any]) -> str:
+    filters = spec.get("filters") or {}
+    if not filters:
+        return ""
+    parts = [f"{k.split('.')[-1].replace('_', ' ')} {_fmt(v)}" for k, v in filters.items()]
+    return " with " + ", ".join(parts)
+
+
+def _aggregate(spec: Dict[str, Any]) -> Optional[re.Match]:
+    fields = spec.get("fields") or []
+    if len(fields) != 1:
+        return None
+    return re.match(r"^([A-Za-z]+)\((.*)\)$", fields[0].strip())
+
+
+def _display_column(columns: List[str]) -> Optional[str]:
+    for c in DISPLAY_COLUMNS:
+        if c in columns:
+            return c
+    return None
+
+
+def _describe_row(row: Dict[str, Any], label_col: Optional[str], max_extra: int = 4) -> str:
+    extras = [(k, v) for k, v in row.items() if k != label_col and k != "id"][:max_extra]
+    detail = ", ".join(f"{k.replace('_', ' ')}: {_fmt(v)}" for k, v in extras)
+    if label_col is None:
+        return detail or _fmt(row.get("id"))
+    return f"{_fmt(row[label_col])} ({detail})" if detail else _fmt(row[label_col])
+
+
+def _timetable(rows: List[Dict[str, Any]]) -> str:
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for r in rows:
+        by_day.setdefault(str(r.get("day") or "?"), []).append(r)
+    lines = []
+    for day in sorted(by_day, key=lambda d: DAY_ORDER.get(d.lower(), 99)):
+        slots = sorted(by_day[day], key=lambda r: str(r.get("start_time") or ""))
+        items = []
+        for r in slots:
+            span = _fmt(r.get("start_time"))
+            if r.get("end_time") is not None:
+                span += "–" + _fmt(r.get("end_time"))
+            what = " ".join(_fmt(r[c]) for c in ("code", "name") if r.get(c) is not None)
+            where = f" in {_fmt(r['room_number'])}" if r.get("room_number") is not None else ""
+            items.append(f"{span} {what}{where}".strip())
+        lines.append(f"{day}: " + "; ".join(items))
+    return "\n".join(lines)
+
+
+def template_summary(spec: Dict[str, Any], rows: List[Dict[str, Any]], truncated: bool = False) -> Optional[str]:
+    """
+    A deterministic summary for a recognized result shape, or None.
+    `truncated` is the executor's flag for rows that filled the LIMIT.
+    """
+    table = _table_word(spec)
+    where = _filters_text(spec)
+    if not rows:
+        return f"No matching {table} found{where}."
+
+    columns = list(rows[0].keys())
+
+    # Single aggregate value, e.g. COUNT(courses.id)
+    if len(rows) == 1 and len(columns) == 1:
+        value = rows[0][columns[0]]
+        agg = _aggregate(spec)
+        if agg:
+            func = agg.group(1).lower()
+            if func == "count":
+                return f"There are {_fmt(value)} {table}{where}."
+            col = agg.group(2).split(".")[-1].replace("_", " ")
+            return f"The {AGG_WORDS.get(func, func)} {col} of {table}{where} is {_fmt(value)}."
+        return f"{columns[0].replace('_', ' ').capitalize()}: {_fmt(value)}."
+
+    # Timetable-like rows (day + start time)
+    if "day" in columns and "start_time" in columns:
+        head = f"{len(rows)} scheduled class{'es' if len(rows) != 1 else ''}{where}"
+        head += " (first results only)" if truncated else ""
+        return head + ":\n" + _timetable(rows)
+
+    # Short lists
+    if len(rows) <= SMALL_LIST:
+        label = _display_column(columns)
+        more = " (first results only)" if truncated else ""
+        if len(rows) == 1:
+            return f"Found 1 {table}{where}{more}: {_describe_row(rows[0], label, max_extra=8)}."
+        items = [_describe_row(r, label) for r in rows]
+        return f"Found {len(rows)} {table}{where}{more}: " + "; ".join(items) + "."
+    return None
+
+
+def profile_rows(rows: List[Dict[str, Any]], top_k: int = 5) -> Dict[str, Any]:
+    """Column-wise statistics of a result set (numeric range/mean, top values otherwise)."""
+    columns: Dict[str, Any] = {}
+    for col in (rows[0].keys() if rows else []):
+        values = [r.get(col) for r in rows]
+        present = [v for v in values if v is not None]
+        info: Dict[str, Any] = {"nulls": len(values) - len(present)}
+        nums = [float(v) for v in present if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)]
+        if present and len(nums) == len(present):
+            info.update(min=min(nums), max=max(nums), mean=round(sum(nums) / len(nums), 3))
+        else:
+            counts = Counter(_fmt(v) for v in present)
+            info.update(distinct=len(counts), top=counts.most_common(top_k))
+        columns[col] = info
+    return {"row_count": len(rows), "columns": columns}
+
+
+def budgeted_rows_text(rows: List[Dict[str, Any]], token_budget: int = TOKEN_BUDGET) -> str:
+    """
+    Rows for an LLM prompt within `token_budget`: the full rows when they
+    fit, otherwise a column profile plus as many evenly spaced sample rows
+    as the remaining budget allows.
+    """
+    budget = token_budget * CHARS_PER_TOKEN
+    full = json.dumps(rows, default=_fmt)
+    if len(full) <= budget:
+        return full
+
+    profile = json.dumps(profile_rows(rows), default=_fmt)
+    if len(profile) > budget:
+        profile = profile[:budget]
+    remaining = budget - len(profile)
+    sample: List[str] = []
+    step = max(1, len(rows) // 20)
+    for r in rows[::step]:
+        line = json.dumps(r, default=_fmt)
+        if len(line) + 1 > remaining:
+            break
+        sample.append(line)
+        remaining -= len(line) + 1
+    return (
+        f"PROFILE ({len(rows)} rows): {profile}\n"
+        f"SAMPLE ({len(sample)} of {len(rows)} rows):\n" + "\n".join(sample)
+    )
+
+
+def budgeted_text(chunk: str, parts: int, token_budget: int = TOKEN_BUDGET) -> str:
+    """`chunk` cut to an even share of `token_budget` split across `parts` prompt parts."""
+    limit = token_budget * CHARS_PER_TOKEN // max(1, parts)
+    return chunk if len(chunk) <= limit else chunk[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+def summary_prompt(question: str, rows: List[Dict[str, Any]], token_budget: int = TOKEN_BUDGET) -> str:
+    return (
+        "You are a summarizer. Answer the user's question from this SQL result "
+        "in two or three concise sentences.\n"
+        f"QUESTION: {question}\n"
+        f"RESULT:\n{budgeted_rows_text(rows, token_budget)}"
+    )
@@ -1,25 +1,34 @@
 import os
-from typing import List, Tuple
+import re
+import json
 import math
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
 
 
-def _read_text_files(root: str) -> List[Tuple[str, str]]:
-    docs: List[Tuple[str, str]] = []
+_TOKEN_RE = re.compile(r"\w+")
+
+INDEX_VERSION = 2
+
+# Shared by this index and knowledge ingestion (pgvector and the local store), so
+# the same file yields the same chunks everywhere and hybrid fusion can match them
+CHUNK_WORDS = int(os.getenv("KNOWLEDGE_CHUNK_WORDS", "500"))
+CHUNK_OVERLAP = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "100"))
+
+
+def _list_text_files(root: str) -> List[str]:
+    paths: List[str] = []
     if not os.path.isdir(root):
-        return docs
+        return paths
     for dirpath, _, filenames in os.walk(root):
         for fn in filenames:
             if fn.lower().endswith((".md", ".txt")):
-                p = os.path.join(dirpath, fn)
-                try:
-                    with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                        docs.append((p, f.read()))
-                except Exception:
-                    continue
-    return docs
+                paths.append(os.path.join(dirpath, fn))
+    return sorted(paths)
 
 
-def _chunk_text(text: str, chunk_size: int = 800, overlap: int = 120) -> List[str]:
+def _chunk_text(text: str, chunk_size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[str]:
     words = text.split()
     chunks: List[str] = []
     i = 0
@@ -34,48 +43,189 @@ def _chunk_text(text: str, chunk_size: int = 800, overlap: int = 120) -> List[st
     return chunks
 
 
-def _simple_embed(text: str) -> dict:
-    # Extremely simple bag-of-words TF vector (lowercased tokens, no idf) for demo purposes
-    vec: dict = {}
-    for tok in text.lower().split():
-        if tok.isalpha() or any(c.isalnum() for c in tok):
-            vec[tok] = vec.get(tok, 0) + 1.0
-    return vec
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
 
 
-def _cosine(a: dict, b: dict) -> float:
-    dot = 0.0
-    for k, v in a.items():
-        if k in b:
-            dot += v * b[k]
-    na = math.sqrt(sum(v*v for v in a.values()))
-    nb = math.sqrt(sum(v*v for v in b.values()))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
+class SimpleRetriever:
+    """
+    In-memory BM25 index over the .md/.txt files under `knowledge_root`.
 
+    Postings map term -> {chunk id: term frequency}. Each chunk's length
+    normalization is precomputed and refreshed only when the corpus changes.
+    Files are re-read only when their mtime or size changes (checked at most
+    every `refresh_interval` seconds). The index is persisted as JSON to
+    `index_path`, so startup only re-chunks files changed since the last save.
+    Needs no database or API, so it works as an offline retriever.
+    """
 
-class SimpleRetriever:
-    def __init__(self, knowledge_root: str = "knowledge") -> None:
+    def __init__(
+        self,
+        knowledge_root: str = "knowledge",
+        index_path: Optional[str] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        refresh_interval: float = 5.0,
+    ) -> None:
         self.knowledge_root = knowledge_root
-        self._index: List[Tuple[str, str, dict]] = []  # (path, chunk, vector)
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._reset()
+        if index_path:
+            self._load()
+
+    def _reset(self) -> None:
+        self._chunks: Dict[int, Tuple[str, str, int]] = {}  # id -> (path, chunk, length)
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._files: Dict[str, Tuple[float, int, List[int]]] = {}  # path -> (mtime, size, chunk ids)
+        self._next_id = 0
+        self._total_len = 0
+        self._norms: Dict[int, float] = {}
+        self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+    def _add_chunks(self, path: str, chunks: List[str], mtime: float, size: int) -> None:
+        ids: List[int] = []
+        for chunk in chunks:
+            cid = self._next_id
+            self._next_id += 1
+            tokens = _tokenize(chunk)
+            tf: Dict[str, int] = {}
+            for tok in tokens:
+                tf[tok] = tf.get(tok, 0) + 1
+            for tok, n in tf.items():
+                self._postings.setdefault(tok, {})[cid] = n
+            self._chunks[cid] = (path, chunk, len(tokens))
+            self._total_len += len(tokens)
+            ids.append(cid)
+        self._files[path] = (mtime, size, ids)
+        self._dirty = True
+
+    def _remove_file(self, path: str) -> None:
+        _, _, ids = self._files.pop(path)
+        for cid in ids:
+            _, chunk, length = self._chunks.pop(cid)
+            self._total_len -= length
+            for tok in set(_tokenize(chunk)):
+                postings = self._postings.get(tok)
+                if postings is not None:
+                    postings.pop(cid, None)
+                    if not postings:
+                        del self._postings[tok]
+        self._dirty = True
+
+    def refresh(self) -> bool:
+        """Re-index files added, changed or removed since the last check. Returns True if anything changed."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            seen = set()
+            changed = False
+            for path in _list_text_files(self.knowledge_root):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                known = self._files.get(path)
+                if known is not None and known[0] == st.st_mtime and known[1] == st.st_size:
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                        text = f.read()
+                except Exception:
+                    continue
+                if known is not None:
+                    self._remove_file(path)
+                self._add_chunks(path, _chunk_text(text), st.st_mtime, st.st_size)
+                changed = True
+            for path in [p for p in self._files if p not in seen]:
+                self._remove_file(path)
+                changed = True
+            if changed and self.index_path:
+                self._save()
+            return changed
 
     def rebuild(self) -> None:
-        self._index.clear()
-        for path, text in _read_text_files(self.knowledge_root):
-            for chunk in _chunk_text(text):
-                self._index.append((path, chunk, _simple_embed(chunk)))
+        with self._lock:
+            self._reset()
+        self.refresh()
 
-    def search(self, query: str, k: int = 6) -> List[Tuple[str, str, float]]:
-        if not self._index:
-            self.rebuild()
-        qv = _simple_embed(query)
-        scored: List[Tuple[str, str, float]] = []
-        for path, chunk, vec in self._index:
-            s = _cosine(qv, vec)
-            if s > 0:
-                scored.append((path, chunk, s))
-        scored.sort(key=lambda x: x[2], reverse=True)
-        return scored[:k]
+    def _ensure_norms(self) -> None:
+        # Caller holds the lock. BM25 length term k1 * (1 - b + b * dl / avgdl), per chunk
+        if not self._dirty:
+            return
+        n = len(self._chunks)
+        avgdl = (self._total_len / n) if n else 0.0
+        self._norms = {
+            cid: self.k1 * (1 - self.b + self.b * (length / avgdl if avgdl else 0.0))
+            for cid, (_, _, length) in self._chunks.items()
+        }
+        self._dirty = False
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _save(self) -> None:
+        # Caller holds the lock. Postings are rebuilt from chunks on load.
+        data = {
+            "version": INDEX_VERSION,
+            "root": os.path.abspath(self.knowledge_root),
+            "chunking": [CHUNK_WORDS, CHUNK_OVERLAP],
+            "files": {
+                p: {"mtime": m, "size": s, "chunks": [self._chunks[c][1] for c in ids]}
+                for p, (m, s, ids) in self._files.items()
+            },
+        }
+        tmp = self.index_path + ".tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.index_path)
 
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (
+            data.get("version") != INDEX_VERSION
+            or data.get("root") != os.path.abspath(self.knowledge_root)
+            or data.get("chunking") != [CHUNK_WORDS, CHUNK_OVERLAP]
+        ):
+            return
+        with self._lock:
+            # Stored chunks are re-tokenized, not re-read and re-chunked
+            for path, entry in data.get("files", {}).items():
+                self._add_chunks(path, entry["chunks"], entry["mtime"], entry["size"])
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+    def search(self, query: str, k: int = 6) -> List[Tuple[str, str, float]]:
+        if time.monotonic() - self._checked_at > self.refresh_interval:
+            self.refresh()
+        with self._lock:
+            self._ensure_norms()
+            n = len(self._chunks)
+            scores: Dict[int, float] = {}
+            for tok in set(_tokenize(query)):
+                postings = self._postings.get(tok)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for cid, tf in postings.items():
+                    scores[cid] = scores.get(cid, 0.0) + idf * tf * (self.k1 + 1) / (tf + self._norms[cid])
+            top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+            return [(self._chunks[cid][0], self._chunks[cid][1], s) for cid, s in top]
 
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"files": len(self._files), "chunks": len(self._chunks), "terms": len(self._postings)}
@@ -0,0 +1,78 @@
+"""
+schema_context.py
+SAT-YUG Assistant : Static schema context
+-----------------------------------------
+The assistant's schema is eight small tables, so the spec prompt can carry
+all of it: no embedding call or vector search is needed to "retrieve" it.
+Compact per-role context is precomputed once from the SQLAlchemy models
+(column types, primary keys, foreign keys as join hints), restricted to
+the columns the spec validator accepts (`SCHEMA`) and to what the role
+is expected to ask about. Hiding tables from a role only shapes the prompt;
+it is not access control.
+"""
+
+from typing import Dict, List, Mapping, Optional
+
+import models
+
+# Tables / table.columns left out of a role's context; unknown roles get the student view
+ROLE_HIDDEN: Dict[str, set] = {
+    "admin": set(),
+    "faculty": {"optimization_results"},
+    "student": {"disruptions", "optimization_results", "faculty.workload_cap", "faculty.current_workload"},
+}
+
+_TYPE_NAMES = {"INTEGER": "int", "VARCHAR": "text", "BOOLEAN": "bool", "DATETIME": "datetime", "FLOAT": "float"}
+
+
+def _type_name(column) -> str:
+    try:
+        name = str(column.type).split("(")[0].upper()
+    except Exception:
+        return "text"
+    return _TYPE_NAMES.get(name, name.lower())
+
+
+def build_schema_context(
+    schema: Mapping[str, List[str]],
+    aliases: Mapping[str, str],
+    role: str = "admin",
+) -> List[str]:
+    """One line per visible table (foreign keys shown as `-> table.col` join hints), then aliases."""
+    hidden = ROLE_HIDDEN.get(role, ROLE_HIDDEN["student"])
+    tables = models.Base.metadata.tables
+    lines: List[str] = []
+    for t, allowed in schema.items():
+        if t in hidden or t not in tables:
+            continue
+        cols = []
+        for c in allowed:
+            if f"{t}.{c}" in hidden or c not in tables[t].c:
+                continue
+            col = tables[t].c[c]
+            desc = f"{c} {_type_name(col)}"
+            if col.primary_key:
+                desc += " pk"
+            for fk in col.foreign_keys:
+                target = fk.target_fullname
+                if target.split(".")[0] not in hidden:
+                    desc += f" -> {target}"
+            cols.append(desc)
+        lines.append(f"{t}({', '.join(cols)})")
+    visible_aliases = [
+        f"{k} = {v}" for k, v in aliases.items()
+        if v.split(".")[0] not in hidden and v not in hidden
+    ]
+    if visible_aliases:
+        lines.append("aliases: " + ", ".join(visible_aliases))
+    return lines
+
+
+class StaticSchemaContext:
+    """Per-role schema context built once (at startup) and served from memory."""
+
+    def __init__(self, schema: Mapping[str, List[str]], aliases: Mapping[str, str]) -> None:
+        self._by_role = {role: build_schema_context(schema, aliases, role) for role in ROLE_HIDDEN}
+
+    def for_role(self, role: Optional[str]) -> List[str]:
+        return self._by_role.get((role or "").lower(), self._by_role["student"])
@@ -0,0 +1,273 @@
+"""
+section_planner.py
+SAT-YUG : Tier 1 – Section Planner
+-----------------------------------
+Turns forecast course demand into concrete section proposals
+(classroom, timeslot, seats) using the real room inventory.
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+# Optional: OR-Tools CP-SAT for the exact packing
+try:
+    from ortools.sat.python import cp_model
+except Exception:
+    cp_model = None  # type: ignore
+
+DEFAULT_MAX_SEATS = 60
+DAY_ORDER = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+# ---------------------------------------------------------------------
+# Inventory: rooms, timeslots and what is already booked
+# ---------------------------------------------------------------------
+def load_planning_inventory(db: Session, respect_existing: bool = True) -> Dict[str, Any]:
+    """
+    Load classrooms, timeslots, the (classroom, timeslot) pairs already taken
+    by existing courses and the per-code seat cap used to size sections.
+    """
+    rooms = [
+        {
+            "id": r.id,
+            "room_number": r.room_number,
+            "building": r.building,
+            "capacity": int(r.capacity or 0),
+        }
+        for r in db.query(models.Classroom).all()
+    ]
+    timeslots = [
+        {"id": t.id, "day": t.day, "start_time": t.start_time, "end_time": t.end_time}
+        for t in db.query(models.TimeSlot).all()
+    ]
+
+    occupied: Set[Tuple[int, int]] = set()
+    max_seats: Dict[str, int] = {}
+    for c in db.query(models.Course).all():
+        if respect_existing and c.classroom_id is not None and c.timeslot_id is not None:
+            occupied.add((c.classroom_id, c.timeslot_id))
+        seats = int(c.max_seats or DEFAULT_MAX_SEATS)
+        max_seats[c.code] = max(max_seats.get(c.code, 0), seats)
+
+    return {"rooms": rooms, "timeslots": timeslots, "occupied": occupied, "max_seats": max_seats}
+
+
+def split_demand(demand: int, max_seats: int) -> List[int]:
+    """
+    Split a course's demand into the fewest sections that respect max_seats,
+    balancing seats across sections (e.g. 130 @ 60 -> [44, 43, 43]).
+    """
+    demand = int(demand)
+    max_seats = max(1, int(max_seats or DEFAULT_MAX_SEATS))
+    if demand <= 0:
+        return []
+    n = math.ceil(demand / max_seats)
+    base, extra = divmod(demand, n)
+    return [base + 1 if i < extra else base for i in range(n)]
+
+
+def _free_bins(inventory: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """All unoccupied (room, timeslot) pairs with a usable capacity."""
+    def slot_key(t):
+        day = DAY_ORDER.index(t["day"]) if t["day"] in DAY_ORDER else len(DAY_ORDER)
+        return (day, t["start_time"], t["id"])
+
+    timeslots = sorted(inventory["timeslots"], key=slot_key)
+    bins = []
+    for room in inventory["rooms"]:
+        if room["capacity"] <= 0:
+            continue
+        for ts in timeslots:
+            if (room["id"], ts["id"]) in inventory["occupied"]:
+                continue
+            bins.append({"room": room, "timeslot": ts})
+    return bins
+
+
+def _proposal(course_code: str, seats: int, b: Dict[str, Any]) -> Dict[str, Any]:
+    room, ts = b["room"], b["timeslot"]
+    return {
+        "course_code": course_code,
+        "classroom_id": room["id"],
+        "room_number": room["room_number"],
+        "building": room["building"],
+        "capacity": room["capacity"],
+        "timeslot_id": ts["id"],
+        "day": ts["day"],
+        "start_time": ts["start_time"],
+        "end_time": ts["end_time"],
+        "seats": seats,
+    }
+
+
+def _finalize(sections: List[Dict[str, Any]], unplaced: List[Dict[str, Any]], solver: str) -> Dict[str, Any]:
+    sections.sort(key=lambda s: (s["course_code"], -s["seats"], s["timeslot_id"], s["classroom_id"]))
+    numbering: Dict[str, int] = {}
+    for s in sections:
+        numbering[s["course_code"]] = numbering.get(s["course_code"], 0) + 1
+        s["section"] = numbering[s["course_code"]]
+    return {
+        "solver": solver,
+        "sections": sections,
+        "unplaced": unplaced,
+        "seats_planned": sum(s["seats"] for s in sections),
+        "seats_unplaced": sum(u["seats"] for u in unplaced),
+    }
+
+
+# ---------------------------------------------------------------------
+# First-fit decreasing heuristic
+# ---------------------------------------------------------------------
+def plan_sections_ffd(demands: Dict[str, int], inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pack sections into free (room, timeslot) bins, largest sections first.
+    Each section takes the smallest free room that holds it, preferring a
+    timeslot the course does not already use. A section larger than every
+    free room is trimmed to the largest room and its remainder re-queued.
+    """
+    # Bucket bins by capacity so the smallest fitting room is a bisect away
+    buckets: Dict[int, List[Dict[str, Any]]] = {}
+    for b in _free_bins(inventory):
+        buckets.setdefault(b["room"]["capacity"], []).append(b)
+    caps = sorted(buckets)
+
+    heap: List[Tuple[int, int, str]] = []
+    seq = 0
+    for code, demand in demands.items():
+        for seats in split_demand(demand, inventory["max_seats"].get(code, DEFAULT_MAX_SEATS)):
+            heapq.heappush(heap, (-seats, seq, code))
+            seq += 1
+
+    sections: List[Dict[str, Any]] = []
+    unplaced: List[Dict[str, Any]] = []
+    course_slots: Dict[str, Set[int]] = {}
+
+    def take(cap: int, used: Set[int]) -> Dict[str, Any]:
+        bucket = buckets[cap]
+        for i, b in enumerate(bucket):
+            if b["timeslot"]["id"] not in used:
+                return bucket.pop(i)
+        return bucket.pop(0)
+
+    while heap:
+        neg_seats, _, code = heapq.heappop(heap)
+        seats = -neg_seats
+        used = course_slots.setdefault(code, set())
+
+        cap = next((c for c in caps[bisect_left(caps, seats):] if buckets[c]), None)
+        if cap is None:
+            # Nothing big enough: fill the largest free room and re-queue the rest
+            cap = next((c for c in reversed(caps) if buckets[c]), None)
+            if cap is None:
+                unplaced.append({"course_code": code, "seats": seats})
+                continue
+            heapq.heappush(heap, (-(seats - cap), seq, code))
+            seq += 1
+            seats = cap
+
+        b = take(cap, used)
+        used.add(b["timeslot"]["id"])
+        sections.append(_proposal(code, seats, b))
+
+    return _finalize(sections, unplaced, "ffd")
+
+
+# ---------------------------------------------------------------------
+# Exact packing (CP-SAT), warm-started from the heuristic
+# ---------------------------------------------------------------------
+def plan_sections_exact(
+    demands: Dict[str, int],
+    inventory: Dict[str, Any],
+    time_limit_s: float = 10.0,
+) -> Dict[str, Any]:
+    """
+    Minimise unplaced seats first and wasted room capacity second.
+    Falls back to the heuristic plan when OR-Tools is not installed or the
+    solver finds nothing within the time limit.
+    """
+    heuristic = plan_sections_ffd(demands, inventory)
+    if cp_model is None:
+        heuristic["solver"] = "ffd (ortools not installed)"
+        return heuristic
+
+    bins = _free_bins(inventory)
+    items: List[Tuple[str, int]] = [
+        (code, seats)
+        for code, demand in demands.items()
+        for seats in split_demand(demand, inventory["max_seats"].get(code, DEFAULT_MAX_SEATS))
+    ]
+
+    model = cp_model.CpModel()
+    x: Dict[Tuple[int, int], Any] = {}
+    by_item: Dict[int, List[Any]] = {}
+    by_bin: Dict[int, List[Any]] = {}
+    for i, (_, seats) in enumerate(items):
+        for j, b in enumerate(bins):
+            if b["room"]["capacity"] >= seats:
+                v = model.NewBoolVar(f"x_{i}_{j}")
+                x[i, j] = v
+                by_item.setdefault(i, []).append(v)
+                by_bin.setdefault(j, []).append(v)
+
+    for vs in by_item.values():
+        model.AddAtMostOne(vs)
+    for vs in by_bin.values():
+        model.AddAtMostOne(vs)
+
+    unplaced_penalty = 1 + max((b["room"]["capacity"] for b in bins), default=0)
+    placed_seats = sum(items[i][1] * v for (i, _), v in x.items())
+    waste = sum((bins[j]["room"]["capacity"] - items[i][1]) * v for (i, j), v in x.items())
+    total_seats = sum(seats for _, seats in items)
+    model.Minimize(unplaced_penalty * (total_seats - placed_seats) + waste)
+
+    # Warm start: map heuristic sections onto (item, bin) pairs where they line up
+    bin_index = {(b["room"]["id"], b["timeslot"]["id"]): j for j, b in enumerate(bins)}
+    free_items = {}
+    for i, (code, seats) in enumerate(items):
+        free_items.setdefault((code, seats), []).append(i)
+    for s in heuristic["sections"]:
+        cands = free_items.get((s["course_code"], s["seats"]))
+        j = bin_index.get((s["classroom_id"], s["timeslot_id"]))
+        if cands and j is not None and (cands[0], j) in x:
+            model.AddHint(x[cands.pop(0), j], 1)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit_s
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        heuristic["solver"] = "ffd (exact solver found no solution)"
+        return heuristic
+
+    sections: List[Dict[str, Any]] = []
+    placed: Set[int] = set()
+    for (i, j), v in x.items():
+        if solver.Value(v):
+            placed.add(i)
+            sections.append(_proposal(items[i][0], items[i][1], bins[j]))
+    unplaced = [{"course_code": code, "seats": seats} for i, (code, seats) in enumerate(items) if i not in placed]
+    return _finalize(sections, unplaced, "cp-sat" if status == cp_model.OPTIMAL else "cp-sat (time limit)")
+
+
+def plan_sections(
+    db: Session,
+    demands: Dict[str, int],
+    exact: bool = False,
+    respect_existing: bool = True,
+    time_limit_s: float = 10.0,
+    inventory: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Plan sections for forecast demand ({course_code: seats}) against the
+    classrooms and timeslots in the database.
+    """
+    if inventory is None:
+        inventory = load_planning_inventory(db, respect_existing=respect_existing)
+    if exact:
+        return plan_sections_exact(demands, inventory, time_limit_s=time_limit_s)
+    return plan_sections_ffd(demands, inventory)
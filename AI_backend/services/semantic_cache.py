@@ -0,0 +1,242 @@
+"""
+semantic_cache.py
+SAT-YUG Assistant : Semantic answer cache
+-----------------------------------------
+Embeds incoming questions and looks for the nearest previously answered
+question in the same (role, user id) scope. Above the similarity
+threshold its validated spec is reused (skipping retrieval and the spec
+LLM call); if re-running that spec returns the same rows, the cached
+answer is reused too (skipping the summary LLM call).
+
+Embeddings barely separate "4 credits in semester 5" from "3 credits in
+semester 6", or "taught by Rao" from "taught by Iyer", so similarity alone
+would replay the other question's filter values. A match is only reused
+when both questions have the same literals (numbers and codes, day names,
+quoted strings, negations) and the same content words: everything except
+stopwords and schema vocabulary (table and column names), which paraphrases
+are free to vary.
+
+The index is in-process: one L2-normalized float32 matrix per scope,
+searched with a single matrix-vector product. With the size bound below
+an exhaustive scan is sub-millisecond and exact, so no approximate index
+structure is needed. Eviction is LRU across all scopes.
+"""
+
+import copy
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+import models
+from services.embeddings import embed_texts
+
+
+_LITERAL_RE = re.compile(
+    r'"([^"]+)"|\'([^\']+)\'|\b(\w*\d\w*)\b|\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*\b'
+    r"|\b(not|no|without|except|excluding|non)\b|(n't)\b",
+    re.I,
+)
+
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Words a paraphrase may add, drop or swap without changing the query
+_STOPWORDS = frozenset("""
+    a an the and or of in on at to for from by with as is are was were be been being am do does did
+    has have had i me my mine we our us you your it its this that these those there here which what
+    who whom whose when where why how many much any all some each every one ones please can could
+    would will shall should may might just only also than then so if about into per
+    show list give find get tell display see need want know look fetch return
+    number count total amount available offered exist existing currently current
+""".split())
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def _schema_vocabulary() -> frozenset:
+    words = set()
+    for name, table in models.Base.metadata.tables.items():
+        for ident in [name, *table.c.keys()]:
+            words.update(_stem(w) for w in ident.lower().split("_") if w)
+    return frozenset(words)
+
+
+_SCHEMA_WORDS = _schema_vocabulary()
+
+
+def question_literals(question: str) -> Tuple[str, ...]:
+    """
+    Values a reused spec would bind (sorted): numbers/codes, days, quoted
+    strings and negations, plus content words that are neither stopwords
+    nor schema vocabulary (names, subjects, departments ...).
+    """
+    found = []
+    for m in _LITERAL_RE.finditer(question):
+        value = next(g for g in m.groups() if g).lower()
+        if m.group(4):
+            value = value[:3]
+        elif m.group(6):
+            value = "not"
+        found.append(value)
+    words = {_stem(w) for w in _WORD_RE.findall(_LITERAL_RE.sub(" ", question.lower()))}
+    found += [w for w in words if w not in _STOPWORDS and w not in _SCHEMA_WORDS]
+    return tuple(sorted(found))
+
+
+def rows_digest(rows: List[Dict[str, Any]]) -> str:
+    """Stable digest of a result set, used to decide whether an answer is still valid."""
+    blob = json.dumps(rows, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _Scope:
+    def __init__(self, dim: int) -> None:
+        self.ids: List[int] = []
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_size: int = 2000,
+        embed_fn: Callable[[List[str]], List[List[float]]] = embed_texts,
+    ) -> None:
+        self.threshold = threshold
+        self.max_size = max_size
+        self.embed_fn = embed_fn
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._scopes: Dict[Hashable, _Scope] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.literal_mismatches = 0
+
+    def embed(self, question: str) -> Optional[np.ndarray]:
+        """Normalized query vector, or None if the embedding call fails."""
+        try:
+            vec = np.asarray(self.embed_fn([question])[0], dtype=np.float32)
+        except Exception:
+            self.errors += 1
+            return None
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    def lookup(
+        self, scope: Hashable, vec: Optional[np.ndarray], question: str
+    ) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Most similar entry in `scope` with cosine similarity >= threshold and
+        the same literals as `question` (a copy), and its similarity.
+        """
+        if vec is None:
+            return None, 0.0
+        literals = question_literals(question)
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None or not sc.ids or sc.matrix.shape[1] != vec.shape[0]:
+                self.misses += 1
+                return None, 0.0
+            sims = sc.matrix @ vec
+            top = float(np.max(sims))
+            best = None
+            for pos in np.argsort(-sims):
+                if sims[pos] < self.threshold:
+                    break
+                if self._entries[sc.ids[int(pos)]]["literals"] == literals:
+                    best = int(pos)
+                    break
+            if best is None:
+                self.misses += 1
+                if top >= self.threshold:
+                    self.literal_mismatches += 1
+                return None, top
+            score = float(sims[best])
+            entry_id = sc.ids[best]
+            self._entries.move_to_end(entry_id)
+            entry = self._entries[entry_id]
+            entry["hits"] += 1
+            self.hits += 1
+            found = copy.deepcopy(entry)
+            found["id"] = entry_id
+            return found, score
+
+    def store(
+        self,
+        scope: Hashable,
+        vec: Optional[np.ndarray],
+        question: str,
+        spec: Dict[str, Any],
+        answer: Optional[str],
+        digest: Optional[str],
+    ) -> None:
+        if vec is None or self.max_size <= 0:
+            return
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None or sc.matrix.shape[1] != vec.shape[0]:
+                sc = self._scopes[scope] = _Scope(vec.shape[0])
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "scope": scope,
+                "question": question,
+                "literals": question_literals(question),
+                "spec": copy.deepcopy(spec),
+                "answer": answer,
+                "rows_digest": digest,
+                "created_at": time.time(),
+                "hits": 0,
+            }
+            sc.ids.append(entry_id)
+            sc.matrix = np.vstack([sc.matrix, vec[None, :]])
+            while len(self._entries) > self.max_size:
+                self._evict_oldest()
+
+    def update_answer(self, entry_id: int, answer: str, digest: str) -> None:
+        """Refresh a matched entry's answer after its rows changed."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None:
+                entry["answer"] = answer
+                entry["rows_digest"] = digest
+
+    def _evict_oldest(self) -> None:
+        # Caller holds the lock
+        entry_id, entry = self._entries.popitem(last=False)
+        sc = self._scopes[entry["scope"]]
+        pos = sc.ids.index(entry_id)
+        del sc.ids[pos]
+        sc.matrix = np.delete(sc.matrix, pos, axis=0)
+        if not sc.ids:
+            del self._scopes[entry["scope"]]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "embed_errors": self.errors,
+                "literal_mismatches": self.literal_mismatches,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,188 @@
+"""
+snapshot.py
+SAT-YUG : Tier 1 – Columnar Snapshots
+-------------------------------------
+Exports enrollment history and the catalog tables to Parquet so analysts
+and the Tier 1 pipeline can re-run against a frozen, memory-mapped copy
+instead of re-querying the live database.
+
+Layout:
+    <root>/manifest.json
+    <root>/enrollments/year=<yyyy>/semester=<n>/*.parquet
+    <root>/courses.parquet, faculty.parquet, classrooms.parquet, timeslots.parquet
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+SNAPSHOT_DIR = os.getenv("TIER1_SNAPSHOT_DIR", "snapshots/enrollment")
+
+# Table -> (SELECT, compact dtypes). Low-cardinality strings become dictionary-encoded categories.
+CATALOG_TABLES: Dict[str, Any] = {
+    "courses": (
+        "SELECT id, code, name, credits, semester, mandatory, faculty_id, timeslot_id, classroom_id, max_seats FROM courses",
+        {"id": "int32", "code": "category", "name": "category", "credits": "Int8", "semester": "Int8",
+         "faculty_id": "Int32", "timeslot_id": "Int32", "classroom_id": "Int32", "max_seats": "Int16"},
+    ),
+    "faculty": (
+        "SELECT id, name, email, expertise, workload_cap, current_workload, available FROM faculty",
+        {"id": "int32", "expertise": "category", "workload_cap": "Int16", "current_workload": "Int16"},
+    ),
+    "classrooms": (
+        "SELECT id, room_number, capacity, building, resources FROM classrooms",
+        {"id": "int32", "capacity": "Int16", "building": "category", "resources": "category"},
+    ),
+    "timeslots": (
+        "SELECT id, day, start_time, end_time FROM timeslots",
+        {"id": "int32", "day": "category", "start_time": "category", "end_time": "category"},
+    ),
+}
+
+# Rows without a timestamp have no year partition; they are skipped, as in the
+# enrollment_counts aggregate (services/enrollment_counts.py)
+ENROLLMENTS_SQL = """
+    SELECT e.id, e.student_id, e.course_id, e.timestamp, c.semester
+    FROM enrollments e
+    JOIN courses c ON e.course_id = c.id
+    WHERE e.timestamp IS NOT NULL
+"""
+
+
+def _compact(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    for col, dtype in dtypes.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+# ---------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------
+def export_snapshot(db: Session, out_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write a complete snapshot to `out_dir`. The snapshot is built in a
+    temporary sibling directory, so readers never see a half-written
+    export. The swap is two renames: the previous snapshot is moved to
+    `<out_dir>.old`, the new one moved in, then the old one deleted. A
+    crash between the renames leaves the previous snapshot in `.old`;
+    the next export restores it before starting.
+    """
+    out_dir = out_dir or SNAPSHOT_DIR
+    base = out_dir.rstrip("/\\")
+    tmp_dir, old_dir = base + ".tmp", base + ".old"
+    if os.path.isdir(old_dir):
+        if os.path.isdir(out_dir):
+            shutil.rmtree(old_dir)
+        else:
+            os.replace(old_dir, out_dir)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest: Dict[str, Any] = {"exported_at": datetime.utcnow().isoformat(), "tables": {}}
+
+    enr = pd.read_sql(text(ENROLLMENTS_SQL), db.bind)
+    enr["timestamp"] = pd.to_datetime(enr["timestamp"]).astype("datetime64[ms]")
+    enr["year"] = enr["timestamp"].dt.year.astype("int16")
+    enr["semester"] = enr["semester"].fillna(0).astype("int8")
+    enr = _compact(enr, {"id": "int32", "student_id": "Int32", "course_id": "int32"})
+    if not enr.empty:
+        pq.write_to_dataset(
+            pa.Table.from_pandas(enr, preserve_index=False),
+            root_path=os.path.join(tmp_dir, "enrollments"),
+            partition_cols=["year", "semester"],
+            compression="zstd",
+        )
+    manifest["tables"]["enrollments"] = {
+        "rows": int(len(enr)),
+        "partitions": sorted({f"year={y}/semester={s}" for y, s in zip(enr["year"], enr["semester"])}),
+    }
+
+    for name, (sql, dtypes) in CATALOG_TABLES.items():
+        df = _compact(pd.read_sql(text(sql), db.bind), dtypes)
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            os.path.join(tmp_dir, f"{name}.parquet"),
+            compression="zstd",
+        )
+        manifest["tables"][name] = {"rows": int(len(df))}
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    had_previous = os.path.isdir(out_dir)
+    if had_previous:
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if had_previous:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    manifest["path"] = out_dir
+    return manifest
+
+
+# ---------------------------------------------------------------------
+# Load (memory-mapped)
+# ---------------------------------------------------------------------
+def load_snapshot_table(
+    root: str,
+    name: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Any]] = None,
+) -> pd.DataFrame:
+    """
+    Read one snapshot table through a memory map. For `enrollments`,
+    `filters` (pyarrow DNF, e.g. [("year", ">=", 2022)]) prune whole
+    year/semester partitions before any data is read.
+    """
+    if name == "enrollments":
+        path = os.path.join(root, "enrollments")
+        if not os.path.isdir(path):
+            return pd.DataFrame(columns=columns or ["id", "student_id", "course_id", "timestamp", "year", "semester"])
+        table = pq.read_table(path, columns=columns, filters=filters, memory_map=True, partitioning="hive")
+    else:
+        table = pq.read_table(os.path.join(root, f"{name}.parquet"), columns=columns, filters=filters, memory_map=True)
+    return table.to_pandas()
+
+
+def load_snapshot_manifest(root: str) -> Dict[str, Any]:
+    with open(os.path.join(root, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_historical_data_from_snapshot(root: str) -> pd.DataFrame:
+    """
+    Snapshot equivalent of tier1 `load_historical_data`: enrollments joined
+    with course and faculty info, with year/month derived from the timestamp.
+    """
+    enr = load_snapshot_table(root, "enrollments", columns=["course_id", "timestamp"])
+    courses = load_snapshot_table(root, "courses", columns=["id", "code", "name", "semester", "credits", "faculty_id"])
+    faculty = load_snapshot_table(
+        root, "faculty", columns=["id", "name", "expertise", "workload_cap", "current_workload"]
+    )
+
+    courses = courses.rename(columns={"id": "course_id", "code": "course_code", "name": "course_name"})
+    faculty = faculty.rename(columns={"id": "faculty_id", "name": "faculty_name"})
+    courses["faculty_id"] = courses["faculty_id"].astype("Int32")
+    faculty["faculty_id"] = faculty["faculty_id"].astype("Int32")
+
+    df = enr.merge(courses, on="course_id").merge(faculty, on="faculty_id")
+    df = df[[
+        "course_code", "course_name", "semester", "credits",
+        "faculty_id", "faculty_name", "expertise", "workload_cap", "current_workload",
+        "timestamp",
+    ]].copy()
+    # Categories would make downstream groupbys emit every unobserved combination
+    for col in ("course_code", "course_name", "expertise"):
+        df[col] = df[col].astype(object)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df["year"] = df["timestamp"].dt.year
+    df["month"] = df["timestamp"].dt.month
+    return df
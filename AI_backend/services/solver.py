@@ -2,7 +2,8 @@
 from typing import List, Dict, Any
 from sqlalchemy.orm import Session
 from models import Course, TimeSlot, Enrollment
-from datetime import datetime, time
+from services.enrollment_counts import course_enrollment_count, record_enrollment_added, record_enrollment_added_supabase
+from datetime import datetime, time, timezone
 import re
 
 
@@ -65,6 +66,18 @@ def timeslot_overlaps(a_day, a_start, a_end, b_day, b_start, b_end) -> bool:
     b_e = parse_time_str(b_end)
     return max(a_s, b_s) < min(a_e, b_e)  # strict overlap
 
+def _enrolled_count(db, course_id: int) -> int:
+    """Seats taken in a course, read from the maintained enrollment_counts aggregate."""
+    if _is_supabase(db):
+        resp = db.table("enrollment_counts").select("enrollment_count").eq("course_id", course_id).execute()
+        rows = _resp_data(resp) or []
+        if rows:
+            return sum(int(r.get("enrollment_count") or 0) for r in rows)
+        # No aggregate row yet (new course, or before the startup backfill): count rows
+        resp = db.table("enrollments").select("id", count="exact").eq("course_id", course_id).execute()
+        return int(getattr(resp, "count", None) or len(_resp_data(resp) or []))
+    return course_enrollment_count(db, course_id)
+
 def _fetch_course_timeslot(db, course: Course):
     # Support both SQLAlchemy Session and Supabase client
     if _is_supabase(db):
@@ -149,12 +162,7 @@ def validate_schedule(db, student_id: int, selected_course_ids: List[int]) -> Di
     for c in courses:
         if _is_supabase(db):
             c_id = c["id"]
-            # enrolled count
-            resp = db.table("enrollments").select("count").filter("course_id", "eq", c_id).execute() if False else None
-            # PostgREST doesn't provide a direct count in the same simple call; use count via RPC or fetch rows and len()
-            resp = db.table("enrollments").select("*").eq("course_id", c_id).execute()
-            enrolled_rows = _resp_data(resp) or []
-            enrolled_count = len(enrolled_rows)
+            enrolled_count = _enrolled_count(db, c_id)
             max_seats = int(c.get("max_seats", 0) or 0)
             if enrolled_count >= max_seats:
                 seat_conflicts.append({"course_id": c_id})
@@ -163,15 +171,13 @@ def validate_schedule(db, student_id: int, selected_course_ids: List[int]) -> Di
                 alt = _resp_data(resp) or []
                 alternatives = []
                 for a in alt:
-                    resp = db.table("enrollments").select("*").eq("course_id", a["id"]).execute()
-                    cnt = len(_resp_data(resp) or [])
+                    cnt = _enrolled_count(db, a["id"])
                     if cnt < int(a.get("max_seats", 0) or 0):
                         alternatives.append(a["id"])
                 if alternatives:
                     suggestions[c_id] = alternatives
         else:
-            # enrolled count
-            enrolled_count = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
+            enrolled_count = _enrolled_count(db, c.id)
             max_seats = int(getattr(c, "max_seats", 0) or 0)
             if enrolled_count >= max_seats:
                 seat_conflicts.append({"course_id": c.id})
@@ -182,7 +188,7 @@ def validate_schedule(db, student_id: int, selected_course_ids: List[int]) -> Di
                 ).all()
                 alternatives = []
                 for a in alt:
-                    cnt = db.query(Enrollment).filter(Enrollment.course_id == a.id).count()
+                    cnt = _enrolled_count(db, a.id)
                     if cnt < int(getattr(a, "max_seats", 0) or 0):
                         alternatives.append(a.id)
                 if alternatives:
@@ -217,12 +223,11 @@ def validate_schedule(db, student_id: int, selected_course_ids: List[int]) -> Di
                 # seats available?
                 if _is_supabase(db):
                     sec_id = sec["id"]
-                    resp = db.table("enrollments").select("*").eq("course_id", sec_id).execute()
-                    cnt = len(_resp_data(resp) or [])
+                    cnt = _enrolled_count(db, sec_id)
                     max_seats_sec = int(sec.get("max_seats", 0) or 0)
                 else:
                     sec_id = sec.id
-                    cnt = db.query(Enrollment).filter(Enrollment.course_id == sec.id).count()
+                    cnt = _enrolled_count(db, sec.id)
                     max_seats_sec = int(getattr(sec, "max_seats", 0) or 0)
 
                 if cnt >= max_seats_sec:
@@ -259,29 +264,36 @@ def enroll_student(db, student_id: int, course_id: int) -> Dict[str, Any]:
         course = (_resp_data(resp) or [None])[0]
         if not course:
             return {"success": False, "message": "Course not found"}
-        resp = db.table("enrollments").select("*").eq("course_id", course_id).execute()
-        enrolled_count = len(_resp_data(resp) or [])
+        enrolled_count = _enrolled_count(db, course_id)
         max_seats = int(course.get("max_seats", 0) or 0)
         if enrolled_count >= max_seats:
             return {"success": False, "message": "Course full"}
         # create enrollment via supabase
         try:
-            resp = db.table("enrollments").insert([{"student_id": student_id, "course_id": course_id}]).execute()
+            resp = db.table("enrollments").insert([{
+                "student_id": student_id,
+                "course_id": course_id,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            }]).execute()
             data = _resp_data(resp)
-            return {"success": True, "enrollment": data}
         except Exception as exc:
             return {"success": False, "message": str(exc)}
+        for row in data or []:
+            record_enrollment_added_supabase(db, row)
+        return {"success": True, "enrollment": data}
     else:
         course = db.query(Course).filter(Course.id == course_id).first()
         if not course:
             return {"success": False, "message": "Course not found"}
-        enrolled_count = db.query(Enrollment).filter(Enrollment.course_id == course_id).count()
+        enrolled_count = _enrolled_count(db, course_id)
         max_seats = getattr(course, "max_seats", 0)
         if enrolled_count >= (int(max_seats) if max_seats is not None else 0):
             return {"success": False, "message": "Course full"}
-        # create enrollment
+        # create enrollment and count it in the same transaction
         enrollment = Enrollment(student_id=student_id, course_id=course_id)
         db.add(enrollment)
+        db.flush()
+        record_enrollment_added(db, enrollment)
         db.commit()
         db.refresh(enrollment)
         return {"success": True, "enrollment_id": enrollment.id}
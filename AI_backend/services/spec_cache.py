@@ -0,0 +1,102 @@
+"""
+spec_cache.py
+SAT-YUG Assistant : Query-spec cache
+------------------------------------
+Caches normalized, validated query specs keyed by canonicalized question
+text so repeated questions ("show my Monday timetable") skip retrieval and
+the spec LLM call. Entries expire after a TTL, the cache is LRU-bounded,
+and everything is dropped when the schema fingerprint changes.
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def canonicalize_question(text: str) -> str:
+    """
+    Normalize a question so trivial variations share a cache key:
+    unicode/case folding, punctuation stripped (comparison and id
+    operators kept), whitespace collapsed.
+    """
+    t = unicodedata.normalize("NFKC", text or "").casefold()
+    t = re.sub(r"[^\w\s=<>!.]", " ", t)
+    t = re.sub(r"!(?!=)", " ", t)  # keep "!=" only
+    t = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", t)  # keep decimal points only
+    return " ".join(t.split())
+
+
+def schema_fingerprint(*parts: Any) -> str:
+    """Stable hash of the schema description (tables, aliases, prompt)."""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class QuerySpecCache:
+    def __init__(self, max_size: int = 512, ttl_s: float = 3600.0) -> None:
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_fingerprint(self, fingerprint: str) -> None:
+        # Caller holds the lock
+        if fingerprint != self._fingerprint:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, question: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        key = canonicalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._data.get(key)
+            if entry is None or now - entry[0] > self.ttl_s:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, question: str, fingerprint: str, spec: Dict[str, Any]) -> None:
+        key = canonicalize_question(question)
+        if not key or self.max_size <= 0:
+            return
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._data[key] = (time.monotonic(), copy.deepcopy(spec))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -9,11 +9,13 @@ before semester registration begins.
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from services.enrollment_counts import counts_source
+
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from xgboost import XGBRegressor
 import warnings
@@ -22,11 +24,17 @@ warnings.filterwarnings("ignore")
 # ---------------------------------------------------------------------
 # Utility: fetch enrollment and faculty data from DB
 # ---------------------------------------------------------------------
-def load_historical_data(db: Session) -> pd.DataFrame:
+def load_historical_data(db: Session, snapshot_dir: Optional[str] = None) -> pd.DataFrame:
     """
-    Load historical enrollments joined with course & faculty info.
+    Load per-course, per-year enrollment counts joined with course & faculty
+    info from the maintained `enrollment_counts` aggregate.
+    If `snapshot_dir` is given, read the Parquet snapshot instead of Postgres.
     """
-    sql = text("""
+    if snapshot_dir:
+        from services.snapshot import load_historical_data_from_snapshot
+        return load_historical_data_from_snapshot(snapshot_dir)
+
+    sql = text(f"""
         SELECT
             c.code AS course_code,
             c.name AS course_name,
@@ -37,14 +45,16 @@ def load_historical_data(db: Session) -> pd.DataFrame:
             f.expertise,
             f.workload_cap,
             f.current_workload,
-            e.timestamp
-        FROM enrollments e
-        JOIN courses c ON e.course_id = c.id
+            a.year,
+            a.enrollment_count AS enrollments,
+            a.last_enrolled_at AS timestamp
+        FROM {counts_source(db)} a
+        JOIN courses c ON a.course_id = c.id
         JOIN faculty f ON c.faculty_id = f.id
+        WHERE a.enrollment_count > 0
     """)
     df = pd.read_sql(sql, db.bind)
     df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df["year"] = df["timestamp"].dt.year
     df["month"] = df["timestamp"].dt.month
     return df
 
@@ -52,9 +62,14 @@ def load_historical_data(db: Session) -> pd.DataFrame:
 def aggregate_enrollment(df: pd.DataFrame) -> pd.DataFrame:
     """
     Aggregate enrollment counts per course per semester.
+    Accepts pre-counted rows (an `enrollments` column, as read from the
+    aggregate table) or one row per enrollment (as read from a snapshot).
     """
+    keys = ["course_code", "course_name", "year", "semester"]
+    if "enrollments" in df.columns:
+        return df.groupby(keys)["enrollments"].sum().reset_index()
     agg = (
-        df.groupby(["course_code", "year", "semester"])
+        df.groupby(keys)
         .size()
         .reset_index(name="enrollments")
     )
@@ -64,16 +79,10 @@ def aggregate_enrollment(df: pd.DataFrame) -> pd.DataFrame:
 # ---------------------------------------------------------------------
 # Forecasting Functions
 # ---------------------------------------------------------------------
-def forecast_course_demand(course_df: pd.DataFrame) -> int:
+def sarima_forecast(course_df: pd.DataFrame) -> float:
     """
-    Hybrid forecast using SARIMA + XGBoost for next semester demand.
+    One-step SARIMA forecast; falls back to the mean if the fit fails.
     """
-    if len(course_df) < 4:
-        # Not enough data, use mean fallback
-        return int(course_df["enrollments"].mean())
-
-    # --- SARIMA ---
-    sarima_pred = None
     try:
         sarima_model = SARIMAX(
             course_df["enrollments"],
@@ -83,11 +92,15 @@ def forecast_course_demand(course_df: pd.DataFrame) -> int:
             enforce_invertibility=False,
         )
         sarima_fit = sarima_model.fit(disp=False)
-        sarima_pred = sarima_fit.forecast(steps=1).iloc[0]
+        return sarima_fit.forecast(steps=1).iloc[0]
     except Exception:
-        sarima_pred = course_df["enrollments"].mean()
+        return course_df["enrollments"].mean()
 
-    # --- XGBoost ---
+
+def xgb_forecast(course_df: pd.DataFrame, fallback: float) -> float:
+    """
+    XGBoost regression on (year, semester) for the next semester.
+    """
     try:
         X = course_df[["year", "semester"]]
         y = course_df["enrollments"]
@@ -102,12 +115,30 @@ def forecast_course_demand(course_df: pd.DataFrame) -> int:
         model.fit(X, y)
         next_year = course_df["year"].max() + 1 if course_df["semester"].max() == 2 else course_df["year"].max()
         next_sem = 1 if course_df["semester"].max() == 2 else 2
-        pred_xgb = model.predict(np.array([[next_year, next_sem]]))[0]
+        return model.predict(np.array([[next_year, next_sem]]))[0]
     except Exception:
-        pred_xgb = sarima_pred
+        return fallback
+
+
+def forecast_course_demand(course_df: pd.DataFrame, weights: Tuple[float, float] = (0.6, 0.4)) -> int:
+    """
+    Hybrid forecast using SARIMA + XGBoost for next semester demand.
+    `weights` are the (SARIMA, XGBoost) blend; a zero weight skips that model.
+    """
+    if len(course_df) < 4:
+        # Not enough data, use mean fallback
+        return int(course_df["enrollments"].mean())
+
+    w_sarima, w_xgb = weights
+
+    # --- SARIMA ---
+    sarima_pred = sarima_forecast(course_df) if w_sarima else course_df["enrollments"].mean()
+
+    # --- XGBoost ---
+    pred_xgb = xgb_forecast(course_df, fallback=sarima_pred) if w_xgb else 0.0
 
     # Weighted hybrid average
-    hybrid = 0.6 * sarima_pred + 0.4 * pred_xgb
+    hybrid = w_sarima * sarima_pred + w_xgb * pred_xgb
     return int(max(hybrid, 10))
 
 
@@ -131,15 +162,20 @@ def compute_faculty_scores(faculty_df: pd.DataFrame) -> pd.DataFrame:
     )
     return faculty_df.sort_values("final_score", ascending=False)
 
-from models import ForecastResult
-
-def run_tier1_forecast(db: Session) -> Dict[str, Any]:
+def run_tier1_forecast(db: Session, exact_sections: bool = False, snapshot_dir: Optional[str] = None) -> Dict[str, Any]:
     """
     Tier 1  Strategic Planner
-    Forecast course demand and store results persistently.
+    Forecast course demand, plan sections into real rooms/timeslots
+    and store results persistently. With `snapshot_dir`, history is read
+    from a Parquet snapshot rather than the live enrollments table.
     """
+    # Imported here so the forecasting functions above stay usable
+    # offline (e.g. by the backtest harness) without a configured database.
+    from models import ForecastResult
+    from services.section_planner import plan_sections
+
     # Step 1: Load and aggregate
-    df = load_historical_data(db)
+    df = load_historical_data(db, snapshot_dir=snapshot_dir)
     if df.empty:
         return {"status": "error", "message": "No enrollment data found."}
 
@@ -149,14 +185,23 @@ def run_tier1_forecast(db: Session) -> Dict[str, Any]:
     forecasts = []
     for course_code, sub in enroll_agg.groupby("course_code"):
         demand = forecast_course_demand(sub)
-        recommended_sections = max(1, demand // 60)
         course_name = sub["course_name"].iloc[-1]
         forecasts.append({
             "course_code": course_code,
             "course_name": course_name,
             "predicted_enrollment": demand,
-            "recommended_sections": recommended_sections
         })
+
+    # Step 2b: Bin-pack forecast demand into free classrooms/timeslots
+    section_plan = plan_sections(
+        db,
+        {f["course_code"]: f["predicted_enrollment"] for f in forecasts},
+        exact=exact_sections,
+    )
+    for f in forecasts:
+        # Report what actually fits; demand no room/timeslot could take stays visible
+        f["recommended_sections"] = sum(1 for s in section_plan["sections"] if s["course_code"] == f["course_code"])
+        f["unplaced_seats"] = sum(u["seats"] for u in section_plan["unplaced"] if u["course_code"] == f["course_code"])
     forecast_df = pd.DataFrame(forecasts)
 
     # Step 3: Faculty balancing
@@ -202,6 +247,7 @@ def run_tier1_forecast(db: Session) -> Dict[str, Any]:
         "generated_at": datetime.utcnow().isoformat(),
         "forecast_results": forecast_df.to_dict(orient="records"),
         "faculty_recommendations": assignments,
+        "section_plan": section_plan,
         "stored_in_db": True
     }
 
@@ -2,6 +2,7 @@ from typing import Dict, List
 from sqlalchemy.orm import Session
 
 import models
+from services.enrollment_counts import course_enrollment_counts
 
 
 # Days ordering used for weekly timetable output
@@ -74,6 +75,7 @@ def get_faculty_weekly_timetable(db: Session, faculty_id: int) -> Dict[str, List
         .filter(models.Course.faculty_id == faculty_id)
         .all()
     )
+    enrolled = course_enrollment_counts(db, [c.id for c in courses])
 
     for course in courses:
         timeslot = course.timeslot
@@ -87,6 +89,8 @@ def get_faculty_weekly_timetable(db: Session, faculty_id: int) -> Dict[str, List
                 "courseName": course.name,
                 "startTime": timeslot.start_time,
                 "endTime": timeslot.end_time,
+                "enrolled": enrolled.get(course.id, 0),
+                "maxSeats": course.max_seats,
                 "classroom": None
                 if classroom is None
                 else {
@@ -0,0 +1,200 @@
+"""
+tracing.py
+SAT-YUG Assistant : Request tracing and stage metrics
+-----------------------------------------------------
+A trace is started per assistant request and carried in a contextvar, so
+it follows the request into asyncio tasks and `asyncio.to_thread`
+workers. Code wraps each stage in `span(name)`:
+
+- every span is observed into the `assistant_stage_duration_seconds`
+  histogram (labelled by stage), with or without an active trace, so
+  ingestion and other callers show up too
+- inside a trace the span is also recorded with its parent, offset and
+  duration; `trace.to_dict()` is what the `debug` response field returns
+- `finish_trace` observes the whole request into
+  `assistant_request_duration_seconds` (labelled by path: native, llm,
+  doc, error) and, for requests slower than ASSISTANT_SLOW_MS, writes a
+  sampled slow-request record (question, spec, SQL, spans) to the
+  `satyug.slow` logger and ASSISTANT_SLOW_LOG
+
+`render_metrics` produces the Prometheus text exposition format.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SLOW_MS = float(os.getenv("ASSISTANT_SLOW_MS", "3000"))
+SLOW_SAMPLE = float(os.getenv("ASSISTANT_SLOW_SAMPLE", "1.0"))
+# JSON lines; empty logs to the `satyug.slow` logger only
+SLOW_LOG_PATH = os.getenv("ASSISTANT_SLOW_LOG", "cache/slow_requests.jsonl")
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+slow_logger = logging.getLogger("satyug.slow")
+
+
+# ---------------------------------------------------------------------
+# Histograms
+# ---------------------------------------------------------------------
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values (Prometheus semantics)."""
+
+    def __init__(self, name: str, doc: str, label_names: Sequence[str], buckets: Sequence[float]) -> None:
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            counts, total = self._series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(c), t[0]) for k, (c, t) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            base = ",".join(f'{n}="{v}"' for n, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound:g}"}} {running}')
+            running += counts[-1]
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {running}')
+            lines.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {running}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "assistant_stage_duration_seconds", "Duration of assistant pipeline stages.", ["stage"], STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "assistant_request_duration_seconds", "End-to-end assistant request duration by path.", ["path"], REQUEST_BUCKETS
+)
+
+
+# ---------------------------------------------------------------------
+# Traces and spans
+# ---------------------------------------------------------------------
+class Trace:
+    def __init__(self, **attrs: Any) -> None:
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.t0 = time.perf_counter()
+        self.attrs: Dict[str, Any] = dict(attrs)
+        self.spans: List[Dict[str, Any]] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, parent: Optional[str], attrs: Dict[str, Any]) -> None:
+        entry = {
+            "name": name,
+            "parent": parent,
+            "start_ms": round((start - self.t0) * 1000, 2),
+            "duration_ms": round((end - start) * 1000, 2),
+        }
+        if attrs:
+            entry["attrs"] = attrs
+        with self._lock:
+            self.spans.append(entry)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.t0) * 1000, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {"trace_id": self.trace_id, "total_ms": self.elapsed_ms(), "spans": spans}
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("assistant_trace", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("assistant_span", default=None)
+
+
+def start_trace(**attrs: Any) -> Trace:
+    """Start a trace for the current request context."""
+    trace = Trace(**attrs)
+    _trace.set(trace)
+    _parent.set(None)
+    return trace
+
+
+def annotate(**attrs: Any) -> None:
+    """Attach request-level details (spec, SQL, route) to the current trace."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def record_span(name: str, start: float, end: float, **attrs: Any) -> None:
+    """Record a stage timed by the caller (perf_counter values), e.g. one that spans generator yields."""
+    STAGE_SECONDS.observe((name,), end - start)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, start, end, _parent.get(), attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time the enclosed block as stage `name`; the yielded dict takes extra attributes."""
+    start = time.perf_counter()
+    parent = _parent.get()
+    token = _parent.set(name)
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        _parent.reset(token)
+        STAGE_SECONDS.observe((name,), end - start)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(name, start, end, parent, attrs)
+
+
+def finish_trace(trace: Trace, path: str) -> None:
+    """Observe the request duration once and write the slow-request record if due."""
+    if trace.finished:
+        return
+    trace.finished = True
+    elapsed_ms = trace.elapsed_ms()
+    REQUEST_SECONDS.observe((path,), elapsed_ms / 1000)
+    if elapsed_ms < SLOW_MS or random.random() >= SLOW_SAMPLE:
+        return
+    record = {"ts": time.time(), "path": path, **trace.attrs, **trace.to_dict()}
+    line = json.dumps(record, default=str)
+    slow_logger.warning("slow assistant request %s (%.0f ms): %s", trace.trace_id, elapsed_ms, line)
+    if SLOW_LOG_PATH:
+        try:
+            os.makedirs(os.path.dirname(SLOW_LOG_PATH) or ".", exist_ok=True)
+            with open(SLOW_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            slow_logger.error("cannot write slow log %s: %s", SLOW_LOG_PATH, e)
+
+
+def render_metrics(extra: Optional[List[str]] = None) -> str:
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render() + list(extra or [])
+    return "\n".join(lines) + "\n"
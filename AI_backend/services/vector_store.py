@@ -0,0 +1,47 @@
+"""
+vector_store.py
+SAT-YUG Assistant : Vector store backend selection
+--------------------------------------------------
+VECTOR_BACKEND picks the store behind `ingest` / `search`:
+- pgvector (default): PgVectorRetriever on the request's DB session
+- local: one process-wide LocalVectorStore under LOCAL_VECTOR_PATH
+  (memory-mapped float32 file, local hashing embeddings), no database or
+  embedding API needed
+"""
+
+import os
+import threading
+from typing import Optional, Union
+
+from sqlalchemy.orm import Session
+
+from services.local_vector_store import LocalVectorStore
+from services.pgvector_retriever import PgVectorRetriever
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector").lower()  # pgvector | local
+LOCAL_VECTOR_PATH = os.getenv("LOCAL_VECTOR_PATH", "cache/vector_store")
+
+_local_store: Optional[LocalVectorStore] = None
+_lock = threading.Lock()
+
+
+def is_local_backend() -> bool:
+    return VECTOR_BACKEND == "local"
+
+
+def get_local_store() -> LocalVectorStore:
+    global _local_store
+    if _local_store is None:
+        with _lock:
+            if _local_store is None:
+                _local_store = LocalVectorStore(LOCAL_VECTOR_PATH)
+    return _local_store
+
+
+def get_vector_store(db: Optional[Session] = None) -> Union[PgVectorRetriever, LocalVectorStore]:
+    """The configured store; `db` is only used (and required) by the pgvector backend."""
+    if is_local_backend():
+        return get_local_store()
+    if db is None:
+        raise ValueError("pgvector backend needs a DB session")
+    return PgVectorRetriever(db)
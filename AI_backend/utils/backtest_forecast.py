@@ -0,0 +1,81 @@
+"""Backtest the Tier 1 demand forecast offline.
+
+Replays historical semesters for every course, forecasts each holdout
+period with each model variant and prints MAE/MAPE next to per-course fit
+time and total wall time. No database or API keys are needed.
+
+Run from `AI_backend/`:
+
+    python -m utils.backtest_forecast --synthetic --courses 60 --years 6
+    python -m utils.backtest_forecast --data exports/enrollment_agg.csv --workers 8
+    python -m utils.backtest_forecast --snapshot snapshots/enrollment
+    python -m utils.backtest_forecast --synthetic --variants hybrid sarima mean --json report.json
+"""
+
+import argparse
+import json
+import sys
+
+from services.forecast_backtest import (
+    VARIANTS,
+    load_aggregated_history,
+    run_backtest,
+    synthetic_enrollment_history,
+)
+from services.snapshot import load_historical_data_from_snapshot
+from services.tier1_prediction_service import aggregate_enrollment
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest Tier 1 demand forecasting variants.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", help="Aggregated history (CSV or Parquet): course_code, year, semester, enrollments")
+    source.add_argument("--snapshot", help="Parquet snapshot directory written by utils.export_snapshot")
+    source.add_argument("--synthetic", action="store_true", help="Generate a synthetic history instead")
+    parser.add_argument("--courses", type=int, default=40, help="Synthetic: number of courses")
+    parser.add_argument("--years", type=int, default=6, help="Synthetic: years of history (2 semesters each)")
+    parser.add_argument("--seed", type=int, default=7, help="Synthetic: RNG seed")
+    parser.add_argument("--holdouts", type=int, default=2, help="Semesters replayed per course")
+    parser.add_argument("--min-train", type=int, default=4, help="Minimum semesters before the first holdout")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--variants", nargs="+", default=None, choices=sorted(VARIANTS))
+    parser.add_argument("--json", help="Also write the full report (with per-forecast details) to this file")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        agg = synthetic_enrollment_history(n_courses=args.courses, years=args.years, seed=args.seed)
+    elif args.snapshot:
+        agg = aggregate_enrollment(load_historical_data_from_snapshot(args.snapshot))
+    else:
+        agg = load_aggregated_history(args.data)
+
+    report = run_backtest(
+        agg,
+        variants=args.variants,
+        holdouts=args.holdouts,
+        min_train=args.min_train,
+        workers=args.workers,
+    )
+
+    header = f"{'variant':<16}{'n':>6}{'MAE':>10}{'MAPE %':>9}{'fit/course ms':>15}{'p95 ms':>10}{'wall s':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in report["variants"].items():
+        if not r.get("forecasts"):
+            print(f"{name:<16}{0:>6}  (no holdout periods)")
+            continue
+        mape = "-" if r["mape"] is None else f"{r['mape']:.2f}"
+        print(
+            f"{name:<16}{r['forecasts']:>6}{r['mae']:>10.2f}{mape:>9}"
+            f"{r['fit_time_per_course_ms']['mean']:>15.2f}{r['fit_time_per_course_ms']['p95']:>10.2f}"
+            f"{r['wall_time_s']:>9.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Benchmark the embedding client against a local mock server.
+
+Compares the old path (one `embedContent` request per text, sent
+sequentially) with `services.embeddings.embed_texts` (batched, concurrent,
+pooled) and checks that both return the same vectors in input order, then
+repeats the batched run to show the embedding cache. The cache lives in a
+temporary directory, so runs start cold. No API key or network access is
+needed.
+
+Run from `AI_backend/`:
+
+    python -m utils.bench_embeddings --texts 2000 --latency-ms 40
+    python -m utils.bench_embeddings --texts 2000 --batch-size 50 --concurrency 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+import numpy as np
+
+from utils.mock_genai_server import start_mock_server
+
+
+def _sequential_embed(base_url: str, texts: List[str]) -> List[List[float]]:
+    """The previous client: one request per text over a fresh client."""
+    url = f"{base_url}/v1/models/text-embedding-004:embedContent?key=test"
+    outputs: List[List[float]] = []
+    with httpx.Client(timeout=30.0) as client:
+        for t in texts:
+            resp = client.post(url, json={"model": "text-embedding-004", "content": {"parts": [{"text": t}]}})
+            resp.raise_for_status()
+            outputs.append(resp.json()["embedding"]["values"])
+    return outputs
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs batched embedding requests.")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of chunks to embed")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Mock per-request latency")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--skip-sequential", action="store_true", help="Only time the batched client")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_mock_server(latency_ms=args.latency_ms)
+    # The embedding module reads its configuration at import time
+    os.environ["GEN_AI_BASE_URL"] = base_url
+    os.environ["GOOGLE_API_KEY"] = "test"
+    os.environ["EMBED_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["EMBED_CONCURRENCY"] = str(args.concurrency)
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="embed-bench-"), "embeddings.sqlite")
+    from services.embeddings import embed_texts
+
+    texts = [f"Policy chunk {i}: attendance and grading rules, section {i % 37}." for i in range(args.texts)]
+    print(f"{args.texts} texts, {args.latency_ms:.0f} ms mock latency, "
+          f"batch {args.batch_size}, concurrency {args.concurrency}")
+
+    try:
+        seq = None
+        if not args.skip_sequential:
+            server.stats["requests"] = 0
+            t0 = time.perf_counter()
+            seq = _sequential_embed(base_url, texts)
+            dt = time.perf_counter() - t0
+            print(f"{'sequential':<12}{dt:>9.2f} s{server.stats['requests']:>8} requests{args.texts / dt:>10.0f} texts/s")
+
+        for label in ("batched", "cached"):
+            server.stats["requests"] = 0
+            t0 = time.perf_counter()
+            out = embed_texts(texts)
+            dt = time.perf_counter() - t0
+            print(f"{label:<12}{dt:>9.2f} s{server.stats['requests']:>8} requests{args.texts / dt:>10.0f} texts/s")
+            if label == "batched":
+                batched = out
+            elif out != batched:
+                print("FAIL: cached vectors differ from the first batched run")
+                return 1
+    finally:
+        server.shutdown()
+
+    if len(batched) != len(texts):
+        print(f"FAIL: expected {len(texts)} vectors, got {len(batched)}")
+        return 1
+    # The client stores vectors as float32, so compare with float32 tolerance
+    if seq is not None and not np.allclose(np.asarray(seq), np.asarray(batched), atol=1e-6):
+        print("FAIL: batched vectors differ from sequential (order not preserved)")
+        return 1
+    print("OK: vectors match input order")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
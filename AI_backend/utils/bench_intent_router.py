@@ -0,0 +1,208 @@
+"""Benchmark the assistant's intent router on a labelled query set.
+
+Each question below is labelled with the native intent it should route to,
+"doc" (knowledge question, answered from retrieved documents) or "llm"
+(data question the native handlers do not cover, so it must fall through
+to the spec LLM). The router is scored as a classifier over those labels:
+accuracy, per-label precision / recall and the confusion pairs, plus the
+per-question latency of `match_intent` and `classify_intent`. No database
+or API is needed for this part.
+
+With `--url`, every question is also POSTed to a running server's
+`/assistant/chat` and end-to-end latency is reported per route label
+(native handler vs LLM path):
+
+    python -m utils.bench_intent_router --repeat 2000
+    python -m utils.bench_intent_router --url http://localhost:8000
+
+Run from `AI_backend/`.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("ASSISTANT_SEMANTIC_CACHE", "0")
+
+from services.intent_classifier import classify_intent  # noqa: E402
+from services.intent_router import INTENTS, match_intent  # noqa: E402
+
+USER = {"role": "student", "id": 1}
+
+# (question, expected label)
+LABELLED: List[Tuple[str, str]] = [
+    ("Show my timetable", "my_timetable"),
+    ("What classes do I have on Monday?", "my_timetable"),
+    ("my schedule for friday", "my_timetable"),
+    ("Show me my lectures on Wed", "my_timetable"),
+    ("What is my time table this week", "my_timetable"),
+    ("do i have classes on tuesday", "my_timetable"),
+    ("Timetable for student id=1", "student_timetable"),
+    ("show the schedule of student 1 on thursday", "student_timetable"),
+    ("timetable for student #1", "student_timetable"),
+    ("Free rooms on Friday at 2pm", "free_rooms"),
+    ("Which classrooms are available on monday at 10:00?", "free_rooms"),
+    ("empty rooms on wednesday", "free_rooms"),
+    ("free classrooms on tuesday at 9am for 60 students", "free_rooms"),
+    ("Are any halls vacant on thursday at 3 pm with capacity of 100", "free_rooms"),
+    ("available rooms on saturday", "free_rooms"),
+    ("Courses with 3 credits in semester 5", "course_catalog"),
+    ("List 5 courses with 4 credits", "course_catalog"),
+    ("show mandatory courses in semester 3", "course_catalog"),
+    ("elective courses", "course_catalog"),
+    ("Which courses are in the 2nd semester?", "course_catalog"),
+    ("core courses for sem 1", "course_catalog"),
+    ("top 10 courses worth 2 credits", "course_catalog"),
+    ("optional courses in semester 6", "course_catalog"),
+    ("show all mandatory courses with 4 credits", "course_catalog"),
+    ("How many courses are in semester 5?", "entity_count"),
+    ("how many students are there", "entity_count"),
+    ("number of classrooms", "entity_count"),
+    ("How many faculty do we have?", "entity_count"),
+    ("count of courses", "entity_count"),
+    ("how many courses do we have in sem 4", "entity_count"),
+    ("how many teachers", "entity_count"),
+    ("Which courses does Dr. Rao teach on Friday?", "llm"),
+    ("How many students are enrolled in each course in semester 3?", "llm"),
+    ("Show classrooms in building A ordered by capacity", "llm"),
+    ("List students enrolled in CS101", "llm"),
+    ("Which faculty members teach more than two courses?", "llm"),
+    ("average capacity of classrooms per building", "llm"),
+    ("courses taught by Prof. Iyer", "llm"),
+    ("courses worth 4 credits offered by Dr. Menon", "llm"),
+    ("semester 5 courses ordered by credits", "llm"),
+    ("which courses have more than 50 enrollments", "llm"),
+    ("Show the timetable of faculty 3", "llm"),
+    ("Which rooms are used most on Monday?", "llm"),
+    ("list all timeslots after 4pm", "llm"),
+    ("students with the highest number of credits this semester", "llm"),
+    # Qualifiers the native handlers cannot express: they must not be dropped or inverted
+    ("how many courses have more than 3 credits", "llm"),
+    ("how many courses are mandatory", "llm"),
+    ("how many mandatory courses are there", "llm"),
+    ("courses with more than 3 credits", "llm"),
+    ("courses with at least 3 credits", "llm"),
+    ("courses with fewer than 4 credits in semester 2", "llm"),
+    ("courses not in semester 5", "llm"),
+    ("list all courses except semester 5 ones", "llm"),
+    ("courses without 3 credits", "llm"),
+    ("non-mandatory courses", "llm"),
+    ("courses with 3 credits or 4 credits", "llm"),
+    ("courses in semester 3 and semester 4", "llm"),
+    ("my timetable for monday and friday", "llm"),
+    ("my classes after 2pm on monday", "llm"),
+    ("free rooms on friday at 2pm or 3pm", "llm"),
+    ("free rooms on tuesday for more than 60 students", "llm"),
+    ("How do I register for an elective?", "doc"),
+    ("What is the attendance policy?", "doc"),
+    ("Explain how the timetable optimizer handles conflicts", "doc"),
+    ("What are the rules for dropping a course?", "doc"),
+    ("Who do I contact about a grading issue?", "doc"),
+    ("What does the registration deadline mean for late enrolment?", "doc"),
+    ("How is the credit limit per semester defined?", "doc"),
+    ("Describe the process to request a room change", "doc"),
+    ("what is the policy on exam re-evaluation", "doc"),
+]
+
+
+def route(question: str) -> str:
+    """Label the assistant would take: doc path, native intent, or the LLM fallback."""
+    if classify_intent(question)["intent"] == "doc":
+        return "doc"
+    matched = match_intent(question, USER)
+    return matched["intent"] if matched else "llm"
+
+
+def _time_us(fn, question: str, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(question)
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def _pct(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def score() -> Tuple[List[str], Dict[str, Dict[str, float]], Counter]:
+    predicted = [route(q) for q, _ in LABELLED]
+    confusion: Counter = Counter()
+    for (_, expected), got in zip(LABELLED, predicted):
+        confusion[(expected, got)] += 1
+    per_label: Dict[str, Dict[str, float]] = {}
+    for label in INTENTS + ["llm", "doc"]:
+        tp = confusion[(label, label)]
+        pred = sum(v for (e, g), v in confusion.items() if g == label)
+        true = sum(v for (e, g), v in confusion.items() if e == label)
+        per_label[label] = {
+            "n": true,
+            "precision": tp / pred if pred else 0.0,
+            "recall": tp / true if true else 0.0,
+        }
+    return predicted, per_label, confusion
+
+
+def end_to_end(url: str, timeout: float) -> Dict[str, List[float]]:
+    import httpx
+
+    headers = {"X-User-Id": str(USER["id"]), "X-User-Role": USER["role"]}
+    by_label: Dict[str, List[float]] = defaultdict(list)
+    with httpx.Client(base_url=url, headers=headers, timeout=timeout) as client:
+        for question, expected in LABELLED:
+            t0 = time.perf_counter()
+            resp = client.post("/assistant/chat", json={"text": question})
+            elapsed = (time.perf_counter() - t0) * 1000
+            if resp.status_code != 200:
+                print(f"  {resp.status_code} for: {question}")
+                continue
+            by_label["native" if expected in INTENTS else expected].append(elapsed)
+    return by_label
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the assistant intent router.")
+    parser.add_argument("--repeat", type=int, default=1000, help="Timing runs per question")
+    parser.add_argument("--url", help="Also measure end-to-end latency against this server")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--show-errors", action="store_true", help="List misrouted questions")
+    args = parser.parse_args(argv)
+
+    predicted, per_label, confusion = score()
+    correct = sum(confusion[(label, label)] for label in per_label)
+    print(f"{len(LABELLED)} labelled questions, accuracy {correct / len(LABELLED):.1%}\n")
+    header = f"{'label':<20}{'n':>4}{'precision':>11}{'recall':>8}"
+    print(header)
+    print("-" * len(header))
+    for label, s in per_label.items():
+        print(f"{label:<20}{s['n']:>4}{s['precision']:>11.2f}{s['recall']:>8.2f}")
+    misses = {k: v for k, v in confusion.items() if k[0] != k[1]}
+    if misses:
+        print("\nconfusions (expected -> routed):")
+        for (e, g), v in sorted(misses.items(), key=lambda kv: -kv[1]):
+            print(f"  {e} -> {g}: {v}")
+    if args.show_errors:
+        for (q, e), g in zip(LABELLED, predicted):
+            if e != g:
+                print(f"  [{e} -> {g}] {q}")
+
+    match_us = [_time_us(lambda q: match_intent(q, USER), q, args.repeat) for q, _ in LABELLED]
+    classify_us = [_time_us(classify_intent, q, args.repeat) for q, _ in LABELLED]
+    print(f"\n{'latency (us)':<20}{'mean':>8}{'p50':>8}{'p95':>8}")
+    for name, values in (("match_intent", match_us), ("classify_intent", classify_us)):
+        print(f"{name:<20}{statistics.mean(values):>8.1f}{_pct(values, 0.5):>8.1f}{_pct(values, 0.95):>8.1f}")
+
+    if args.url:
+        print(f"\nend-to-end against {args.url} (ms)")
+        print(f"{'route':<10}{'n':>4}{'p50':>10}{'p95':>10}")
+        for label, values in sorted(end_to_end(args.url, args.timeout).items()):
+            print(f"{label:<10}{len(values):>4}{_pct(values, 0.5):>10.1f}{_pct(values, 0.95):>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
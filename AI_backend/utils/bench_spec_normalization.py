@@ -0,0 +1,179 @@
+"""Benchmark `normalize_and_validate_spec`: difflib scans vs the precomputed fuzzy index.
+
+Each data-oriented question in `knowledge/sample_queries.md` is paired
+with LLM-style specs (exact names, aliases and misspelled columns, as the
+spec LLM actually produces). Every spec is normalized three ways:
+
+- difflib: the previous behaviour, get_close_matches over freshly
+  lowercased lists on every lookup
+- index (cold): the FuzzyIndex with memoization cleared before each spec
+- index (warm): memoized lookups, as in a long-running server
+
+Outputs of all three are checked to be identical. No database or API.
+
+Run from `AI_backend/`:
+
+    python -m utils.bench_spec_normalization --repeat 2000
+"""
+
+import argparse
+import copy
+import os
+import re
+import sys
+import time
+from difflib import get_close_matches
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("ASSISTANT_SEMANTIC_CACHE", "0")
+
+from services import assistant_service as svc  # noqa: E402
+
+SAMPLE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "knowledge", "sample_queries.md")
+
+# Specs keyed by a word that identifies the sample question
+SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "credits": [
+        {"model": "courses", "fields": ["courses.code", "courses.name", "courses.credits"],
+         "filters": {"courses.credits": 3, "courses.semester": 5}, "limit": 5},
+        {"model": "course", "fields": ["course_code", "course_name", "credit"],
+         "filters": {"credits": 3, "semster": 5}, "limit": 5},
+    ],
+    "timetable": [
+        {"model": "enrollments", "fields": ["courses.code", "timeslots.day", "timeslots.start_time", "timeslots.end_time"],
+         "joins": [{"model": "courses", "on": {"enrollments.course_id": "courses.id"}},
+                   {"model": "timeslots", "on": {"courses.timeslot_id": "timeslots.id"}}],
+         "filters": {"enrollments.student_id": 1, "timeslots.day": "Monday"}, "order_by": ["timeslots.start_time"]},
+        {"model": "enrolments", "fields": ["courses.course_code", "timeslots.dya", "timeslots.start", "timeslots.end_tim"],
+         "joins": [{"model": "courses", "on": {"enrollments.course_id": "courses.id"}},
+                   {"model": "timeslots", "on": {"courses.timeslot_id": "timeslots.id"}}],
+         "filters": {"student_id": 1, "timeslots.day": "Monday"}, "order_by": ["timeslots.strat_time"]},
+    ],
+    "classrooms": [
+        {"model": "classrooms", "fields": ["classrooms.room_number", "classrooms.capacity", "classrooms.building"],
+         "filters": {"classrooms.building": "A"}, "order_by": ["classrooms.capacity"]},
+        {"model": "classroom", "fields": ["room", "capacty", "buildng"],
+         "filters": {"building": "A"}, "order_by": ["capacity"]},
+    ],
+    "faculty": [
+        {"model": "courses", "fields": ["courses.code", "courses.name", "faculty.name", "timeslots.start_time"],
+         "joins": [{"model": "faculty", "on": {"courses.faculty_id": "faculty.id"}},
+                   {"model": "timeslots", "on": {"courses.timeslot_id": "timeslots.id"}}],
+         "filters": {"faculty.name": "Dr. Rao", "timeslots.day": "Friday"}},
+        {"model": "courses", "fields": ["courses.code", "courses.nme", "faculty.name", "timeslots.start"],
+         "joins": [{"model": "faculty", "on": {"courses.faculty_id": "faculty.id"}},
+                   {"model": "timeslots", "on": {"courses.timeslot_id": "timeslots.id"}}],
+         "filters": {"teacher": "Dr. Rao", "timeslots.dday": "Friday"}},
+    ],
+    "count": [
+        {"model": "enrollments", "fields": ["courses.code", "COUNT(enrollments.id)"],
+         "joins": [{"model": "courses", "on": {"enrollments.course_id": "courses.id"}}],
+         "filters": {"courses.semester": 3}, "group_by": ["courses.code"], "order_by": ["COUNT(enrollments.id)"]},
+        {"model": "enrollment", "fields": ["courses.code", "count(enrollments.idd)"],
+         "joins": [{"model": "courses", "on": {"enrollments.course_id": "courses.id"}}],
+         "filters": {"courses.semestre": 3}, "group_by": ["courses.cod"], "order_by": ["count(*)"]},
+    ],
+}
+
+
+def data_questions(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    section = text.split("Data-oriented", 1)[1].split("\n\n", 1)[0]
+    return [m.group(1).strip() for m in re.finditer(r"^- (.+)$", section, re.M)]
+
+
+class _DifflibIndex:
+    """The pre-index lookup: a get_close_matches scan over re-lowercased candidates per call."""
+
+    def __init__(self, candidates) -> None:
+        self.candidates = list(candidates)
+
+    def closest(self, term: str, cutoff: float = 0.6) -> Optional[str]:
+        match = get_close_matches(term.lower(), [c.lower() for c in self.candidates], n=1, cutoff=cutoff)
+        if not match:
+            return None
+        return next(c for c in self.candidates if c.lower() == match[0])
+
+    def cache_clear(self) -> None:
+        pass
+
+
+def _indexes() -> Dict[str, Any]:
+    return {"ALIAS_INDEX": svc.ALIAS_INDEX, "TABLE_INDEX": svc.TABLE_INDEX, "COLUMN_INDEX": svc.COLUMN_INDEX}
+
+
+def _install(indexes: Dict[str, Any]) -> None:
+    for name, value in indexes.items():
+        setattr(svc, name, value)
+
+
+def _clear(indexes: Dict[str, Any]) -> None:
+    indexes["ALIAS_INDEX"].cache_clear()
+    indexes["TABLE_INDEX"].cache_clear()
+    for idx in indexes["COLUMN_INDEX"].values():
+        idx.cache_clear()
+
+
+def _run(specs: List[Dict[str, Any]], repeat: int, clear=None) -> List[float]:
+    per_spec: List[float] = []
+    for spec in specs:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            if clear:
+                clear()
+            svc.normalize_and_validate_spec(copy.deepcopy(spec))
+        per_spec.append((time.perf_counter() - t0) / repeat * 1e6)
+    return per_spec
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark spec normalization.")
+    parser.add_argument("--queries", default=SAMPLE_QUERIES, help="Markdown file with the sample queries")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    specs: List[Dict[str, Any]] = []
+    for q in data_questions(args.queries):
+        key = next((k for k in SPECS if k in q.lower()), None)
+        if key is None:
+            print(f"no spec for: {q}")
+            continue
+        specs.extend(SPECS[key])
+    if not specs:
+        print("No sample queries matched")
+        return 1
+
+    fast = _indexes()
+    slow = {
+        "ALIAS_INDEX": _DifflibIndex(svc.ALIAS_MAP.keys()),
+        "TABLE_INDEX": _DifflibIndex(svc.SCHEMA.keys()),
+        "COLUMN_INDEX": {t: _DifflibIndex(cols) for t, cols in svc.SCHEMA.items()},
+    }
+    try:
+        _install(slow)
+        expected = [svc.normalize_and_validate_spec(copy.deepcopy(s)) for s in specs]
+        difflib_us = _run(specs, args.repeat)
+    finally:
+        _install(fast)
+    got = [svc.normalize_and_validate_spec(copy.deepcopy(s)) for s in specs]
+    if got != expected:
+        print("MISMATCH between difflib and index normalization")
+        return 1
+    cold_us = _run(specs, args.repeat, clear=lambda: _clear(fast))
+    warm_us = _run(specs, args.repeat)
+
+    header = f"{'spec':<6}{'mapped':>8}{'difflib us':>12}{'cold us':>10}{'warm us':>10}"
+    print(f"{len(specs)} specs from {os.path.basename(args.queries)}, {args.repeat} runs each\n")
+    print(header)
+    print("-" * len(header))
+    for i, (out, d, c, w) in enumerate(zip(got, difflib_us, cold_us, warm_us)):
+        print(f"{i:<6}{len(out['audit']['mapped']):>8}{d:>12.1f}{c:>10.1f}{w:>10.1f}")
+    n = len(specs)
+    print("-" * len(header))
+    print(f"{'mean':<14}{sum(difflib_us) / n:>12.1f}{sum(cold_us) / n:>10.1f}{sum(warm_us) / n:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
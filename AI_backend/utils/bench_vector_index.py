@@ -0,0 +1,211 @@
+"""Recall/latency benchmark: exact vs ANN (HNSW / IVFFlat) pgvector search.
+
+Loads a synthetic clustered corpus into a scratch table, computes exact
+top-k neighbours with a sequential scan, then builds the ANN index and
+reports recall@k and p50/p95 query latency for each ef_search (or probes)
+value. A partial index on a metadata type is measured too, matching how
+`PgVectorRetriever.search` filters. Needs Postgres with pgvector; the
+scratch table is dropped afterwards unless --keep is given.
+
+`--explain` instead checks the app's real `knowledge_chunks` indexes: it
+EXPLAINs `PgVectorRetriever.search` for every (role, type) combination
+and prints the ANN index each plan uses, so a filter that misses its
+partial index shows up as a sequential scan or the unfiltered index.
+On a near-empty table the planner prefers a sequential scan anyway, so
+run it after ingesting the knowledge base.
+
+Run from `AI_backend/`:
+
+    python -m utils.bench_vector_index --rows 20000 --queries 200
+    python -m utils.bench_vector_index --kind hnsw --m 16 --ef-construction 64 --ef-search 20 40 80 160
+    python -m utils.bench_vector_index --kind ivfflat --lists 200 --ef-search 1 5 10 20
+    python -m utils.bench_vector_index --dsn postgresql://postgres:pw@localhost:5432/postgres
+    python -m utils.bench_vector_index --explain
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+TABLE = "bench_vector_chunks"
+TYPES = ["schema", "policy", "faq", "calendar"]
+
+
+def _vec(v: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in v) + "]"
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit vectors drawn around random cluster centres (embeddings are clustered, not uniform)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, rows)
+    data = centres[assign] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _load(engine, data: np.ndarray, seed: int) -> None:
+    rng = np.random.default_rng(seed + 1)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {TABLE} (id bigserial primary key, type text, embedding vector({data.shape[1]}))"
+        ))
+    buf = io.StringIO()
+    for v in data:
+        buf.write(f"{TYPES[int(rng.integers(0, len(TYPES)))]}\t{_vec(v)}\n")
+    buf.seek(0)
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            cur.copy_expert(f"COPY {TABLE} (type, embedding) FROM STDIN", buf)
+        raw.commit()
+    finally:
+        raw.close()
+    with engine.begin() as conn:
+        conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+def _run(engine, queries: np.ndarray, k: int, where: str, setting: Optional[str], exact: bool):
+    sql = text(
+        f"SELECT id FROM {TABLE} {where} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    )
+    results: List[List[int]] = []
+    lat: List[float] = []
+    with engine.connect() as conn:
+        for q in queries:
+            with conn.begin():
+                if exact:
+                    conn.execute(text("SET LOCAL enable_indexscan = off"))
+                    conn.execute(text("SET LOCAL enable_bitmapscan = off"))
+                if setting:
+                    conn.execute(text(setting))
+                t0 = time.perf_counter()
+                ids = [r[0] for r in conn.execute(sql, {"q": _vec(q), "k": k}).fetchall()]
+                lat.append((time.perf_counter() - t0) * 1000)
+            results.append(ids)
+    return results, lat
+
+
+def _recall(exact: List[List[int]], approx: List[List[int]], k: int) -> float:
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+    return hits / max(1, k * len(exact))
+
+
+def explain_app_search() -> int:
+    """Print which managed index each filtered app search uses; exit 1 if a partial index is missed."""
+    from database import SessionLocal
+    from services.pgvector_retriever import INDEX_PREFIX, PARTIAL_PAIRS, PARTIAL_ROLES, PARTIAL_TYPES, PgVectorRetriever
+
+    db = SessionLocal()
+    missed = 0
+    try:
+        retriever = PgVectorRetriever(db)
+        print(f"{'role':<12}{'type':<12}index")
+        for role in [None] + PARTIAL_ROLES + ["other_role"]:
+            for ftype in [None] + PARTIAL_TYPES + ["other_type"]:
+                got = retriever.explain_search(role, ftype)
+                index = got["index"] or "(no ANN index)"
+                # An indexed role/type should hit an index whose name carries it
+                # (both, when (type, role) pair indexes are built)
+                wanted = []
+                if role in PARTIAL_ROLES:
+                    wanted.append(f"r_{role}")
+                if ftype in PARTIAL_TYPES:
+                    wanted.append(f"t_{ftype}")
+                match = all if PARTIAL_PAIRS else any
+                ok = (
+                    bool(got["index"]) and got["index"].startswith(INDEX_PREFIX)
+                    and (not wanted or match(w in got["index"] for w in wanted))
+                )
+                missed += 0 if ok else 1
+                print(f"{role or '-':<12}{ftype or '-':<12}{index}{'' if ok else '   <-- partial index not used'}")
+    finally:
+        db.close()
+    return 1 if missed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark exact vs ANN pgvector search.")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="Postgres URL (default: the app's database)")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kind", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 80, 160],
+                        help="hnsw.ef_search values (or ivfflat.probes with --kind ivfflat)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch table")
+    parser.add_argument("--explain", action="store_true", help="Only check index use of the app's filtered searches")
+    args = parser.parse_args(argv)
+
+    if args.explain:
+        return explain_app_search()
+
+    if args.dsn:
+        engine = create_engine(args.dsn)
+    else:
+        from database import engine
+
+    data = synthetic_corpus(args.rows, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 2)
+    picks = data[rng.integers(0, args.rows, args.queries)]
+    queries = picks + 0.1 * rng.standard_normal(picks.shape).astype(np.float32)
+
+    t0 = time.perf_counter()
+    _load(engine, data, args.seed)
+    print(f"Loaded {args.rows} x {args.dim} vectors in {time.perf_counter() - t0:.1f} s")
+
+    if args.kind == "hnsw":
+        using = f"hnsw (embedding vector_cosine_ops) WITH (m = {args.m}, ef_construction = {args.ef_construction})"
+        knob = "hnsw.ef_search"
+    else:
+        using = f"ivfflat (embedding vector_cosine_ops) WITH (lists = {args.lists})"
+        knob = "ivfflat.probes"
+
+    header = f"{'scope':<10}{'search':<22}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}"
+    try:
+        for scope, where, index_where in (
+            ("all", "", ""),
+            ("type=faq", "WHERE type = 'faq'", "WHERE type = 'faq'"),
+        ):
+            exact, lat = _run(engine, queries, args.k, where, None, exact=True)
+            rows: List[Dict] = [{"search": "exact (seq scan)", "recall": 1.0, "lat": lat}]
+
+            t0 = time.perf_counter()
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP INDEX IF EXISTS {TABLE}_ann"))
+                conn.execute(text(f"CREATE INDEX {TABLE}_ann ON {TABLE} USING {using} {index_where}"))
+            build_s = time.perf_counter() - t0
+
+            for val in args.ef_search:
+                approx, lat = _run(engine, queries, args.k, where, f"SET LOCAL {knob} = {int(val)}", exact=False)
+                rows.append({"search": f"{knob}={val}", "recall": _recall(exact, approx, args.k), "lat": lat})
+
+            print(f"\n{scope}: {args.kind} index built in {build_s:.1f} s")
+            print(header)
+            print("-" * len(header))
+            for r in rows:
+                p50, p95 = np.percentile(r["lat"], [50, 95])
+                print(f"{scope:<10}{r['search']:<22}{r['recall']:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
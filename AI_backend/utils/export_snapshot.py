@@ -0,0 +1,36 @@
+"""Export enrollment history and catalog tables to a Parquet snapshot.
+
+Writes `enrollments/` partitioned by year/semester plus one file per
+catalog table (courses, faculty, classrooms, timeslots). Point the Tier 1
+pipeline or the backtest harness at the result to avoid querying the
+primary database. Needs the same SUPABASE* environment as the API.
+
+Run from `AI_backend/`:
+
+    python -m utils.export_snapshot --out snapshots/enrollment
+"""
+
+import argparse
+import json
+import sys
+
+from database import SessionLocal
+from services.snapshot import SNAPSHOT_DIR, export_snapshot
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export a Parquet snapshot of enrollment history.")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help=f"Snapshot directory (default: {SNAPSHOT_DIR})")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        manifest = export_snapshot(db, args.out)
+    finally:
+        db.close()
+    print(json.dumps(manifest, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
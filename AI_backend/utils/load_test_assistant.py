@@ -0,0 +1,296 @@
+"""Load-test the assistant pipeline against the mock Generative Language API.
+
+Drives `/assistant/chat` (or `/chat/stream`) with a mix of questions and
+reports latency percentiles (p50/p95/p99) overall and per path: native
+handler, spec LLM, document answer, shed (503) and error. With `--debug`
+it also aggregates the per-stage spans each response carries, which shows
+where the time goes under load.
+
+Two modes:
+
+- `--url`: against a running app started with GEN_AI_BASE_URL pointed at
+  the mock (see utils/mock_genai_server.py). This is the full HTTP stack.
+- `--in-process`: starts the mock on a thread, points the Gemini and
+  embedding clients at it and calls the pipeline directly with sessions
+  from `database.SessionLocal` (needs the database settings). The mock's
+  latency and error options are taken from the flags below.
+
+Load is closed-loop (`--concurrency` workers back to back) or open-loop
+(`--rate` requests/s with Poisson arrivals, which keeps arriving when the
+server slows down, as real traffic does). Questions come from the intent
+router's labelled set (native, LLM and document questions) or
+`--questions FILE` (one per line).
+
+Run from `AI_backend/`:
+
+    python -m utils.mock_genai_server --port 8765 --chat-latency lognormal:600:0.4 --errors 429:0.01
+    GEN_AI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=test GEN_AI_MODEL=gemini-1.5-flash uvicorn main:app
+    python -m utils.load_test_assistant --url http://localhost:8000 --requests 500 --concurrency 32 --debug
+
+    python -m utils.load_test_assistant --in-process --requests 300 --rate 20 \\
+        --chat-latency lognormal:600:0.4 --errors 429:0.02 --cold
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.bench_intent_router import LABELLED
+
+Send = Callable[[str, int], Awaitable[Dict[str, Any]]]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(-(-q * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _path(status: int, body: Dict[str, Any]) -> str:
+    if status == 503:
+        return "shed"
+    if status != 200 or body.get("status") == "error":
+        return "error"
+    if body.get("route"):
+        return "native"
+    if "sources" in body:
+        return "doc"
+    return "llm"
+
+
+# ---------------------------------------------------------------------
+# Senders
+# ---------------------------------------------------------------------
+def http_sender(client, role: str, users: int, stream: bool, debug: bool) -> Send:
+    async def send(question: str, i: int) -> Dict[str, Any]:
+        headers = {"X-User-Id": str(i % users + 1), "X-User-Role": role}
+        body = {"text": question, "debug": debug}
+        t0 = time.perf_counter()
+        if not stream:
+            resp = await client.post("/assistant/chat", json=body, headers=headers)
+            data = resp.json() if resp.headers.get("content-type", "").startswith("application/json") else {}
+            return {"status": resp.status_code, "body": data, "ms": (time.perf_counter() - t0) * 1000}
+        first: Optional[float] = None
+        event, data = None, {}
+        async with client.stream("POST", "/assistant/chat/stream", json=body, headers=headers) as resp:
+            async for line in resp.aiter_lines():
+                if first is None and line:
+                    first = (time.perf_counter() - t0) * 1000
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:") and event in ("done", "error"):
+                    data = json.loads(line[5:])
+            status = resp.status_code
+        if event == "error":
+            status = 503 if data.get("overloaded") else 500
+        return {"status": status, "body": data, "ms": (time.perf_counter() - t0) * 1000, "ttfb_ms": first}
+
+    return send
+
+
+def in_process_sender(role: str, users: int, debug: bool) -> Send:
+    from database import SessionLocal
+    from services.assistant_service import handle_user_query
+    from services.llm_gateway import LLMOverloaded
+
+    async def send(question: str, i: int) -> Dict[str, Any]:
+        db = SessionLocal()
+        t0 = time.perf_counter()
+        try:
+            data = await handle_user_query(db, {"id": i % users + 1, "role": role}, question, debug=debug)
+            status = 200
+        except LLMOverloaded as e:
+            data, status = {"message": str(e)}, 503
+        except Exception as e:
+            data, status = {"message": str(e)}, 500
+        finally:
+            db.close()
+        return {"status": status, "body": data, "ms": (time.perf_counter() - t0) * 1000}
+
+    return send
+
+
+# ---------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------
+async def run_load(send: Send, questions: List[str], total: int, concurrency: int, rate: float) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+
+    async def one(i: int) -> None:
+        question = questions[i % len(questions)]
+        try:
+            out = await send(question, i)
+        except Exception as e:  # connection refused, timeout, ...
+            out = {"status": 0, "body": {"message": str(e)}, "ms": 0.0}
+        out["question"] = question
+        out["path"] = _path(out["status"], out["body"])
+        results.append(out)
+
+    if rate > 0:
+        # Open loop: arrivals do not wait for earlier requests to finish
+        tasks = []
+        for i in range(total):
+            tasks.append(asyncio.ensure_future(one(i)))
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+    else:
+        counter = iter(range(total))
+
+        async def worker() -> None:
+            for i in counter:
+                await one(i)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return results
+
+
+# ---------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------
+def _row(name: str, values: List[float]) -> str:
+    return (f"{name:<22}{len(values):>6}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}"
+            f"{percentile(values, 99):>10.1f}{(max(values) if values else 0.0):>10.1f}")
+
+
+def _pcts(values: List[float]) -> Dict[str, float]:
+    return {"n": len(values), **{f"p{q}": round(percentile(values, q), 1) for q in (50, 95, 99)}}
+
+
+def report(results: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    by_path: Dict[str, List[float]] = defaultdict(list)
+    stages: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[int, int] = defaultdict(int)
+    ttfb = [r["ttfb_ms"] for r in results if r.get("ttfb_ms") is not None]
+    for r in results:
+        statuses[r["status"]] += 1
+        by_path[r["path"]].append(r["ms"])
+        for sp in ((r["body"] or {}).get("debug") or {}).get("spans", []):
+            stages[sp["name"]].append(sp["duration_ms"])
+    latencies = [r["ms"] for r in results]
+
+    print(f"{len(results)} requests in {wall_s:.1f} s ({len(results) / wall_s:.1f} req/s); "
+          f"status {dict(sorted(statuses.items()))}\n")
+    header = f"{'latency (ms)':<22}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    print("-" * len(header))
+    print(_row("all", latencies))
+    for path in ("native", "llm", "doc", "shed", "error"):
+        if by_path.get(path):
+            print(_row(path, by_path[path]))
+    if ttfb:
+        print(_row("first event", ttfb))
+    if stages:
+        print(f"\n{'stage (ms)':<22}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        print("-" * len(header))
+        for name in sorted(stages, key=lambda n: -percentile(stages[n], 95)):
+            print(_row(name, stages[name]))
+    errors = [r for r in results if r["path"] == "error"]
+    if errors:
+        print(f"\nfirst error: {errors[0]['body'].get('message') or errors[0]['body']}")
+
+    summary = {
+        "requests": len(results),
+        "wall_s": round(wall_s, 2),
+        "statuses": dict(statuses),
+        "paths": {"all": _pcts(latencies), **{p: _pcts(v) for p, v in by_path.items()}},
+        "stages": {s: _pcts(v) for s, v in stages.items()},
+    }
+    return summary
+
+
+def _load_questions(path: Optional[str]) -> List[str]:
+    if not path:
+        return [q for q, _ in LABELLED]
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test /assistant/chat against the mock Gemini API.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running app")
+    target.add_argument("--in-process", action="store_true", help="Run the pipeline in this process")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10, help="Requests sent first and not reported")
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed-loop workers")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop arrivals per second (overrides --concurrency)")
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--role", default="student")
+    parser.add_argument("--users", type=int, default=50, help="Distinct X-User-Id values")
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream and report time to first event (--url)")
+    parser.add_argument("--debug", action="store_true", help="Request span breakdowns and report per-stage latency")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write the summary to this file")
+    mock = parser.add_argument_group("mock server (--in-process)")
+    mock.add_argument("--chat-latency", default="lognormal:500:0.4")
+    mock.add_argument("--embed-latency", default="normal:60:15")
+    mock.add_argument("--errors", help="e.g. 429:0.02,500:0.01")
+    mock.add_argument("--model", default="gemini-1.5-flash", help="GEN_AI_MODEL for the in-process clients")
+    mock.add_argument("--cold", action="store_true", help="Disable spec, semantic, result and embedding caches")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    questions = _load_questions(args.questions)
+    server = None
+
+    async def go() -> Dict[str, Any]:
+        if args.url:
+            import httpx
+
+            async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+                send = http_sender(client, args.role, args.users, args.stream, args.debug)
+                await run_load(send, questions, args.warmup, args.concurrency, 0)
+                t0 = time.perf_counter()
+                results = await run_load(send, questions, args.requests, args.concurrency, args.rate)
+                return report(results, time.perf_counter() - t0)
+        send = in_process_sender(args.role, args.users, args.debug)
+        await run_load(send, questions, args.warmup, args.concurrency, 0)
+        t0 = time.perf_counter()
+        results = await run_load(send, questions, args.requests, args.concurrency, args.rate)
+        return report(results, time.perf_counter() - t0)
+
+    if args.in_process:
+        from utils.mock_genai_server import start_mock_server
+
+        server, base_url = start_mock_server(
+            chat_latency=args.chat_latency, embed_latency=args.embed_latency, errors=args.errors, seed=args.seed
+        )
+        # The clients read their configuration at import time
+        os.environ["GEN_AI_BASE_URL"] = base_url
+        os.environ["GOOGLE_API_KEY"] = "test"
+        os.environ["GEN_AI_MODEL"] = args.model
+        os.environ.setdefault("EMBED_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="load-test-"), "embeddings.sqlite"))
+        if args.cold:
+            os.environ.update(
+                ASSISTANT_SPEC_CACHE_SIZE="0", ASSISTANT_SEMANTIC_CACHE="0", ASSISTANT_RESULT_CACHE="0", EMBED_CACHE="0"
+            )
+        print(f"mock API on {base_url}: chat {args.chat_latency}, embed {args.embed_latency}, "
+              f"errors {args.errors or 'none'}")
+
+    mode = f"{args.rate:g} req/s open loop" if args.rate > 0 else f"{args.concurrency} workers"
+    print(f"{args.requests} requests ({mode}), {len(questions)} distinct questions\n")
+    try:
+        summary = asyncio.run(go())
+    finally:
+        if server is not None:
+            print(f"\nmock: {json.dumps(server.snapshot())}")
+            server.shutdown()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""Local stand-in for the Generative Language API, for benchmarks and load tests.
+
+Serves every method the backend calls, so `/assistant/chat` can run end to
+end without a key or quota:
+
+- `:generateContent` and `:streamGenerateContent?alt=sse` (Gemini models)
+  and `:generateMessage` (PaLM / chat-bison), used by gemini_client.py
+- `:embedContent` and `:batchEmbedContents`, used by embeddings.py, with
+  deterministic vectors (seeded from the text's sha256), so results are
+  stable across runs and order can be checked
+
+Chat replies are picked from rules by prompt kind: the assistant's spec
+prompt (`spec`), result summary (`summary`) or document answer (`doc`).
+The default rules return a valid query spec for the table the question
+names and short canned summaries. `--responses FILE` adds rules (a JSON
+list of `{"kind", "match", "text"}`, checked before the defaults). `text`
+is a string.Template with `$question`, `$table`, `$fields`, `$snippet`
+and `$kind`.
+
+Latency is drawn per request from a distribution (`fixed:MS`,
+`uniform:LO:HI`, `normal:MEAN:SD`, `lognormal:MEDIAN:SIGMA`), separately
+for chat and embedding calls. `--errors 429:0.02,500:0.01` fails that
+share of requests with that status (429s carry Retry-After). `GET /stats`
+returns request, error and latency counters.
+
+Run from `AI_backend/`:
+
+    python -m utils.mock_genai_server --port 8765 --latency-ms 40
+    python -m utils.mock_genai_server --port 8765 --chat-latency lognormal:600:0.4 \\
+        --embed-latency normal:60:15 --errors 429:0.02,503:0.01
+    GEN_AI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=test GEN_AI_MODEL=gemini-1.5-flash uvicorn main:app
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBED_DIM = 768
+
+# Columns the spec validator accepts, used to fill `$fields` in spec templates
+TABLE_FIELDS = {
+    "courses": ["courses.code", "courses.name", "courses.credits", "courses.semester"],
+    "students": ["students.name", "students.roll_number", "students.year"],
+    "faculty": ["faculty.name", "faculty.email"],
+    "classrooms": ["classrooms.room_number", "classrooms.building", "classrooms.capacity"],
+    "timeslots": ["timeslots.day", "timeslots.start_time", "timeslots.end_time"],
+    "enrollments": ["enrollments.student_id", "enrollments.course_id"],
+}
+TABLE_WORDS = [
+    (r"enrol", "enrollments"), (r"student", "students"), (r"faculty|teacher|professor", "faculty"),
+    (r"room|classroom|hall", "classrooms"), (r"timeslot|slot|schedule|timetable", "timeslots"),
+    (r"course|credit|semester|elective", "courses"),
+]
+
+DEFAULT_RULES: List[Dict[str, str]] = [
+    {"kind": "spec", "match": r"how many|number of|count",
+     "text": '{"model": "$table", "fields": ["COUNT($table.id)"], "filters": {}, "joins": [], "limit": 1}'},
+    {"kind": "spec", "match": "",
+     "text": '{"model": "$table", "fields": $fields, "filters": {}, "joins": [], "limit": 10}'},
+    {"kind": "summary", "match": "", "text": 'These are the results for "$question".'},
+    {"kind": "doc", "match": "", "text": "According to the knowledge base: $snippet"},
+    {"kind": "any", "match": "", "text": "This is a mock reply to: $question"},
+]
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> List[float]:
+    """Deterministic unit vector for `text`."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    vec /= np.linalg.norm(vec)
+    return [round(float(v), 6) for v in vec]
+
+
+def _content_text(content: Dict[str, Any]) -> str:
+    return "".join(p.get("text", "") for p in (content or {}).get("parts", []))
+
+
+# ---------------------------------------------------------------------
+# Latency and error injection
+# ---------------------------------------------------------------------
+class Latency:
+    """Per-request delay drawn from `fixed:MS`, `uniform:LO:HI`, `normal:MEAN:SD` or `lognormal:MEDIAN:SIGMA`."""
+
+    def __init__(self, spec: str, rng: random.Random) -> None:
+        kind, *args = spec.split(":") if ":" in spec else ("fixed", spec)
+        self.kind = kind.lower()
+        self.args = [float(a) for a in args]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.args) != expected[self.kind]:
+            raise ValueError(f"bad latency spec {spec!r}")
+        self.spec = spec
+        self._rng = rng
+
+    def sample_s(self) -> float:
+        a = self.args
+        if self.kind == "fixed":
+            ms = a[0]
+        elif self.kind == "uniform":
+            ms = self._rng.uniform(a[0], a[1])
+        elif self.kind == "normal":
+            ms = self._rng.gauss(a[0], a[1])
+        else:
+            ms = a[0] * math.exp(self._rng.gauss(0.0, a[1]))
+        return max(0.0, ms) / 1000.0
+
+
+def parse_errors(spec: Optional[str]) -> List[Tuple[int, float]]:
+    """"429:0.02,500:0.01" -> [(429, 0.02), (500, 0.01)]."""
+    out: List[Tuple[int, float]] = []
+    for part in (spec or "").split(","):
+        if part.strip():
+            code, rate = part.split(":")
+            out.append((int(code), float(rate)))
+    return out
+
+
+# ---------------------------------------------------------------------
+# Chat replies
+# ---------------------------------------------------------------------
+def _prompt_parts(payload: Dict[str, Any]) -> Tuple[str, str]:
+    """(system / prompt text, last user message) for Gemini `contents` or PaLM `messages`."""
+    texts: List[str] = []
+    if "contents" in payload:
+        texts = [_content_text(c) for c in payload.get("contents") or []]
+    else:
+        texts = [(m.get("content") or {}).get("text", "") for m in payload.get("messages") or []]
+    if not texts:
+        return "", ""
+    return texts[0], texts[-1] if len(texts) > 1 else ""
+
+
+def _kind(prompt: str) -> str:
+    if "SCHEMA_SNIPPETS:" in prompt:
+        return "spec"
+    if "DOCUMENTS:" in prompt:
+        return "doc"
+    if "QUESTION:" in prompt and "RESULT:" in prompt:
+        return "summary"
+    return "any"
+
+
+def chat_reply(payload: Dict[str, Any], rules: List[Dict[str, str]]) -> str:
+    prompt, user = _prompt_parts(payload)
+    kind = _kind(prompt)
+    question = user
+    if kind == "summary":
+        m = re.search(r"QUESTION: (.*)", prompt)
+        question = m.group(1).strip() if m else ""
+    elif not question:
+        question = prompt[-200:]
+    table = next((t for pat, t in TABLE_WORDS if re.search(pat, question, re.I)), "courses")
+    snippet = prompt.split("DOCUMENTS:", 1)[-1].strip()[:200] if kind == "doc" else ""
+    values = {
+        "question": question, "table": table, "fields": json.dumps(TABLE_FIELDS[table]),
+        "snippet": snippet, "kind": kind,
+    }
+    for rule in rules:
+        if rule.get("kind", "any") not in (kind, "any"):
+            continue
+        if rule.get("match") and not re.search(rule["match"], question, re.I):
+            continue
+        return Template(rule["text"]).safe_substitute(values)
+    return ""
+
+
+# ---------------------------------------------------------------------
+# HTTP handler
+# ---------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    # Headers and body are separate writes; without this, delayed ACKs add
+    # ~40 ms to every keep-alive response and swamp the configured latency
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):  # quiet
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_sse(self, pieces: List[str]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self.server.stream_gap_s)
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] == "/stats":
+            self._send(200, self.server.snapshot())
+        else:
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        server = self.server
+        path = self.path.split("?", 1)[0]
+        method = path.rsplit(":", 1)[-1] if ":" in path else path
+        is_chat = method in ("generateContent", "streamGenerateContent", "generateMessage")
+        delay = server.draw_latency(is_chat)
+        status = server.draw_error()
+        server.record(method, delay, status)
+        if delay:
+            time.sleep(delay)
+        if status:
+            headers = {"Retry-After": f"{server.retry_after:g}"} if status == 429 else None
+            self._send(status, {"error": {"code": status, "message": "injected error", "status": "MOCK"}}, headers)
+            return
+
+        if method == "embedContent":
+            server.add("texts", 1)
+            self._send(200, {"embedding": {"values": fake_embedding(_content_text(payload.get("content")))}})
+        elif method == "batchEmbedContents":
+            reqs = payload.get("requests") or []
+            if len(reqs) > 100:
+                self._send(400, {"error": {"message": "at most 100 requests per batch"}})
+                return
+            server.add("texts", len(reqs))
+            self._send(200, {"embeddings": [
+                {"values": fake_embedding(_content_text(r.get("content")))} for r in reqs
+            ]})
+        elif method == "generateContent":
+            text = chat_reply(payload, server.rules)
+            self._send(200, {"candidates": [
+                {"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}
+            ]})
+        elif method == "streamGenerateContent":
+            text = chat_reply(payload, server.rules)
+            n = max(1, server.stream_chunks)
+            step = max(1, math.ceil(len(text) / n))
+            self._send_sse([text[i:i + step] for i in range(0, len(text), step)] or [""])
+        elif method == "generateMessage":
+            text = chat_reply(payload, server.rules)
+            self._send(200, {"candidates": [{"author": "1", "content": text}]})
+        else:
+            self._send(404, {"error": {"message": f"unknown method {path}"}})
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        chat_latency: str = "fixed:0",
+        embed_latency: str = "fixed:0",
+        errors: Optional[str] = None,
+        retry_after: float = 1.0,
+        rules: Optional[List[Dict[str, str]]] = None,
+        stream_chunks: int = 4,
+        stream_gap_ms: float = 20.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        super().__init__(address, _Handler)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat_latency = Latency(chat_latency, self._rng)
+        self.embed_latency = Latency(embed_latency, self._rng)
+        self.errors = parse_errors(errors)
+        self.retry_after = retry_after
+        self.rules = list(rules or []) + DEFAULT_RULES
+        self.stream_chunks = stream_chunks
+        self.stream_gap_s = stream_gap_ms / 1000.0
+        self.stats: Dict[str, Any] = {"requests": 0, "texts": 0, "errors": {}, "methods": {}, "latency_s": 0.0}
+
+    def draw_latency(self, chat: bool) -> float:
+        with self._lock:
+            return (self.chat_latency if chat else self.embed_latency).sample_s()
+
+    def draw_error(self) -> int:
+        with self._lock:
+            u = self._rng.random()
+        for code, rate in self.errors:
+            if u < rate:
+                return code
+            u -= rate
+        return 0
+
+    def record(self, method: str, delay: float, status: int) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["latency_s"] += delay
+            self.stats["methods"][method] = self.stats["methods"].get(method, 0) + 1
+            if status:
+                self.stats["errors"][str(status)] = self.stats["errors"].get(str(status), 0) + 1
+
+    def add(self, key: str, n: int) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = json.loads(json.dumps(self.stats))
+        stats["latency_s"] = round(stats["latency_s"], 3)
+        return stats
+
+
+def load_rules(path: Optional[str]) -> List[Dict[str, str]]:
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    if not isinstance(rules, list) or not all(isinstance(r, dict) and "text" in r for r in rules):
+        raise ValueError(f"{path}: expected a JSON list of {{kind, match, text}} rules")
+    return rules
+
+
+def start_mock_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = 0.0,
+    chat_latency: Optional[str] = None,
+    embed_latency: Optional[str] = None,
+    **options: Any,
+) -> Tuple[MockServer, str]:
+    """
+    Start the server on a daemon thread; returns (server, base_url). Call
+    server.shutdown() when done. `latency_ms` is a fixed delay for methods
+    without their own distribution; `options` go to MockServer.
+    """
+    fixed = f"fixed:{latency_ms:g}"
+    server = MockServer((host, port), chat_latency or fixed, embed_latency or fixed, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Generative Language API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay for every request")
+    parser.add_argument("--chat-latency", help="Chat latency distribution, e.g. lognormal:600:0.4")
+    parser.add_argument("--embed-latency", help="Embedding latency distribution, e.g. normal:60:15")
+    parser.add_argument("--errors", help="Injected error rates, e.g. 429:0.02,500:0.01")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--responses", help="JSON file of extra reply rules")
+    parser.add_argument("--stream-chunks", type=int, default=4, help="SSE events per streamed reply")
+    parser.add_argument("--stream-gap-ms", type=float, default=20.0, help="Delay between SSE events")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    server, url = start_mock_server(
+        args.host, args.port, args.latency_ms, args.chat_latency, args.embed_latency,
+        errors=args.errors, retry_after=args.retry_after, rules=load_rules(args.responses),
+        stream_chunks=args.stream_chunks, stream_gap_ms=args.stream_gap_ms, seed=args.seed,
+    )
+    print(f"Mock Generative Language API on {url} (Ctrl+C to stop)")
+    print(f"  chat latency {server.chat_latency.spec}, embed latency {server.embed_latency.spec}, "
+          f"errors {args.errors or 'none'}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
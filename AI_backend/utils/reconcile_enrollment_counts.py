@@ -0,0 +1,43 @@
+"""Reconcile the maintained `enrollment_counts` aggregate.
+
+Recounts `enrollments` per (course, year), reports rows whose maintained
+count or first/last timestamps drifted, and rebuilds the table unless
+--dry-run is given. The app backfills an empty aggregate on startup; run
+this to repair drift (e.g. after a failed Supabase-path update).
+
+Run from `AI_backend/`:
+
+    python -m utils.reconcile_enrollment_counts --dry-run
+    python -m utils.reconcile_enrollment_counts
+    python -m utils.reconcile_enrollment_counts --install-triggers   # for ENROLLMENT_COUNTS_MODE=trigger
+"""
+
+import argparse
+import json
+import sys
+
+import models
+from database import SessionLocal, engine
+from services.enrollment_counts import install_enrollment_count_triggers, reconcile_enrollment_counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Repair drift in the enrollment_counts aggregate.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report drift, do not rewrite the table")
+    parser.add_argument("--install-triggers", action="store_true", help="(Re)install the maintenance triggers first")
+    args = parser.parse_args(argv)
+
+    models.EnrollmentCount.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        if args.install_triggers:
+            install_enrollment_count_triggers(db)
+        report = reconcile_enrollment_counts(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
+    return 1 if report["drifted"] and args.dry_run else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())